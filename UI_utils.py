@@ -7,9 +7,11 @@ All logic is handled in chat_controller.py
 import streamlit as st
 from chat_controller import (
     process_user_input, process_yes_no_response,
-    generate_assistant_response, end_conversation,
-    TRANSITION_QUESTION, QUESTIONS, ROLE_ASSISTANT, ROLE_USER
+    generate_assistant_response, end_conversation, get_summary_status,
+    get_chat_history, is_conversation_active, needs_response,
+    TRANSITION_QUESTION, QUESTIONS, ROLE_ASSISTANT, MSG_CONVERSATION_ENDED
 )
+from background_jobs import JOB_PENDING, JOB_DONE
 
 # UI Configuration
 APP_TITLE = "Chatbot Interface"
@@ -24,8 +26,22 @@ STATUS_THINKING = "Thinking..."
 STATUS_PROCESSING = "Processing your message..."
 STATUS_COMPLETE = "Complete!"
 MSG_CONVERSATION_ENDED_INFO = "The conversation has ended. Refresh the page to start a new chat."
+STATUS_SUMMARY_PENDING = "Preparing your conversation summary..."
+MSG_SUMMARY_FAILED = "The conversation summary could not be generated."
+SUMMARY_TITLE = "Conversation Summary"
+SUMMARY_GOALS_LABEL = "Goals"
+SUMMARY_FOLLOW_UPS_LABEL = "Follow-up opportunities"
 INPUT_PLACEHOLDER = "Your message:"
 BTN_END_CONVERSATION = "End Conversation"
+BTN_SHOW_EARLIER = "Show earlier messages"
+
+# Only the most recent messages are drawn; earlier ones are revealed a page at a time
+CHAT_PAGE_SIZE = 30
+CHAT_INPUT_KEY = "chat_input"
+VISIBLE_MESSAGES_KEY = "chat_visible_messages"
+
+# How often to check whether the background summary is ready
+SUMMARY_POLL_SECONDS = 2
 
 # CSS Color scheme
 COLOR_GREEN = "#28a745"
@@ -37,12 +53,8 @@ COLOR_RED_BORDER = "#bd2130"
 COLOR_WHITE = "white"
 
 
-def setup_streamlit_page():
-    """Configure Streamlit page settings and styling."""
-    st.set_page_config(page_title=APP_TITLE, page_icon=APP_ICON)
-    
-    # Custom CSS for Yes/No buttons using centralized color constants
-    st.markdown(f"""
+# Custom CSS for Yes/No buttons using centralized color constants; built once at import
+BUTTON_CSS = f"""
         <style>
         /* Style for buttons in general */
         div[data-testid="stHorizontalBlock"] button {{
@@ -79,71 +91,145 @@ def setup_streamlit_page():
             transform: scale(1.02);
         }}
         </style>
-    """, unsafe_allow_html=True)
-    
+    """
+
+
+def setup_streamlit_page():
+    """
+    Configure Streamlit page settings and styling.
+
+    Only full-page runs come through here: chat interactions rerun the render_chat
+    fragment, so the page config and CSS are not re-sent on every message.
+    """
+    st.set_page_config(page_title=APP_TITLE, page_icon=APP_ICON)
+    st.markdown(BUTTON_CSS, unsafe_allow_html=True)
     st.title(f"{APP_ICON} {APP_TITLE}")
 
-def render_input_field(llm):
+def render_input_field():
     """Render the chat input field for user messages (UI only)."""
-    user_input = st.chat_input(INPUT_PLACEHOLDER)
-    process_user_input(user_input, llm)
+    st.chat_input(INPUT_PLACEHOLDER, key=CHAT_INPUT_KEY, on_submit=submit_chat_input)
 
-def render_end_conversation_button(llm):
+def submit_chat_input():
+    """Chat input callback: hand the submitted message to the controller."""
+    process_user_input(st.session_state[CHAT_INPUT_KEY])
+
+def render_end_conversation_button():
     """Render the end conversation button (UI only)."""
-    if st.button(BTN_END_CONVERSATION):
-        end_conversation(llm)
+    st.button(BTN_END_CONVERSATION, on_click=end_conversation)
+
+def render_conversation_ended():
+    """Render the end-of-conversation notices (UI only)."""
+    st.success(MSG_CONVERSATION_ENDED)
+    st.info(MSG_CONVERSATION_ENDED_INFO)
+
+def render_conversation_summary():
+    """Render the conversation summary, polling until the background job finishes (UI only)."""
+    status, summary = get_summary_status()
+    if status is None:
+        return
+    if status == JOB_PENDING:
+        render_pending_summary()
+    elif status == JOB_DONE:
+        st.subheader(SUMMARY_TITLE)
+        st.markdown(f"**{SUMMARY_GOALS_LABEL}**")
+        for goal in summary.get("Goals", []):
+            st.markdown(f"- {goal}")
+        st.markdown(f"**{SUMMARY_FOLLOW_UPS_LABEL}**")
+        for opportunity in summary.get("Follow_Up_Opportunities", []):
+            st.markdown(f"- {opportunity}")
+    else:
+        st.warning(MSG_SUMMARY_FAILED)
 
-def render_chat_history(llm):
-    """Display the entire chat history (UI rendering only)."""
-    chat_history = st.session_state.chat_history
+@st.fragment(run_every=SUMMARY_POLL_SECONDS)
+def render_pending_summary():
+    """Poll the summary job without rerunning the whole page."""
+    status, _ = get_summary_status()
+    if status == JOB_PENDING:
+        st.caption(STATUS_SUMMARY_PENDING)
+    else:
+        # Summary is ready, redraw the page once to show it
+        st.rerun()
+
+@st.fragment
+def render_chat():
+    """
+    Render the chat view as a fragment (UI only).
+
+    Sending a message or answering Yes/No reruns only this fragment: the new user
+    message and the streamed reply are drawn in place, and long conversations only
+    draw their latest page of messages.
+    """
+    was_active = is_conversation_active()
+    render_chat_history()
+    if not is_conversation_active():
+        if was_active:
+            # The conversation ended during this turn, redraw the page for the end state
+            st.rerun(scope="app")
+        return
+    render_input_field()
+
+def render_chat_history():
+    """Display the visible page of the chat history (UI rendering only)."""
+    chat_history = get_chat_history()
     history_len = len(chat_history)
-    
-    # Render all messages
-    for idx, message in enumerate(chat_history):
-        is_last_message = (idx == history_len - 1)
-        render_single_message(message, is_last_message, llm)
-        
+    visible = st.session_state.setdefault(VISIBLE_MESSAGES_KEY, CHAT_PAGE_SIZE)
+    first_visible = max(0, history_len - visible)
+
+    if first_visible > 0:
+        st.button(BTN_SHOW_EARLIER, on_click=show_earlier_messages)
+
+    for idx in range(first_visible, history_len):
+        render_single_message(chat_history[idx], idx == history_len - 1)
+
     # Check if last message is from user and needs a response
-    if (st.session_state.conversation_active and 
-        chat_history and 
-        chat_history[-1]["role"] == ROLE_USER):
-        render_thinking_and_generate_response(llm)
+    if needs_response():
+        render_thinking_and_generate_response()
+
+def show_earlier_messages():
+    """Reveal one more page of earlier messages."""
+    st.session_state[VISIBLE_MESSAGES_KEY] += CHAT_PAGE_SIZE
 
-def render_single_message(message: dict, is_last_message: bool, llm):
+def render_single_message(message: dict, is_last_message: bool):
     """Render a single chat message with appropriate styling and buttons."""
     with st.chat_message(message["role"]):
         st.write(message["content"])
         
         # Show Yes/No buttons only for the last assistant message if it's a question
-        if (is_last_message and 
-            st.session_state.conversation_active and
-            message["role"] == ROLE_ASSISTANT and
-            (message["content"] == TRANSITION_QUESTION or message["content"] == QUESTIONS[-1])):
-            render_yes_no_buttons(llm)
+        if is_last_message and message["role"] == ROLE_ASSISTANT:
+            render_yes_no_buttons_if_asked(message["content"])
+
+def render_yes_no_buttons_if_asked(content: str):
+    """Render the Yes/No buttons when content is a yes/no question of an active conversation."""
+    if is_conversation_active() and content in (TRANSITION_QUESTION, QUESTIONS[-1]):
+        render_yes_no_buttons()
 
-def render_yes_no_buttons(llm):
+def render_yes_no_buttons():
     """Render Yes and No buttons side by side (UI only)."""
-    chat_history_len = len(st.session_state.chat_history)
+    chat_history_len = len(get_chat_history())
     col1, col2 = st.columns([1, 1])
     with col1:
-        if st.button(BTN_YES_LABEL, key=f"yes_btn_{chat_history_len}", type="primary"):
-            process_yes_no_response("yes")
+        st.button(BTN_YES_LABEL, key=f"yes_btn_{chat_history_len}", type="primary",
+                  on_click=process_yes_no_response, args=("yes",))
     with col2:
-        if st.button(BTN_NO_LABEL, key=f"no_btn_{chat_history_len}"):
-            process_yes_no_response("no")
+        st.button(BTN_NO_LABEL, key=f"no_btn_{chat_history_len}",
+                  on_click=process_yes_no_response, args=("no",))
 
-def render_thinking_and_generate_response(llm):
-    """Render thinking indicator and generate response (UI rendering)."""
+def render_thinking_and_generate_response():
+    """Render thinking indicator and stream the generated response in place (UI rendering)."""
     with st.chat_message(ROLE_ASSISTANT):
         with st.status(STATUS_THINKING, expanded=True) as status:
             st.write(STATUS_PROCESSING)
-            
-            # Get the user's last message and generate response
-            user_input = st.session_state.chat_history[-1]["content"]
-            generate_assistant_response(user_input, llm)
-            
+        reply_placeholder = st.empty()
+
+        def show_partial_reply(text: str):
+            # First token arrived, collapse the status and stream into the message
             status.update(label=STATUS_COMPLETE, state="complete", expanded=False)
-    
-    # Rerun to display the new assistant message (only if still active)
-    if st.session_state.conversation_active:
-        st.rerun()
\ No newline at end of file
+            reply_placeholder.write(text)
+
+        # Generate the response to the user's last message
+        reply = generate_assistant_response(on_token=show_partial_reply)
+
+        status.update(label=STATUS_COMPLETE, state="complete", expanded=False)
+        # Replies that weren't streamed (e.g. the next question) are drawn here
+        reply_placeholder.write(reply)
+        render_yes_no_buttons_if_asked(reply)
@@ -3,51 +3,129 @@ This is a Streamlit-based conversational coaching chatbot application that guide
 through structured conversations with intelligent follow-ups using LangChain and GPT models.
 """
 
+import os
+import threading
 import streamlit as st
-from dotenv import load_dotenv
-from langchain_openai import ChatOpenAI
 
+# The LLM stack (langchain_openai, modules, prompts, parsers) is imported lazily: a new
+# session renders its first question without it, and warm_up loads it in the background.
 from chat_controller import (
     initialize_session_state,
-    setup_initial_question
+    setup_initial_question,
+    is_conversation_active
 )
 from UI_utils import (
     setup_streamlit_page,
-    render_chat_history,
-    render_input_field,
+    render_chat,
     render_end_conversation_button,
-    MSG_CONVERSATION_ENDED_INFO
+    render_conversation_ended,
+    render_conversation_summary
 )
 
 
-def initialize_llm():
-    """Initialize and return the LLM instance."""
+LLM_MODEL = "gpt-4o"
+LLM_TEMPERATURE = 0.0
+
+# Run each chain on its own model tier (see model_router.py) instead of LLM_MODEL for all
+MODEL_ROUTING_ENABLED = os.getenv("MODEL_ROUTING", "true").lower() in ("1", "true", "yes")
+
+# Connection pool shared by every session talking to OpenAI
+HTTP_MAX_CONNECTIONS = 50
+HTTP_MAX_KEEPALIVE_CONNECTIONS = 20
+
+
+@st.cache_resource(show_spinner=False)
+def initialize_llm(model: str = LLM_MODEL, temperature: float = LLM_TEMPERATURE):
+    """
+    Initialize and return the LLM instance.
+
+    Cached across reruns and sessions, so each LLM configuration gets one client
+    (and one HTTP connection pool) per process, and the chains built on it in
+    modules.get_chain are reused as well.
+    """
+    import httpx
+    from dotenv import load_dotenv
+    from langchain_openai import ChatOpenAI
+
     load_dotenv()
-    return ChatOpenAI(model="gpt-4", temperature=0.0)
+    limits = httpx.Limits(
+        max_connections=HTTP_MAX_CONNECTIONS,
+        max_keepalive_connections=HTTP_MAX_KEEPALIVE_CONNECTIONS
+    )
+    return ChatOpenAI(
+        model=model,
+        temperature=temperature,
+        # Retries are handled by the shared scheduler in llm_scheduler
+        max_retries=0,
+        # Report token usage on streamed responses too, for the chain metrics
+        stream_usage=True,
+        http_client=httpx.Client(limits=limits),
+        http_async_client=httpx.AsyncClient(limits=limits)
+    )
+
+@st.cache_resource(show_spinner=False)
+def initialize_router():
+    """
+    Initialize and return the model router shared by every session.
+
+    Each tier's primary and fallback model come from model_router.DEFAULT_TIER_MODELS;
+    models shared between tiers reuse the same cached client. Fallback thresholds
+    follow the chain deadlines.
+    """
+    from modules import CHAIN_DEADLINES
+    from model_router import ModelRouter, DEFAULT_TIER_MODELS
+    return ModelRouter({
+        tier: (initialize_llm(primary), initialize_llm(fallback) if fallback else None)
+        for tier, (primary, fallback) in DEFAULT_TIER_MODELS.items()
+    }, chain_deadlines=CHAIN_DEADLINES)
+
+def get_llm():
+    """The llm sessions run their chains on: the model router, or LLM_MODEL alone."""
+    return initialize_router() if MODEL_ROUTING_ENABLED else initialize_llm()
+
+def initialize_metrics():
+    """Start the metrics exporters (METRICS_PORT, METRICS_SNAPSHOT_PATH)."""
+    import modules
+    from instrumentation import start_exporters
+    start_exporters(extra=lambda: {
+        "response_cache": modules.RESPONSE_CACHE.stats(),
+        "semantic_cache": modules.get_semantic_cache().stats(),
+    })
+
+@st.cache_resource(show_spinner=False)
+def warm_up():
+    """
+    Once per process, import the LLM stack, create the LLM and start the metrics
+    exporters on a background thread, so the first page renders without waiting for them.
+    """
+    def run():
+        initialize_metrics()
+        get_llm()
+    thread = threading.Thread(target=run, name="app-warm-up", daemon=True)
+    thread.start()
+    return thread
 
 def main():
     """Main application function."""
-    # Initialize LLM
-    llm = initialize_llm()
-
-    # Set up the Streamlit page
+    # Set up the Streamlit page (must come before any other Streamlit output)
     setup_streamlit_page()
-    initialize_session_state()
+
+    # Load the LLM in the background; sessions only wait for it on their first model call
+    warm_up()
+    initialize_session_state(get_llm)
     
     # Setup initial question if needed
     setup_initial_question()
     
-    # Display chat history (uses st.chat_message which auto-scrolls)
-    render_chat_history(llm)
+    # Chat view; user interactions rerun only this fragment
+    render_chat()
     
-    # Render input field and buttons
-    if st.session_state.conversation_active:
-        render_input_field(llm)
-    else:
-        st.info(MSG_CONVERSATION_ENDED_INFO)
+    if not is_conversation_active():
+        render_conversation_ended()
+        render_conversation_summary()
     
     # Render end conversation button
-    render_end_conversation_button(llm)
+    render_end_conversation_button()
 
 if __name__ == "__main__":
     main()
@@ -0,0 +1,64 @@
+"""
+Background Jobs - Worker Pool
+Runs slow work (like conversation summaries) off the Streamlit script thread.
+Jobs are tracked by id so a session can poll for the result on later reruns.
+"""
+
+import uuid
+import threading
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+
+JOB_WORKERS = 4
+# Finished jobs kept around for sessions that haven't collected them yet
+MAX_FINISHED_JOBS = 1000
+
+JOB_PENDING = "pending"
+JOB_DONE = "done"
+JOB_FAILED = "failed"
+
+_executor = ThreadPoolExecutor(max_workers=JOB_WORKERS, thread_name_prefix="background-job")
+_jobs = OrderedDict()  # job id -> Future
+_jobs_lock = threading.Lock()
+
+
+def submit_job(fn, *args, **kwargs) -> str:
+    """Run fn(*args, **kwargs) on the worker pool and return its job id."""
+    job_id = uuid.uuid4().hex
+    future = _executor.submit(fn, *args, **kwargs)
+    with _jobs_lock:
+        _jobs[job_id] = future
+        _prune_finished_jobs()
+    return job_id
+
+
+def _prune_finished_jobs():
+    finished = [job_id for job_id, future in _jobs.items() if future.done()]
+    for job_id in finished[:max(0, len(finished) - MAX_FINISHED_JOBS)]:
+        del _jobs[job_id]
+
+
+def get_job_status(job_id: str):
+    """
+    Get the state of a job.
+
+    Returns:
+        tuple: (status, result) where status is JOB_PENDING, JOB_DONE or JOB_FAILED
+            (None if the job is unknown), and result is the return value or the exception
+    """
+    with _jobs_lock:
+        future = _jobs.get(job_id)
+    if future is None:
+        return None, None
+    if not future.done():
+        return JOB_PENDING, None
+    error = future.exception()
+    if error is not None:
+        return JOB_FAILED, error
+    return JOB_DONE, future.result()
+
+
+def forget_job(job_id: str):
+    """Drop a job once its result has been collected."""
+    with _jobs_lock:
+        _jobs.pop(job_id, None)
@@ -0,0 +1,281 @@
+"""
+Load-test and latency benchmark for the conversation flow.
+Drives ConversationEngine through scripted user transcripts (seeded from example_flow.json)
+against a local stand-in LLM with configurable latency and responses, so turn latency,
+LLM calls and prompt tokens can be measured without calling OpenAI.
+
+Usage:
+    python benchmark.py --sessions 200 --concurrency 20 --save-baseline benchmark_baseline.json
+    python benchmark.py --sessions 200 --concurrency 20 --compare benchmark_baseline.json
+"""
+
+import sys
+import json
+import time
+import random
+import asyncio
+import argparse
+import platform
+from concurrent.futures import ThreadPoolExecutor
+import numpy as np
+from langchain_core.language_models.chat_models import BaseChatModel
+from langchain_core.messages import AIMessage, AIMessageChunk
+from langchain_core.outputs import ChatGeneration, ChatGenerationChunk, ChatResult
+
+import modules
+from modules import LangChainBackend
+from prompt_builder import count_tokens
+from llm_scheduler import LLMScheduler, set_scheduler
+from semantic_cache import SemanticCache, HashingEmbedder
+from prompts import MOVE_TO_NEXT_QUESTION_PROMPT, SUMMARIZE_CHAT_HISTORY_PROMPT, TURN_DECISION_PROMPT
+from conversation_engine import (
+    ConversationEngine, EXAMPLE_FLOW_PATH, QUESTIONS, TRANSITION_QUESTION, TURN_STRATEGY, TURN_STRATEGIES
+)
+
+# Metrics compared against a baseline, and whether higher is worse
+BASELINE_METRICS = {
+    "turn_latency_p50_ms": True,
+    "turn_latency_p95_ms": True,
+    "turn_latency_p99_ms": True,
+    "llm_calls_per_turn": True,
+    "prompt_tokens_per_turn": True,
+    "sessions_per_second": False,
+}
+DEFAULT_TOLERANCE = 0.10
+
+# Stop a simulated session after this many user turns
+MAX_TURNS_PER_SESSION = 40
+CHUNK_CHARS = 4
+
+FAKE_FOLLOW_UPS = [
+    "That's great to hear! How did that make you feel?",
+    "What do you think helped the most?",
+    "Is this a new struggle for you or an ongoing one?",
+    "What have you done in the past that has helped?",
+    "What is one small step you could take tomorrow?",
+]
+
+
+def _prompt_kind(text: str) -> str:
+    """Tell which chain a rendered prompt belongs to from its static prefix."""
+    if text.startswith(MOVE_TO_NEXT_QUESTION_PROMPT[:120]):
+        return "move_to_next"
+    if text.startswith(TURN_DECISION_PROMPT[:120]):
+        return "turn_decision"
+    if text.startswith(SUMMARIZE_CHAT_HISTORY_PROMPT[:120]):
+        return "summary"
+    return "follow_up"
+
+
+class FakeChatModel(BaseChatModel):
+    """
+    Local stand-in for ChatOpenAI with a lognormal latency model.
+
+    Each instance counts its calls and prompt tokens, so give every simulated
+    session its own instance.
+    """
+
+    model_name: str = "fake-gpt"
+    temperature: float = 0.0
+    latency_ms: float = 800.0
+    latency_sigma: float = 0.35
+    transition_probability: float = 0.3
+    seed: int = 0
+    calls: int = 0
+    prompt_tokens: int = 0
+
+    @property
+    def _llm_type(self) -> str:
+        return "fake-chat-model"
+
+    def _respond(self, messages):
+        text = messages[-1].content
+        kind = _prompt_kind(text)
+        rng = random.Random(hash((self.seed, len(text), self.calls)))
+        self.calls += 1
+        self.prompt_tokens += count_tokens(text)
+        if kind == "move_to_next":
+            reply = json.dumps({"binary_value": int(rng.random() < self.transition_probability)})
+        elif kind == "turn_decision":
+            verdict = int(rng.random() < self.transition_probability)
+            reply = json.dumps({"binary_value": verdict, "question": "" if verdict else rng.choice(FAKE_FOLLOW_UPS)})
+        elif kind == "summary":
+            reply = json.dumps({"Goals": ["Keep it up"], "Follow_Up_Opportunities": ["Check in tomorrow"]})
+        else:
+            reply = json.dumps({"question": rng.choice(FAKE_FOLLOW_UPS)})
+        latency = rng.lognormvariate(0, self.latency_sigma) * self.latency_ms / 1000.0
+        return reply, latency
+
+    def _generate(self, messages, stop=None, run_manager=None, **kwargs):
+        reply, latency = self._respond(messages)
+        time.sleep(latency)
+        return ChatResult(generations=[ChatGeneration(message=AIMessage(content=reply))])
+
+    async def _agenerate(self, messages, stop=None, run_manager=None, **kwargs):
+        reply, latency = self._respond(messages)
+        await asyncio.sleep(latency)
+        return ChatResult(generations=[ChatGeneration(message=AIMessage(content=reply))])
+
+    def _stream(self, messages, stop=None, run_manager=None, **kwargs):
+        reply, latency = self._respond(messages)
+        chunks = [reply[i:i + CHUNK_CHARS] for i in range(0, len(reply), CHUNK_CHARS)]
+        for chunk in chunks:
+            time.sleep(latency / len(chunks))
+            yield ChatGenerationChunk(message=AIMessageChunk(content=chunk))
+
+    async def _astream(self, messages, stop=None, run_manager=None, **kwargs):
+        reply, latency = self._respond(messages)
+        chunks = [reply[i:i + CHUNK_CHARS] for i in range(0, len(reply), CHUNK_CHARS)]
+        for chunk in chunks:
+            await asyncio.sleep(latency / len(chunks))
+            yield ChatGenerationChunk(message=AIMessageChunk(content=chunk))
+
+
+def load_user_utterances(path: str = EXAMPLE_FLOW_PATH) -> list:
+    """User messages from the example flow, used to script simulated users."""
+    with open(path, encoding="utf-8") as f:
+        flow = json.load(f)
+    return [turn["User"] for turn in flow["example_conversation"] if turn.get("User")]
+
+
+def next_user_message(engine: ConversationEngine, utterances: list, rng: random.Random,
+                      decline_probability: float) -> str:
+    """Pick what the simulated user says next."""
+    last = engine.get_last_assistant_message()
+    if last == TRANSITION_QUESTION:
+        return "no" if rng.random() < decline_probability else "yes"
+    if last == QUESTIONS[-1]:
+        return "no"
+    return rng.choice(utterances)
+
+
+def run_session(session_index: int, args, utterances: list) -> list:
+    """Run one simulated conversation and return its per-turn measurements."""
+    rng = random.Random(args.seed + session_index)
+    llm = FakeChatModel(
+        latency_ms=args.latency_ms,
+        latency_sigma=args.latency_sigma,
+        transition_probability=args.transition_probability,
+        seed=args.seed + session_index
+    )
+    engine = ConversationEngine(LangChainBackend(llm), turn_strategy=args.turn_strategy, background_summary=False)
+    engine.start()
+
+    turns = []
+    for _ in range(MAX_TURNS_PER_SESSION):
+        if not engine.conversation_active:
+            break
+        message = next_user_message(engine, utterances, rng, args.decline_probability)
+        calls_before, tokens_before = llm.calls, llm.prompt_tokens
+        started = time.perf_counter()
+        engine.send(message)
+        turns.append({
+            "latency_ms": (time.perf_counter() - started) * 1000.0,
+            "llm_calls": llm.calls - calls_before,
+            "prompt_tokens": llm.prompt_tokens - tokens_before,
+        })
+    return turns
+
+
+def run_benchmark(args) -> dict:
+    """Run all sessions concurrently and aggregate the results."""
+    # Measure the flow itself: no cached responses, no artificial rate limits
+    modules.RESPONSE_CACHE_ENABLED = args.with_cache
+    modules.SEMANTIC_CACHE_ENABLED = args.with_cache
+    # The semantic cache embeds locally, so the benchmark makes no embedding calls
+    modules.set_semantic_cache(SemanticCache(
+        HashingEmbedder(), modules.SEMANTIC_CACHE_CAPACITY, modules.SEMANTIC_CACHE_THRESHOLD
+    ))
+    set_scheduler(LLMScheduler(
+        requests_per_minute=args.rpm_limit,
+        tokens_per_minute=args.tpm_limit,
+        max_concurrency=args.max_llm_concurrency
+    ))
+    utterances = load_user_utterances()
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=args.concurrency) as pool:
+        sessions = list(pool.map(lambda i: run_session(i, args, utterances), range(args.sessions)))
+    elapsed = time.perf_counter() - started
+
+    turns = [turn for session in sessions for turn in session]
+    latencies = np.array([turn["latency_ms"] for turn in turns])
+    p50, p95, p99 = np.percentile(latencies, [50, 95, 99]) if len(latencies) else (0.0, 0.0, 0.0)
+    return {
+        "config": {key: value for key, value in vars(args).items()
+                   if key not in ("save_baseline", "compare", "tolerance")},
+        "environment": {"python": platform.python_version(), "platform": platform.platform()},
+        "sessions": args.sessions,
+        "turns": len(turns),
+        "elapsed_seconds": round(elapsed, 3),
+        "turn_latency_p50_ms": round(float(p50), 2),
+        "turn_latency_p95_ms": round(float(p95), 2),
+        "turn_latency_p99_ms": round(float(p99), 2),
+        "llm_calls_per_turn": round(float(np.mean([t["llm_calls"] for t in turns])) if turns else 0.0, 3),
+        "prompt_tokens_per_turn": round(float(np.mean([t["prompt_tokens"] for t in turns])) if turns else 0.0, 1),
+        "sessions_per_second": round(args.sessions / elapsed, 3) if elapsed else 0.0,
+    }
+
+
+def compare_to_baseline(results: dict, baseline: dict, tolerance: float) -> list:
+    """Return a description of every metric that regressed by more than tolerance."""
+    regressions = []
+    for metric, higher_is_worse in BASELINE_METRICS.items():
+        old, new = baseline.get(metric), results.get(metric)
+        if not old or new is None:
+            continue
+        change = (new - old) / old
+        if (change > tolerance) if higher_is_worse else (change < -tolerance):
+            regressions.append(f"{metric}: {old} -> {new} ({change:+.1%})")
+    return regressions
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark the conversation flow against a local fake LLM.")
+    parser.add_argument("--sessions", type=int, default=50, help="Simulated conversations to run")
+    parser.add_argument("--concurrency", type=int, default=10, help="Conversations running at once")
+    parser.add_argument("--latency-ms", type=float, default=800.0, help="Median fake LLM latency")
+    parser.add_argument("--latency-sigma", type=float, default=0.35, help="Lognormal spread of the latency")
+    parser.add_argument("--transition-probability", type=float, default=0.3,
+                        help="Chance the fake transition check answers 1")
+    parser.add_argument("--decline-probability", type=float, default=0.2,
+                        help="Chance the simulated user declines to move on")
+    parser.add_argument("--rpm-limit", type=int, default=1_000_000)
+    parser.add_argument("--tpm-limit", type=int, default=1_000_000_000)
+    parser.add_argument("--max-llm-concurrency", type=int, default=1000)
+    parser.add_argument("--turn-strategy", choices=TURN_STRATEGIES, default=TURN_STRATEGY,
+                        help="How regular turns call the LLM")
+    parser.add_argument("--with-cache", action="store_true", help="Keep the response and semantic caches enabled")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--save-baseline", help="Write the results to this JSON file")
+    parser.add_argument("--compare", help="Baseline JSON file to check for regressions")
+    parser.add_argument("--tolerance", type=float, default=DEFAULT_TOLERANCE,
+                        help="Allowed relative regression before failing")
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    results = run_benchmark(args)
+    print(json.dumps({key: value for key, value in results.items() if key not in ("config", "environment")}, indent=2))
+
+    if args.save_baseline:
+        with open(args.save_baseline, "w") as f:
+            json.dump(results, f, indent=2)
+        print(f"Baseline saved to '{args.save_baseline}'")
+
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = json.load(f)
+        regressions = compare_to_baseline(results, baseline, args.tolerance)
+        if regressions:
+            print("Regressions against baseline:")
+            for regression in regressions:
+                print(f"  {regression}")
+            return 1
+        print("No regressions against baseline.")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
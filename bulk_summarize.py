@@ -0,0 +1,140 @@
+"""
+Offline bulk summarization of stored transcripts.
+Re-runs the summary chain over many conversations (e.g. after a prompt change),
+reading transcripts from a JSONL file or the conversation store in batches,
+summarizing each batch concurrently and appending results as they complete.
+Completed session ids are checkpointed, so an interrupted run resumes where it stopped.
+
+Usage:
+    python bulk_summarize.py --from-store --output summaries.jsonl --concurrency 16
+    python bulk_summarize.py --input transcripts.jsonl --output summaries.jsonl --write-to-store
+"""
+
+import os
+import sys
+import json
+import time
+import argparse
+from dotenv import load_dotenv
+from langchain_openai import ChatOpenAI
+from modules import run_summary_chain_batch
+from outputparsers import is_unparsed_summary
+from conversation_store import ConversationStore, DEFAULT_DB_PATH, ANONYMOUS_USER_ID
+
+DEFAULT_CONCURRENCY = 8
+DEFAULT_BATCH_SIZE = 64
+
+
+def initialize_llm():
+    """Initialize and return the LLM instance."""
+    load_dotenv()
+    return ChatOpenAI(model="gpt-4o", temperature=0.0, max_retries=0)
+
+def iter_jsonl_transcripts(path):
+    """Yield {"session_id", "user_id", "transcript"} records from a JSONL file, one line at a time."""
+    with open(path, encoding="utf-8") as f:
+        for line_number, line in enumerate(f, 1):
+            if not line.strip():
+                continue
+            record = json.loads(line)
+            yield {
+                "session_id": record.get("session_id", f"line-{line_number}"),
+                "user_id": record.get("user_id", ANONYMOUS_USER_ID),
+                "transcript": record.get("transcript", []),
+            }
+
+def load_checkpoint(path):
+    """Session ids already summarized by an earlier run."""
+    if not os.path.exists(path):
+        return set()
+    with open(path, encoding="utf-8") as f:
+        return {line.strip() for line in f if line.strip()}
+
+def iter_batches(records, batch_size, done):
+    """Group the records still to do into lists of batch_size."""
+    batch = []
+    for record in records:
+        if record["session_id"] in done or not record["transcript"]:
+            continue
+        batch.append(record)
+        if len(batch) == batch_size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+def summarize_all(records, llm, output_path, checkpoint_path, concurrency=DEFAULT_CONCURRENCY,
+                  batch_size=DEFAULT_BATCH_SIZE, store=None):
+    """
+    Summarize every record not yet in the checkpoint.
+
+    Args:
+        records: Iterable of {"session_id", "user_id", "transcript"} dicts
+        store: Optional ConversationStore the new summaries are also saved to
+
+    Returns:
+        tuple: (summarized, failed) counts for this run
+    """
+    done = load_checkpoint(checkpoint_path)
+    summarized = failed = 0
+    started = time.perf_counter()
+    with open(output_path, "a", encoding="utf-8") as out, open(checkpoint_path, "a", encoding="utf-8") as checkpoint:
+        for batch in iter_batches(records, batch_size, done):
+            results = run_summary_chain_batch([r["transcript"] for r in batch], llm, concurrency)
+            for record, result in zip(batch, results):
+                if isinstance(result, Exception) or is_unparsed_summary(result):
+                    # Not checkpointed, so the next run retries it
+                    failed += 1
+                    reason = repr(result) if isinstance(result, Exception) else "model output could not be parsed"
+                    print(f"Failed to summarize '{record['session_id']}': {reason}", file=sys.stderr)
+                    continue
+                out.write(json.dumps({"session_id": record["session_id"], "summary": result}, ensure_ascii=False) + "\n")
+                checkpoint.write(record["session_id"] + "\n")
+                if store is not None:
+                    store.save_summary(record["session_id"], record["user_id"], result)
+                summarized += 1
+            # Results are on disk before their ids are checkpointed
+            out.flush()
+            checkpoint.flush()
+            if store is not None:
+                store.flush()
+            elapsed = time.perf_counter() - started
+            print(f"{summarized} summarized, {failed} failed ({summarized / elapsed:.1f}/s)")
+    return summarized, failed
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Re-run the summary chain over stored transcripts.")
+    source = parser.add_mutually_exclusive_group(required=True)
+    source.add_argument("--input", help="JSONL file with session_id, user_id and transcript per line")
+    source.add_argument("--from-store", nargs="?", const=DEFAULT_DB_PATH, metavar="DB_PATH",
+                        help="Read transcripts from the conversation store")
+    parser.add_argument("--output", default="summaries.jsonl", help="JSONL file results are appended to")
+    parser.add_argument("--checkpoint", help="File of completed session ids (default: OUTPUT.done)")
+    parser.add_argument("--concurrency", type=int, default=DEFAULT_CONCURRENCY, help="Summaries in flight at once")
+    parser.add_argument("--batch-size", type=int, default=DEFAULT_BATCH_SIZE,
+                        help="Transcripts read and checkpointed together")
+    parser.add_argument("--write-to-store", action="store_true",
+                        help="Also save the summaries to the conversation store")
+    return parser.parse_args(argv)
+
+def main(argv=None):
+    args = parse_args(argv)
+    store = None
+    if args.from_store or args.write_to_store:
+        store = ConversationStore(args.from_store or DEFAULT_DB_PATH)
+    records = store.iter_sessions() if args.from_store else iter_jsonl_transcripts(args.input)
+
+    summarized, failed = summarize_all(
+        records,
+        initialize_llm(),
+        args.output,
+        args.checkpoint or f"{args.output}.done",
+        concurrency=args.concurrency,
+        batch_size=args.batch_size,
+        store=store if args.write_to_store else None
+    )
+    print(f"Done: {summarized} summarized, {failed} failed")
+    return 1 if failed else 0
+
+if __name__ == "__main__":
+    sys.exit(main())
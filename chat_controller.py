@@ -1,180 +1,126 @@
 """
 Chat Controller - Business Logic Layer
-Handles all conversation logic, state management, and response generation.
+Streamlit adapter over the headless ConversationEngine: keeps one engine per
+session in st.session_state and exposes it to the UI layer.
 Separated from UI rendering for clean architecture.
 """
 
-import os
-import json
 import streamlit as st
-from modules import run_follow_up_chain, run_summary_chain, run_move_to_next_chain
+from conversation_store import get_conversation_store, ANONYMOUS_USER_ID
+from long_term_memory import get_long_term_memory
+from conversation_engine import (
+    ConversationEngine, LazyBackend,
+    ROLE_USER, ROLE_ASSISTANT, QUESTIONS, TRANSITION_QUESTION
+)
 
-# Constants needed for business logic
-ROLE_USER = "user"
-ROLE_ASSISTANT = "assistant"
+MSG_CONVERSATION_ENDED = "Conversation ended and saved."
 
-AFFIRMATIVE_RESPONSES = {"yes", "y"}
-
-QUESTIONS = [
-    "What is one success you had today?",
-    "What is one struggle you had today?",
-    "What one thing you are grateful for today?",
-    "What are one or two things that stood out to you today?",
-    "Great, I have asked all of my questions! Is there anything else that you want to talk about with me?"
-]
-TRANSITION_QUESTION = "That's great. Do you want to move on to the next question?"
-
-MSG_LISTENING = "Go ahead, I'm listening."
-MSG_FAREWELL = "Thank you for sharing. Saving our conversation..."
-MSG_CONVERSATION_ENDED = "Conversation ended."
-
-CHAT_SUMMARY_FILE = "chat_history_summary.json"
-EXAMPLE_FLOW_FILE = "example_flow.json"
+# Query parameter identifying the user whose sessions are stored. Anyone can set it, so
+# it isn't trusted for long-term memory, which only logged-in users (st.login) get.
+USER_ID_QUERY_PARAM = "user_id"
 
 ########################################################
 # chat Initialization Functions
 ########################################################
-def initialize_session_state():
-    """Initialize Streamlit session state variables."""
-    if "chat_history" not in st.session_state:
-        st.session_state.chat_history = []
-        st.session_state.chat_history_for_flag = []
-        st.session_state.question_index = 0
+def create_backend(get_llm):
+    """Build the LangChain backend; the LLM stack is only imported here."""
+    from modules import LangChainBackend
+    return LangChainBackend(get_llm())
+
+
+def get_authenticated_user_id():
+    """The logged-in user's email (or subject id) when Streamlit authentication is set up, else None."""
+    if not st.user.get("is_logged_in", False):
+        return None
+    return st.user.get("email") or st.user.get("sub")
+
+
+def initialize_session_state(get_llm):
+    """
+    Create this session's conversation engine on first run.
+
+    Args:
+        get_llm: Returns the (cached) LLM; only called once the session first needs the model
+    """
+    if "engine" not in st.session_state:
+        authenticated_user_id = get_authenticated_user_id()
+        st.session_state.engine = ConversationEngine(
+            LazyBackend(lambda: create_backend(get_llm)),
+            user_id=authenticated_user_id or st.query_params.get(USER_ID_QUERY_PARAM, ANONYMOUS_USER_ID),
+            store=get_conversation_store(),
+            # Past sessions are only recalled for a verified identity
+            memory=get_long_term_memory(get_conversation_store()) if authenticated_user_id else None
+        )
+
 
-    if "conversation_active" not in st.session_state:
-        st.session_state.conversation_active = True
+def get_engine() -> ConversationEngine:
+    """Get this session's conversation engine."""
+    return st.session_state.engine
 
 
 def setup_initial_question():
     """Set up the first question if starting a new conversation."""
-    if not st.session_state.chat_history:
-        first_question = get_next_reflection_question()
-        add_message_to_history(ROLE_ASSISTANT, first_question)
+    get_engine().start()
 
 
-def get_next_reflection_question() -> str:
-    """Get the next question from the list."""
-    if st.session_state.question_index < len(QUESTIONS):
-        question = QUESTIONS[st.session_state.question_index]
-        st.session_state.question_index += 1
-        return question
-    return None
+def get_chat_history() -> list:
+    """Get the messages of this session's conversation."""
+    return get_engine().chat_history
 
 
-def add_message_to_history(role: str, content: str, update_flag: bool = True):
-    """
-    Add a message to chat history.
-    
-    Args:
-        role: The role of the message sender (user or assistant)
-        content: The message content
-        update_flag: Whether to also update the flag history for transition detection
-    """
-    message = {"role": role, "content": content}
-    st.session_state.chat_history.append(message)
-    
-    if update_flag:
-        st.session_state.chat_history_for_flag.append(message)
+def is_conversation_active() -> bool:
+    """Whether the conversation is still going."""
+    return get_engine().conversation_active
+
+
+def needs_response() -> bool:
+    """Whether the last user message still needs an assistant response."""
+    return get_engine().needs_response()
 
 ########################################################
 # Chat Follow Up Functions
 ########################################################
-def get_last_assistant_message(exclude_last: bool = False) -> str:
-    """Get the last assistant message from chat history."""
-    chat_history = st.session_state.chat_history
-    history = chat_history[:-1] if exclude_last and chat_history else chat_history
-    for msg in reversed(history):
-        if msg["role"] == ROLE_ASSISTANT:
-            return msg["content"]
-    return None
-
-
-def generate_assistant_response(user_input: str, llm):
-    """Generate assistant response based on user input (user message already in history)."""
-    last_assistant_msg = get_last_assistant_message(exclude_last=True)
-    
-    # Handle final question response (last question in the list)
-    if last_assistant_msg == QUESTIONS[-1]:
-        handle_final_question_response(user_input, llm)
-        return
-    
-    # Handle transition response
-    if last_assistant_msg == TRANSITION_QUESTION:
-        handle_transition_response(user_input, llm)
-        return
-    
-    # Regular conversation - check if we should transition
-    handle_regular_response(llm)
-
-
-def handle_final_question_response(user_input: str, llm):
-    """Handle user response to the final question."""
-    if user_input.lower() in AFFIRMATIVE_RESPONSES:
-        # User wants to add more
-        st.session_state.chat_history_for_flag = []
-        add_message_to_history(ROLE_ASSISTANT, MSG_LISTENING)
-    else:
-        # User is done, end conversation
-        add_message_to_history(ROLE_ASSISTANT, MSG_FAREWELL)
-        end_conversation(llm)
-
-
-def handle_transition_response(user_input: str, llm):
-    """Handle user response to transition question."""
-    if user_input.lower() in AFFIRMATIVE_RESPONSES:
-        # Move to next question
-        st.session_state.chat_history_for_flag = []
-        next_question = get_next_reflection_question()
-        if next_question:
-            add_message_to_history(ROLE_ASSISTANT, next_question)
-    else:
-        # Continue with follow-up on current topic
-        bot_reply = run_follow_up_chain(st.session_state.chat_history, llm)
-        add_message_to_history(ROLE_ASSISTANT, bot_reply)
-
-
-def handle_regular_response(llm):
-    """Handle regular conversation and check for transition."""
-    example_flow_path = os.path.join(os.path.dirname(__file__), EXAMPLE_FLOW_FILE)
-    should_transition = run_move_to_next_chain(
-        st.session_state.chat_history_for_flag, 
-        example_flow_path, 
-        llm
-    ) == 1
-    
-    if should_transition:
-        # Ask transition question or move to next question
-        add_message_to_history(ROLE_ASSISTANT, TRANSITION_QUESTION)
-    else:
-        # Continue with follow-up question
-        bot_reply = run_follow_up_chain(st.session_state.chat_history, llm)
-        add_message_to_history(ROLE_ASSISTANT, bot_reply)
-
-
-def end_conversation(llm):
-    """Handle conversation termination and summary generation."""
-    st.session_state.conversation_active = False
-    
-    chat_summary = run_summary_chain(st.session_state.chat_history, llm)
-    save_chat_summary(chat_summary)
-    st.success(MSG_CONVERSATION_ENDED)
-
-
-def save_chat_summary(chat_summary: dict):
-    """Save the chat summary to a JSON file."""
-    with open(CHAT_SUMMARY_FILE, "w") as f:
-        json.dump(chat_summary, f, indent=2)
-
-
-def process_user_input(user_input: str, llm):
-    """Process user input and trigger response generation."""
+def generate_assistant_response(on_token=None) -> str:
+    """
+    Generate assistant response to the last user message (already in history).
+
+    Args:
+        on_token: Optional callback receiving the partial assistant reply as it streams in
+
+    Returns:
+        str: The assistant message the turn ended with
+    """
+    engine = get_engine()
+    engine.generate_response(on_token)
+    return engine.get_last_assistant_message()
+
+
+def end_conversation():
+    """Handle conversation termination; the summary is generated in the background."""
+    get_engine().end_conversation()
+
+
+def get_summary_status():
+    """
+    Get the state of this session's summary job.
+
+    Returns:
+        tuple: (status, summary) where status is None if no summary was requested,
+            and summary is only set once the job is done
+    """
+    return get_engine().get_summary_status()
+
+
+def process_user_input(user_input: str):
+    """
+    Add the user's message; the response is generated by the UI on the following run.
+
+    Used as a widget callback, so the rerun that follows the interaction already sees it.
+    """
     if user_input and user_input.strip():
-        add_message_to_history(ROLE_USER, user_input.strip())
-        st.rerun()
+        get_engine().add_message(ROLE_USER, user_input.strip())
 
 
 def process_yes_no_response(response: str):
     """Process Yes/No button response - adds message, response generation handled in UI."""
-    add_message_to_history(ROLE_USER, response)
-    st.rerun()
-
+    get_engine().add_message(ROLE_USER, response)
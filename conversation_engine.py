@@ -0,0 +1,559 @@
+"""
+Conversation Engine - Headless Conversation Logic
+Holds the reflection-question state machine for one conversation, independent of any UI.
+LLM work goes through an injected backend (see modules.LangChainBackend), so Streamlit,
+the terminal app and batch/benchmark runs are all thin adapters over the same engine.
+"""
+
+import os
+import uuid
+import logging
+import threading
+from history_manager import HistoryManager
+from transition_classifier import TransitionClassifier, has_closure_phrase
+from conversation_store import ANONYMOUS_USER_ID
+from hedging import DeadlineExceeded
+from flow_script import load_flow_script, STEP_TRANSITION
+from background_jobs import submit_job, get_job_status, forget_job, JOB_PENDING, JOB_DONE, JOB_FAILED
+
+logger = logging.getLogger(__name__)
+
+ROLE_USER = "user"
+ROLE_ASSISTANT = "assistant"
+# Items recalled from the user's earlier sessions, placed before the chat history
+ROLE_MEMORY = "past_sessions"
+
+EXAMPLE_FLOW_FILE = "example_flow.json"
+EXAMPLE_FLOW_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), EXAMPLE_FLOW_FILE)
+
+# Questions, their scripted steps and the yes/no wording come from the flow script in
+# the example flow file, loaded and validated once at import
+FLOW_SCRIPT = load_flow_script(EXAMPLE_FLOW_PATH)
+QUESTIONS = FLOW_SCRIPT.questions
+TRANSITION_QUESTION = FLOW_SCRIPT.transition_question
+AFFIRMATIVE_RESPONSES = FLOW_SCRIPT.affirmative_responses
+# Topics with scripted steps (answer, impact, celebrate, move on)
+SCRIPTED_QUESTIONS = FLOW_SCRIPT.scripted_questions
+
+# Run scripted steps without asking the LLM whether to move on; disabled with FLOW_SCRIPTS=false
+FLOW_SCRIPTS_ENABLED = os.getenv("FLOW_SCRIPTS", "true").lower() in ("1", "true", "yes")
+
+# Pre-written follow-ups that keep the user on the current topic when the model runs out of time
+CANNED_FOLLOW_UPS = FLOW_SCRIPT.fallback_follow_ups()
+CANNED_FOLLOW_UP_DEFAULT = "Tell me more about that."
+
+MSG_LISTENING = "Go ahead, I'm listening."
+MSG_FAREWELL = "Thank you for sharing. Saving our conversation..."
+
+# How regular turns use the LLM when the local classifier abstains:
+#   sequential  - transition check, then a follow-up call if staying on the topic
+#   speculative - transition check and follow-up generation run concurrently
+#   fused       - one call returns both the verdict and the follow-up question
+TURN_STRATEGY_SEQUENTIAL = "sequential"
+TURN_STRATEGY_SPECULATIVE = "speculative"
+TURN_STRATEGY_FUSED = "fused"
+TURN_STRATEGIES = (TURN_STRATEGY_SEQUENTIAL, TURN_STRATEGY_SPECULATIVE, TURN_STRATEGY_FUSED)
+
+# SPECULATIVE_FOLLOW_UP=false still selects the sequential strategy when TURN_STRATEGY isn't set
+SPECULATIVE_FOLLOW_UP = os.getenv("SPECULATIVE_FOLLOW_UP", "true").lower() in ("1", "true", "yes")
+TURN_STRATEGY = os.getenv(
+    "TURN_STRATEGY", TURN_STRATEGY_SPECULATIVE if SPECULATIVE_FOLLOW_UP else TURN_STRATEGY_SEQUENTIAL
+).lower()
+
+# Answer easy transition decisions locally instead of asking the LLM
+LOCAL_TRANSITION_CLASSIFIER = os.getenv("LOCAL_TRANSITION_CLASSIFIER", "true").lower() in ("1", "true", "yes")
+TRANSITION_CLASSIFIER = TransitionClassifier(SCRIPTED_QUESTIONS, TRANSITION_QUESTION)
+
+# Turn decisions recorded in ConversationEngine.last_decision
+DECISION_FOLLOW_UP = "follow_up"
+DECISION_TRANSITION = "transition"
+DECISION_NEXT_QUESTION = "next_question"
+DECISION_LISTENING = "listening"
+DECISION_END = "end"
+
+# ConversationEngine.last_decision["source"] when the model missed its deadline,
+# and when the turn was a step of the flow script
+SOURCE_DEADLINE = "deadline"
+SOURCE_SCRIPT = "script"
+
+# Chain names used for history budgets (match modules.CHAIN_*)
+CHAIN_FOLLOW_UP = "follow_up"
+CHAIN_MOVE_TO_NEXT = "move_to_next"
+CHAIN_TURN_DECISION = "turn_decision"
+CHAIN_SUMMARY = "summary"
+# Chains whose prompts include the memory message
+MEMORY_CHAINS = (CHAIN_FOLLOW_UP, CHAIN_TURN_DECISION)
+
+
+class LazyBackend:
+    """
+    Backend proxy that builds the real backend on first use.
+
+    Lets a session render its first question before the LLM stack is imported.
+    """
+
+    def __init__(self, factory):
+        self._factory = factory
+        self._backend = None
+        self._lock = threading.Lock()
+
+    def _get(self):
+        if self._backend is None:
+            with self._lock:
+                if self._backend is None:
+                    self._backend = self._factory()
+        return self._backend
+
+    def __getattr__(self, name):
+        return getattr(self._get(), name)
+
+
+class ConversationEngine:
+    """
+    State machine for one reflection conversation.
+
+    The backend must provide:
+        follow_up(chat_history, on_token=None, topic=None, instruction=None) -> str
+        move_to_next(flag_history, example_flow) -> int
+        move_to_next_and_follow_up(flag_history, chat_history, example_flow, on_token=None, topic=None)
+            -> (int, str or None)
+        turn_decision(chat_history, example_flow, on_token=None) -> (int, str or None)
+        submit_move_to_next(flag_history, example_flow, on_result)
+        summarize(chat_history) -> dict
+        load_example_flow(path) -> str
+
+    Turn calls that raise hedging.DeadlineExceeded are degraded: the transition
+    decision defaults to 0 and the reply is a canned follow-up for the current question.
+    """
+
+    def __init__(self, backend, session_id: str = None, user_id: str = ANONYMOUS_USER_ID,
+                 store=None, turn_strategy: str = TURN_STRATEGY,
+                 classifier=TRANSITION_CLASSIFIER if LOCAL_TRANSITION_CLASSIFIER else None,
+                 flow_script=FLOW_SCRIPT if FLOW_SCRIPTS_ENABLED else None, memory=None,
+                 example_flow_path: str = EXAMPLE_FLOW_PATH, background_summary: bool = True):
+        """
+        Args:
+            backend: LLM backend used for all generation
+            session_id: Id the transcript is stored under (generated if omitted)
+            user_id: Id of the user owning the session
+            store: Optional ConversationStore for transcripts and summaries
+            turn_strategy: One of TURN_STRATEGIES, how regular turns call the LLM
+            classifier: Optional local TransitionClassifier for easy transition decisions
+            flow_script: Optional flow_script.FlowScript whose scripted steps run without
+                the transition check
+            memory: Optional long_term_memory.LongTermMemory recalling the user's earlier sessions
+            example_flow_path: Example conversation used by the transition check
+            background_summary: Generate the end-of-conversation summary on a background worker
+        """
+        self.backend = backend
+        self.session_id = session_id or uuid.uuid4().hex
+        self.user_id = user_id
+        self.store = store
+        if turn_strategy not in TURN_STRATEGIES:
+            raise ValueError(f"Unknown turn strategy '{turn_strategy}', expected one of {TURN_STRATEGIES}")
+        self.turn_strategy = turn_strategy
+        self.classifier = classifier
+        self.flow_script = flow_script
+        self.memory = memory
+        self.example_flow_path = example_flow_path
+        self.background_summary = background_summary
+
+        self.chat_history = []
+        self.chat_history_for_flag = []
+        self.question_index = 0
+        self.conversation_active = True
+        self.history_manager = HistoryManager(QUESTIONS)
+        self.summary_job_id = None
+        self.summary = None
+        self.last_decision = None
+        # Set when a model call of the current turn ran out of time and was degraded
+        self.deadline_missed = False
+        # (question index, memory message or None), recalled once per topic
+        self._memory_message = None
+
+    ########################################################
+    # Conversation State
+    ########################################################
+    def start(self):
+        """Ask the first question if the conversation hasn't started yet."""
+        if not self.chat_history:
+            # Warm the example flow cache so the first turn doesn't read the file
+            self.backend.load_example_flow(self.example_flow_path)
+            self.add_message(ROLE_ASSISTANT, self.get_next_reflection_question())
+
+    def get_next_reflection_question(self) -> str:
+        """Get the next question from the list."""
+        if self.question_index < len(QUESTIONS):
+            question = QUESTIONS[self.question_index]
+            self.question_index += 1
+            return question
+        return None
+
+    def get_current_question(self) -> str:
+        """Get the reflection question of the topic currently being discussed."""
+        index = self.question_index - 1
+        return QUESTIONS[index] if 0 <= index < len(QUESTIONS) else None
+
+    def add_message(self, role: str, content: str, update_flag: bool = True):
+        """
+        Add a message to chat history.
+
+        Args:
+            role: The role of the message sender (user or assistant)
+            content: The message content
+            update_flag: Whether to also update the flag history for transition detection
+        """
+        message = {"role": role, "content": content}
+        self.chat_history.append(message)
+
+        if update_flag:
+            self.chat_history_for_flag.append(message)
+
+        if self.store is not None:
+            # Queued and written in batches by the store
+            self.store.save_transcript(self.session_id, self.user_id, self.chat_history)
+
+    def get_last_assistant_message(self, exclude_last: bool = False) -> str:
+        """Get the last assistant message from chat history."""
+        history = self.chat_history[:-1] if exclude_last and self.chat_history else self.chat_history
+        for msg in reversed(history):
+            if msg["role"] == ROLE_ASSISTANT:
+                return msg["content"]
+        return None
+
+    def get_prompt_history(self, chain_name: str, chat_history: list = None) -> list:
+        """
+        Get the token-budgeted chat history to send to the given chain.
+
+        Follow-up and turn-decision prompts over the conversation's own history start
+        with the memory message, if anything relevant was recalled.
+        """
+        if chat_history is not None:
+            return self.history_manager.build(chat_history, chain_name)
+        history = self.history_manager.build(self.chat_history, chain_name)
+        if chain_name in MEMORY_CHAINS:
+            memory_message = self.get_memory_message()
+            if memory_message is not None:
+                history.insert(0, memory_message)
+        return history
+
+    def get_memory_message(self) -> dict:
+        """
+        The user's recalled past goals and follow-up opportunities for the current topic, or None.
+
+        Recalled once per topic, against the question and the user's first answer, and
+        limited to MEMORY_TOP_K short items so the prompt doesn't grow with the
+        number of past sessions. Anonymous users have no memory.
+        """
+        if self.memory is None or self.user_id == ANONYMOUS_USER_ID:
+            return None
+        if self._memory_message is not None and self._memory_message[0] == self.question_index:
+            return self._memory_message[1]
+        question = self.get_current_question()
+        answers = [msg["content"] for msg in self.chat_history_for_flag if msg["role"] == ROLE_USER]
+        if question is None or not answers:
+            return None
+        message = None
+        try:
+            items = self.memory.recall(self.user_id, f"{question}\n{answers[0]}")
+            if items:
+                message = {"role": ROLE_MEMORY, "content": "\n".join(items)}
+        except Exception:
+            # Memory only personalizes the follow-up; the turn goes on without it
+            logger.exception("Long-term memory recall failed for user '%s'", self.user_id)
+        self._memory_message = (self.question_index, message)
+        return message
+
+    def needs_response(self) -> bool:
+        """Whether the last message is from the user and still needs an answer."""
+        return bool(self.conversation_active and self.chat_history
+                    and self.chat_history[-1]["role"] == ROLE_USER)
+
+    ########################################################
+    # Turn Handling
+    ########################################################
+    def send(self, user_input: str, on_token=None) -> str:
+        """Add a user message and generate the reply; returns the last assistant message."""
+        self.add_message(ROLE_USER, user_input.strip())
+        self.generate_response(on_token)
+        return self.get_last_assistant_message()
+
+    def generate_response(self, on_token=None):
+        """
+        Generate assistant response to the last user message (already in history).
+
+        Args:
+            on_token: Optional callback receiving the partial assistant reply as it streams in
+        """
+        user_input = self.chat_history[-1]["content"]
+        last_assistant_msg = self.get_last_assistant_message(exclude_last=True)
+        self.deadline_missed = False
+
+        # Handle final question response (last question in the list)
+        if last_assistant_msg == QUESTIONS[-1]:
+            self.handle_final_question_response(user_input)
+            return
+
+        # Handle transition response
+        if last_assistant_msg == TRANSITION_QUESTION:
+            self.handle_transition_response(user_input, on_token)
+            return
+
+        # Regular conversation - check if we should transition
+        self.handle_regular_response(on_token)
+
+    def generate_follow_up(self, on_token=None, instruction=None) -> str:
+        """
+        Generate a follow-up question, streaming it through on_token when provided.
+
+        instruction is the flow script step's guidance for this reply, if any.
+        """
+        try:
+            return self.backend.follow_up(
+                self.get_prompt_history(CHAIN_FOLLOW_UP), on_token, self.get_semantic_topic(), instruction
+            )
+        except DeadlineExceeded:
+            self.deadline_missed = True
+            return self.get_canned_follow_up()
+
+    def get_semantic_topic(self):
+        """
+        (question, answer) when replying to the first answer on a reflection question, else None.
+
+        Only then does the follow-up depend on little more than the question and the
+        answer, so one generated for a similar answer by another user can be reused.
+        Follow-ups that draw on the user's own past sessions aren't shared.
+        """
+        flag_history = self.chat_history_for_flag
+        if self.get_memory_message() is not None:
+            return None
+        if (len(flag_history) == 2 and flag_history[1]["role"] == ROLE_USER
+                and flag_history[0]["content"] == self.get_current_question()):
+            return flag_history[0]["content"], flag_history[1]["content"]
+        return None
+
+    def get_canned_follow_up(self) -> str:
+        """Pre-written follow-up for the current question, used when the model is too slow."""
+        return CANNED_FOLLOW_UPS.get(self.get_current_question(), CANNED_FOLLOW_UP_DEFAULT)
+
+    def handle_final_question_response(self, user_input: str):
+        """Handle user response to the final question."""
+        if user_input.lower() in AFFIRMATIVE_RESPONSES:
+            # User wants to add more
+            self.chat_history_for_flag = []
+            self.add_message(ROLE_ASSISTANT, MSG_LISTENING)
+            self.last_decision = {"decision": DECISION_LISTENING}
+        else:
+            # User is done, end conversation
+            self.add_message(ROLE_ASSISTANT, MSG_FAREWELL)
+            self.last_decision = {"decision": DECISION_END}
+            self.end_conversation()
+
+    def handle_transition_response(self, user_input: str, on_token=None):
+        """Handle user response to transition question."""
+        if user_input.lower() in AFFIRMATIVE_RESPONSES:
+            # Move to next question
+            self.chat_history_for_flag = []
+            next_question = self.get_next_reflection_question()
+            if next_question:
+                self.add_message(ROLE_ASSISTANT, next_question)
+            self.last_decision = {"decision": DECISION_NEXT_QUESTION}
+        else:
+            # Continue with follow-up on current topic
+            self.add_message(ROLE_ASSISTANT, self.generate_follow_up(on_token))
+            self.last_decision = {"decision": DECISION_FOLLOW_UP}
+            if self.deadline_missed:
+                self.last_decision["source"] = SOURCE_DEADLINE
+
+    def get_scripted_step(self):
+        """
+        The flow script step for the reply to the last user message, or None.
+
+        A user who says they are done ("move on", "that's all", ...) before a generate
+        step gets the topic's offer to move on instead, or the unscripted decision when
+        the topic has none. Once the offer has been made the topic is unscripted.
+        """
+        if self.flow_script is None:
+            return None
+        if any(msg["role"] == ROLE_ASSISTANT and msg["content"] == TRANSITION_QUESTION
+               for msg in self.chat_history_for_flag):
+            return None
+        user_turns = sum(1 for msg in self.chat_history_for_flag if msg["role"] == ROLE_USER)
+        step = self.flow_script.step_for(self.get_current_question(), user_turns)
+        if step is not None and step.type != STEP_TRANSITION and has_closure_phrase(self.chat_history[-1]["content"]):
+            return self.flow_script.get_flow(self.get_current_question()).transition_step
+        return step
+
+    def handle_scripted_step(self, step, on_token=None):
+        """Run a flow script step: offer to move on locally, or generate the follow-up."""
+        if step.type == STEP_TRANSITION:
+            self.add_message(ROLE_ASSISTANT, TRANSITION_QUESTION)
+            decision = DECISION_TRANSITION
+        else:
+            self.add_message(ROLE_ASSISTANT, self.generate_follow_up(on_token, step.instruction))
+            decision = DECISION_FOLLOW_UP
+        self.last_decision = {
+            "decision": decision,
+            "source": SOURCE_DEADLINE if self.deadline_missed else SOURCE_SCRIPT,
+            "step": step.id,
+        }
+
+    def handle_regular_response(self, on_token=None):
+        """Handle regular conversation and check for transition."""
+        step = self.get_scripted_step()
+        if step is not None:
+            # Scripted topics only need the LLM for the steps that generate text
+            self.handle_scripted_step(step, on_token)
+            return
+
+        example_flow = self.backend.load_example_flow(self.example_flow_path)
+        flag_history = self.get_prompt_history(CHAIN_MOVE_TO_NEXT, self.chat_history_for_flag)
+        bot_reply = None
+        verdict = None
+
+        local_verdict, probability = None, None
+        if self.classifier is not None:
+            local_verdict, probability = self.classifier.decide(
+                self.chat_history_for_flag,
+                self.get_current_question(),
+                self.question_index
+            )
+
+        if local_verdict is not None:
+            should_transition = local_verdict == 1
+            source = "local"
+            if self.classifier.should_shadow_check():
+                # Sample the LLM in the background to keep measuring agreement
+                classifier = self.classifier
+                self.backend.submit_move_to_next(
+                    flag_history, example_flow,
+                    lambda llm_verdict: classifier.record_llm_verdict(probability, local_verdict, llm_verdict)
+                )
+        else:
+            try:
+                verdict, bot_reply = self.decide_with_llm(flag_history, example_flow, on_token)
+                source = "llm"
+            except DeadlineExceeded:
+                # Out of time: stay on the topic with a pre-written follow-up
+                self.deadline_missed = True
+                verdict, bot_reply = 0, self.get_canned_follow_up()
+                source = SOURCE_DEADLINE
+            should_transition = verdict == 1
+
+        if local_verdict is None and probability is not None and source == "llm":
+            self.classifier.record_llm_verdict(probability, None, verdict)
+
+        if should_transition:
+            # Ask transition question or move to next question
+            self.add_message(ROLE_ASSISTANT, TRANSITION_QUESTION)
+        else:
+            # Continue with follow-up question
+            if bot_reply is None:
+                bot_reply = self.generate_follow_up(on_token)
+                if self.deadline_missed:
+                    source = SOURCE_DEADLINE
+            self.add_message(ROLE_ASSISTANT, bot_reply)
+
+        self.last_decision = {
+            "decision": DECISION_TRANSITION if should_transition else DECISION_FOLLOW_UP,
+            "source": source,
+            "probability": probability,
+        }
+
+    def decide_with_llm(self, flag_history: list, example_flow: str, on_token=None):
+        """
+        Ask the model whether to move on, using the engine's turn strategy.
+
+        Returns:
+            tuple: (verdict, follow_up) where follow_up is None unless the strategy
+                already generated it
+
+        Raises:
+            DeadlineExceeded: A model call ran out of time
+        """
+        if self.turn_strategy == TURN_STRATEGY_FUSED:
+            # One request returns the verdict and, when staying, the follow-up
+            return self.backend.turn_decision(
+                self.get_prompt_history(CHAIN_TURN_DECISION),
+                example_flow,
+                on_token
+            )
+        if self.turn_strategy == TURN_STRATEGY_SPECULATIVE:
+            # Both chains start together; the follow-up is dropped if we transition
+            return self.backend.move_to_next_and_follow_up(
+                flag_history,
+                self.get_prompt_history(CHAIN_FOLLOW_UP),
+                example_flow,
+                on_token,
+                self.get_semantic_topic()
+            )
+        return self.backend.move_to_next(flag_history, example_flow), None
+
+    ########################################################
+    # Conversation End
+    ########################################################
+    def end_conversation(self, background: bool = None):
+        """
+        Handle conversation termination.
+
+        The transcript is saved right away. In background mode (the engine's
+        background_summary unless overridden) the summary is generated by a background
+        worker so the caller never waits on the model; only one summary job runs per
+        conversation, and ending it again after that job failed starts a new one.
+        """
+        if background is None:
+            background = self.background_summary
+        self.conversation_active = False
+        if self.summary is not None:
+            return
+        if self.summary_job_id is not None:
+            status, error = get_job_status(self.summary_job_id)
+            if status not in (JOB_FAILED, None):
+                return
+            # The previous job failed (or was pruned), drop it so the summary is retried
+            if status == JOB_FAILED:
+                logger.error("Summary job for session '%s' failed: %r", self.session_id, error)
+            forget_job(self.summary_job_id)
+            self.summary_job_id = None
+
+        if self.store is not None:
+            self.store.save_transcript(self.session_id, self.user_id, self.chat_history)
+        prompt_history = self.get_prompt_history(CHAIN_SUMMARY)
+        if background:
+            self.summary_job_id = submit_job(self.summarize_and_save, prompt_history)
+        else:
+            self.summary = self.summarize_and_save(prompt_history)
+
+    def summarize_and_save(self, chat_history: list) -> dict:
+        """Generate and store the chat summary."""
+        chat_summary = self.backend.summarize(chat_history)
+        if self.store is not None:
+            self.store.save_summary(self.session_id, self.user_id, chat_summary)
+        if self.memory is not None and self.user_id != ANONYMOUS_USER_ID:
+            try:
+                self.memory.remember_summary(self.user_id, self.session_id, chat_summary)
+            except Exception:
+                logger.exception("Could not add session '%s' to long-term memory", self.session_id)
+        return chat_summary
+
+    def get_summary_status(self):
+        """
+        Get the state of the summary.
+
+        Returns:
+            tuple: (status, summary) where status is None if no summary was requested,
+                and summary is only set once the job is done
+        """
+        if self.summary is not None:
+            return JOB_DONE, self.summary
+        if self.summary_job_id is None:
+            return None, None
+
+        status, result = get_job_status(self.summary_job_id)
+        if status == JOB_DONE:
+            self.summary = result
+            forget_job(self.summary_job_id)
+            return JOB_DONE, result
+        if status == JOB_PENDING:
+            return JOB_PENDING, None
+        return status, None
@@ -0,0 +1,174 @@
+"""
+Conversation Store - Persistence Layer
+Stores each session's transcript and summary in SQLite (WAL mode), keyed by
+session id and user id, so concurrent sessions never overwrite each other.
+Writes are queued and flushed in batches by a background thread.
+"""
+
+import os
+import json
+import time
+import atexit
+import sqlite3
+import threading
+
+DEFAULT_DB_PATH = os.getenv("CONVERSATION_DB_PATH", "conversations.sqlite3")
+ANONYMOUS_USER_ID = "anonymous"
+
+# Pending writes are flushed when this many sessions are queued or every FLUSH_INTERVAL_SECONDS
+BATCH_SIZE = 50
+FLUSH_INTERVAL_SECONDS = 2.0
+
+_UPSERT_SQL = """
+INSERT INTO sessions (session_id, user_id, created_at, updated_at, transcript, summary)
+VALUES (:session_id, :user_id, :updated_at, :updated_at, :transcript, :summary)
+ON CONFLICT(session_id) DO UPDATE SET
+    updated_at = excluded.updated_at,
+    transcript = COALESCE(excluded.transcript, sessions.transcript),
+    summary = COALESCE(excluded.summary, sessions.summary)
+"""
+
+
+class ConversationStore:
+    """SQLite-backed transcript and summary store shared by all sessions in the process."""
+
+    def __init__(self, path: str = DEFAULT_DB_PATH, batch_size: int = BATCH_SIZE,
+                 flush_interval: float = FLUSH_INTERVAL_SECONDS):
+        self.path = path
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS sessions ("
+            "session_id TEXT PRIMARY KEY, user_id TEXT NOT NULL, "
+            "created_at REAL NOT NULL, updated_at REAL NOT NULL, "
+            "transcript TEXT, summary TEXT)"
+        )
+        self._conn.execute(
+            "CREATE INDEX IF NOT EXISTS sessions_by_user ON sessions (user_id, updated_at)"
+        )
+        self._conn.commit()
+        self._db_lock = threading.Lock()
+
+        self._pending = {}  # session id -> queued row, merged until the next flush
+        self._pending_lock = threading.Lock()
+        self._wakeup = threading.Event()
+        self._closed = False
+        self._flusher = threading.Thread(target=self._flush_loop, name="conversation-store", daemon=True)
+        self._flusher.start()
+        atexit.register(self.close)
+
+    def _queue(self, session_id: str, user_id: str, transcript=None, summary=None):
+        with self._pending_lock:
+            row = self._pending.setdefault(session_id, {
+                "session_id": session_id, "user_id": user_id,
+                "transcript": None, "summary": None
+            })
+            row["updated_at"] = time.time()
+            if transcript is not None:
+                row["transcript"] = json.dumps(transcript, ensure_ascii=False)
+            if summary is not None:
+                row["summary"] = json.dumps(summary, ensure_ascii=False)
+            full = len(self._pending) >= self.batch_size
+        if full:
+            self._wakeup.set()
+
+    def save_transcript(self, session_id: str, user_id: str, chat_history: list):
+        """Queue the latest transcript of a session."""
+        self._queue(session_id, user_id, transcript=list(chat_history))
+
+    def save_summary(self, session_id: str, user_id: str, summary: dict):
+        """Queue the summary of a session."""
+        self._queue(session_id, user_id, summary=summary)
+
+    def flush(self):
+        """Write all queued changes in a single transaction."""
+        # Pop and write under the same lock so a concurrent flush can never
+        # write an older copy of a session after a newer one
+        with self._db_lock:
+            with self._pending_lock:
+                rows = list(self._pending.values())
+                self._pending.clear()
+            if not rows:
+                return
+            with self._conn:
+                self._conn.executemany(_UPSERT_SQL, rows)
+
+    def _flush_loop(self):
+        while not self._closed:
+            self._wakeup.wait(self.flush_interval)
+            self._wakeup.clear()
+            self.flush()
+
+    def get_session(self, session_id: str):
+        """Get one session as a dict, or None if it doesn't exist."""
+        self.flush()
+        with self._db_lock:
+            row = self._conn.execute(
+                "SELECT session_id, user_id, created_at, updated_at, transcript, summary "
+                "FROM sessions WHERE session_id = ?", (session_id,)
+            ).fetchone()
+        return self._row_to_session(row) if row else None
+
+    def list_sessions(self, user_id: str, limit: int = 20) -> list:
+        """Get a user's most recent sessions, newest first."""
+        self.flush()
+        with self._db_lock:
+            rows = self._conn.execute(
+                "SELECT session_id, user_id, created_at, updated_at, transcript, summary "
+                "FROM sessions WHERE user_id = ? ORDER BY updated_at DESC LIMIT ?",
+                (user_id, limit)
+            ).fetchall()
+        return [self._row_to_session(row) for row in rows]
+
+    def iter_sessions(self, page_size: int = 500):
+        """Yield every stored session in session id order, reading one page at a time."""
+        self.flush()
+        last_id = ""
+        while True:
+            with self._db_lock:
+                rows = self._conn.execute(
+                    "SELECT session_id, user_id, created_at, updated_at, transcript, summary "
+                    "FROM sessions WHERE session_id > ? ORDER BY session_id LIMIT ?",
+                    (last_id, page_size)
+                ).fetchall()
+            if not rows:
+                return
+            for row in rows:
+                yield self._row_to_session(row)
+            last_id = rows[-1][0]
+
+    @staticmethod
+    def _row_to_session(row) -> dict:
+        session_id, user_id, created_at, updated_at, transcript, summary = row
+        return {
+            "session_id": session_id,
+            "user_id": user_id,
+            "created_at": created_at,
+            "updated_at": updated_at,
+            "transcript": json.loads(transcript) if transcript else [],
+            "summary": json.loads(summary) if summary else None,
+        }
+
+    def close(self):
+        """Flush queued writes and stop the background flusher."""
+        if self._closed:
+            return
+        self._closed = True
+        self._wakeup.set()
+        self.flush()
+
+
+_default_store = None
+_default_store_lock = threading.Lock()
+
+
+def get_conversation_store() -> ConversationStore:
+    """Get the process-wide store, opening it on first use."""
+    global _default_store
+    with _default_store_lock:
+        if _default_store is None:
+            _default_store = ConversationStore()
+    return _default_store
@@ -0,0 +1,159 @@
+"""
+Startup diagnostics for the chat application.
+Measures cold-start import cost the way `python -X importtime` does: each target
+module is imported in a fresh interpreter and the slowest imports are reported,
+so cold-start time can be tracked against a saved baseline.
+
+Usage:
+    python diagnostics.py importtime
+    python diagnostics.py importtime --targets app modules --top 15 --save-baseline startup_baseline.json
+    python diagnostics.py importtime --compare startup_baseline.json
+"""
+
+import os
+import re
+import sys
+import json
+import argparse
+import platform
+import subprocess
+
+# app is what a new Streamlit process imports before the first page renders;
+# modules is the LLM stack loaded in the background by app.warm_up
+DEFAULT_TARGETS = ("app", "modules")
+DEFAULT_TOP = 10
+DEFAULT_RUNS = 3
+DEFAULT_TOLERANCE = 0.20
+
+PROJECT_DIR = os.path.dirname(os.path.abspath(__file__))
+
+_IMPORTTIME_LINE = re.compile(r"^import time:\s+(\d+)\s+\|\s+(\d+)\s+\|(\s*)(\S+)")
+
+
+def parse_importtime(stderr: str) -> list:
+    """Parse `-X importtime` output into {"module", "self_us", "cumulative_us", "depth"} dicts."""
+    entries = []
+    for line in stderr.splitlines():
+        match = _IMPORTTIME_LINE.match(line)
+        if match:
+            self_us, cumulative_us, indent, module = match.groups()
+            entries.append({
+                "module": module,
+                "self_us": int(self_us),
+                "cumulative_us": int(cumulative_us),
+                # One level is two spaces, after the single separator space
+                "depth": (len(indent) - 1) // 2,
+            })
+    return entries
+
+
+def measure_import(target: str) -> list:
+    """Import target in a fresh interpreter with -X importtime and return the parsed entries."""
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import {target}"],
+        cwd=PROJECT_DIR,
+        capture_output=True,
+        text=True
+    )
+    if result.returncode != 0:
+        raise RuntimeError(f"Importing '{target}' failed:\n{result.stderr[-2000:]}")
+    return parse_importtime(result.stderr)
+
+
+def import_report(target: str, runs: int = DEFAULT_RUNS, top: int = DEFAULT_TOP) -> dict:
+    """
+    Cold-start report for one module.
+
+    Returns:
+        dict: total import time (best of `runs`, in ms) and the `top` imports by
+            cumulative time from that run
+    """
+    best = None
+    for _ in range(runs):
+        entries = measure_import(target)
+        total = next((e["cumulative_us"] for e in reversed(entries) if e["module"] == target), 0)
+        if best is None or total < best[0]:
+            best = (total, entries)
+    total, entries = best
+    slowest = sorted((e for e in entries if e["module"] != target), key=lambda e: e["cumulative_us"], reverse=True)
+    return {
+        "target": target,
+        "total_ms": round(total / 1000.0, 1),
+        "modules_imported": len(entries),
+        "slowest": [
+            {"module": e["module"], "cumulative_ms": round(e["cumulative_us"] / 1000.0, 1),
+             "self_ms": round(e["self_us"] / 1000.0, 1)}
+            for e in slowest[:top]
+        ],
+    }
+
+
+def print_report(report: dict):
+    print(f"\n=== import {report['target']}: {report['total_ms']} ms, {report['modules_imported']} modules ===")
+    for entry in report["slowest"]:
+        print(f"  {entry['cumulative_ms']:>8.1f} ms  (self {entry['self_ms']:>6.1f})  {entry['module']}")
+
+
+def compare_to_baseline(reports: list, baseline: dict, tolerance: float) -> list:
+    """Return a description of every target whose import time grew by more than tolerance."""
+    old_totals = {r["target"]: r["total_ms"] for r in baseline.get("reports", [])}
+    regressions = []
+    for report in reports:
+        old = old_totals.get(report["target"])
+        if not old:
+            continue
+        change = (report["total_ms"] - old) / old
+        if change > tolerance:
+            regressions.append(f"import {report['target']}: {old} ms -> {report['total_ms']} ms ({change:+.1%})")
+    return regressions
+
+
+def run_importtime(args) -> int:
+    reports = [import_report(target, args.runs, args.top) for target in args.targets]
+    for report in reports:
+        print_report(report)
+
+    if args.save_baseline:
+        with open(args.save_baseline, "w") as f:
+            json.dump({
+                "environment": {"python": platform.python_version(), "platform": platform.platform()},
+                "reports": reports
+            }, f, indent=2)
+        print(f"\nBaseline saved to '{args.save_baseline}'")
+
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = json.load(f)
+        regressions = compare_to_baseline(reports, baseline, args.tolerance)
+        if regressions:
+            print("\nStartup regressions against baseline:")
+            for regression in regressions:
+                print(f"  {regression}")
+            return 1
+        print("\nNo startup regressions against baseline.")
+    return 0
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Diagnostics for the chat application.")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    importtime = commands.add_parser("importtime", help="Report cold-start import time")
+    importtime.add_argument("--targets", nargs="+", default=list(DEFAULT_TARGETS), help="Modules to import")
+    importtime.add_argument("--top", type=int, default=DEFAULT_TOP, help="Slowest imports to list per target")
+    importtime.add_argument("--runs", type=int, default=DEFAULT_RUNS, help="Fresh imports per target (best is kept)")
+    importtime.add_argument("--save-baseline", help="Write the reports to this JSON file")
+    importtime.add_argument("--compare", help="Baseline JSON file to check for regressions")
+    importtime.add_argument("--tolerance", type=float, default=DEFAULT_TOLERANCE,
+                            help="Allowed relative slowdown before failing")
+    importtime.set_defaults(handler=run_importtime)
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    return args.handler(args)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,190 @@
+"""
+Flow Script - Declarative Question Flows
+Loads the reflection questions and their scripted steps from the "flow_script"
+section of example_flow.json. Each question lists the steps that follow the user's
+answers: "generate" steps ask the follow-up chain for the next message, guided by the
+step's optional instruction, and a "transition" step offers to move on without asking
+the LLM. Once a question's steps are used up, the LLM decides as for unscripted questions.
+
+Format:
+    "flow_script": {
+        "transition_question": "...",
+        "affirmative_responses": ["yes", "y"],
+        "questions": [
+            {"id": "success", "question": "...", "fallback_follow_up": "...",
+             "steps": [{"id": "impact", "type": "generate", "instruction": "..."}, ...,
+                       {"id": "offer_move_on", "type": "transition"}]}
+        ]
+    }
+"""
+
+import json
+
+FLOW_SCRIPT_KEY = "flow_script"
+
+STEP_GENERATE = "generate"
+STEP_TRANSITION = "transition"
+STEP_TYPES = (STEP_GENERATE, STEP_TRANSITION)
+
+
+class FlowStep:
+    """One scripted assistant turn; instruction tells the follow-up chain what a generate step is for."""
+
+    def __init__(self, step_id: str, step_type: str, instruction: str = None):
+        self.id = step_id
+        self.type = step_type
+        self.instruction = instruction
+
+    def __repr__(self):
+        return f"FlowStep({self.id!r}, {self.type!r})"
+
+
+class QuestionFlow:
+    """A reflection question and the steps scripted after each of the user's answers."""
+
+    def __init__(self, question_id: str, question: str, steps: list, fallback_follow_up: str = None):
+        self.id = question_id
+        self.question = question
+        self.steps = list(steps)
+        self.fallback_follow_up = fallback_follow_up
+
+    def step_after(self, user_turns: int):
+        """The step answering the user's user_turns-th reply on this topic, or None once unscripted."""
+        index = user_turns - 1
+        return self.steps[index] if 0 <= index < len(self.steps) else None
+
+    @property
+    def transition_step(self):
+        """The final step when it offers to move on, else None."""
+        if self.steps and self.steps[-1].type == STEP_TRANSITION:
+            return self.steps[-1]
+        return None
+
+
+class FlowScript:
+    """The validated flow: questions in order, the transition question and yes/no answers."""
+
+    def __init__(self, questions: list, transition_question: str, affirmative_responses):
+        self.flows = list(questions)
+        self.transition_question = transition_question
+        self.affirmative_responses = frozenset(affirmative_responses)
+        self._by_question = {flow.question: flow for flow in self.flows}
+
+    @property
+    def questions(self) -> list:
+        return [flow.question for flow in self.flows]
+
+    @property
+    def scripted_questions(self) -> tuple:
+        return tuple(flow.question for flow in self.flows if flow.steps)
+
+    def get_flow(self, question: str):
+        return self._by_question.get(question)
+
+    def step_for(self, question: str, user_turns: int):
+        """
+        The scripted step for the next assistant turn.
+
+        Args:
+            question: Reflection question of the current topic
+            user_turns: User messages on the topic so far, including the one being answered
+
+        Returns:
+            FlowStep or None when the turn isn't scripted
+        """
+        flow = self._by_question.get(question)
+        return flow.step_after(user_turns) if flow is not None else None
+
+    def fallback_follow_ups(self) -> dict:
+        """question -> pre-written follow-up, for questions that define one."""
+        return {flow.question: flow.fallback_follow_up for flow in self.flows if flow.fallback_follow_up}
+
+
+def _require_text(value, where: str) -> str:
+    if not isinstance(value, str) or not value.strip():
+        raise ValueError(f"{where}: expected a non-empty string")
+    return value
+
+
+def _parse_step(data, where: str) -> FlowStep:
+    if not isinstance(data, dict):
+        raise ValueError(f"{where}: expected an object")
+    step_id = _require_text(data.get("id"), f"{where}.id")
+    step_type = data.get("type")
+    if step_type not in STEP_TYPES:
+        raise ValueError(f"{where}.type: unknown step type {step_type!r}, expected one of {STEP_TYPES}")
+    instruction = data.get("instruction")
+    if instruction is not None:
+        if step_type != STEP_GENERATE:
+            raise ValueError(f"{where}.instruction: only '{STEP_GENERATE}' steps take an instruction")
+        _require_text(instruction, f"{where}.instruction")
+    return FlowStep(step_id, step_type, instruction)
+
+
+def _parse_question(data, where: str) -> QuestionFlow:
+    if not isinstance(data, dict):
+        raise ValueError(f"{where}: expected an object")
+    steps_data = data.get("steps", [])
+    if not isinstance(steps_data, list):
+        raise ValueError(f"{where}.steps: expected a list")
+    steps = [_parse_step(step, f"{where}.steps[{i}]") for i, step in enumerate(steps_data)]
+    step_ids = [step.id for step in steps]
+    if len(set(step_ids)) != len(step_ids):
+        raise ValueError(f"{where}.steps: step ids must be unique")
+    # Offering to move on hands the pacing back to the user, so nothing can be scripted after it
+    for step in steps[:-1]:
+        if step.type == STEP_TRANSITION:
+            raise ValueError(f"{where}.steps: a '{STEP_TRANSITION}' step must be the last step")
+    fallback = data.get("fallback_follow_up")
+    if fallback is not None:
+        _require_text(fallback, f"{where}.fallback_follow_up")
+    return QuestionFlow(
+        _require_text(data.get("id"), f"{where}.id"),
+        _require_text(data.get("question"), f"{where}.question"),
+        steps,
+        fallback
+    )
+
+
+def parse_flow_script(data: dict) -> FlowScript:
+    """
+    Validate a "flow_script" object and build the FlowScript.
+
+    Raises:
+        ValueError: The script is malformed, naming the offending field
+    """
+    where = FLOW_SCRIPT_KEY
+    if not isinstance(data, dict):
+        raise ValueError(f"{where}: expected an object")
+    questions_data = data.get("questions")
+    if not isinstance(questions_data, list) or not questions_data:
+        raise ValueError(f"{where}.questions: expected a non-empty list")
+    questions = [_parse_question(q, f"{where}.questions[{i}]") for i, q in enumerate(questions_data)]
+    for attribute in ("id", "question"):
+        values = [getattr(q, attribute) for q in questions]
+        if len(set(values)) != len(values):
+            raise ValueError(f"{where}.questions: question {attribute}s must be unique")
+
+    responses = data.get("affirmative_responses")
+    if not isinstance(responses, list) or not responses:
+        raise ValueError(f"{where}.affirmative_responses: expected a non-empty list")
+    responses = [_require_text(r, f"{where}.affirmative_responses[{i}]").strip().lower()
+                 for i, r in enumerate(responses)]
+
+    return FlowScript(
+        questions,
+        _require_text(data.get("transition_question"), f"{where}.transition_question"),
+        responses
+    )
+
+
+def load_flow_script(path: str) -> FlowScript:
+    """Read and validate the flow script section of an example flow file."""
+    with open(path, encoding="utf-8") as f:
+        data = json.load(f)
+    if FLOW_SCRIPT_KEY not in data:
+        raise ValueError(f"{path}: missing '{FLOW_SCRIPT_KEY}' section")
+    try:
+        return parse_flow_script(data[FLOW_SCRIPT_KEY])
+    except ValueError as error:
+        raise ValueError(f"{path}: {error}") from None
@@ -0,0 +1,154 @@
+"""
+Hedged Requests - Latency Budgets for LLM Calls
+Runs an async call (or the start of a stream) against a latency budget. When the
+budget runs out a duplicate "hedge" request is started and whichever answers first
+wins; if neither answers within the hedge's own budget, DeadlineExceeded is raised
+so the caller can degrade instead of waiting on a tail request.
+
+Each attempt calls its on_start callback once the request is actually sent (e.g. when
+the scheduler grants it a slot), and its budget runs from there: time spent queued
+locally isn't a slow model, and a hedge would only queue behind the original.
+"""
+
+import asyncio
+
+# Duplicate requests started after the first one misses its budget
+MAX_HEDGES = 1
+
+_EMPTY = object()
+
+
+class DeadlineExceeded(TimeoutError):
+    """A chain call and its hedges all missed their latency budget."""
+
+    def __init__(self, chain: str, seconds: float):
+        super().__init__(f"Chain '{chain}' got no response within {seconds:.1f}s")
+        self.chain = chain
+        self.seconds = seconds
+
+
+async def _race(chain, start, budget, on_hedge=None):
+    """
+    Await start(on_start), starting a hedge each time the latest attempt runs out of budget.
+
+    An attempt's budget starts when it calls on_start, and no hedge is started while
+    the latest attempt is still waiting to be sent.
+
+    Returns:
+        tuple: (index of the winning attempt, its result)
+    """
+    loop = asyncio.get_running_loop()
+    started = asyncio.Event()
+    tasks = []
+    started_at = []  # per attempt, loop time it was sent or None while queued
+
+    def launch():
+        index = len(tasks)
+        started_at.append(None)
+
+        def on_start():
+            started_at[index] = loop.time()
+            started.set()
+
+        tasks.append(asyncio.ensure_future(start(on_start)))
+
+    launch()
+    try:
+        while True:
+            for task in tasks:
+                if task.done() and not task.cancelled() and task.exception() is None:
+                    return tasks.index(task), task.result()
+            if all(task.done() for task in tasks):
+                # Every attempt failed outright; that isn't a latency problem, so don't hedge it
+                raise tasks[-1].exception()
+            timeout = None
+            if started_at[-1] is not None:
+                timeout = started_at[-1] + budget - loop.time()
+                if timeout <= 0:
+                    if len(tasks) > MAX_HEDGES:
+                        raise DeadlineExceeded(chain, loop.time() - started_at[0])
+                    if on_hedge is not None:
+                        on_hedge()
+                    launch()
+                    continue
+            started.clear()
+            waiter = asyncio.ensure_future(started.wait())
+            try:
+                await asyncio.wait(
+                    [task for task in tasks if not task.done()] + [waiter],
+                    timeout=timeout, return_when=asyncio.FIRST_COMPLETED
+                )
+            finally:
+                waiter.cancel()
+    finally:
+        losers = [task for task in tasks if not task.done()]
+        for task in losers:
+            task.cancel()
+        # Let the losers release their slots and report their cancellation before returning
+        await asyncio.gather(*losers, return_exceptions=True)
+
+
+async def hedged_call(chain, make_call, budget, on_hedge=None):
+    """
+    Await make_call() within budget seconds, hedging once it runs out.
+
+    Args:
+        chain: Chain name, for DeadlineExceeded
+        make_call: make_call(on_start) returns a fresh awaitable for each attempt, which
+            calls on_start (if not None) when the request is sent
+        budget: Seconds each attempt is given after it is sent before the next starts,
+            or None for no deadline
+        on_hedge: Optional callback run when a hedge is started
+    """
+    if budget is None:
+        return await make_call(None)
+    _, result = await _race(chain, make_call, budget, on_hedge)
+    return result
+
+
+async def hedged_stream(chain, make_stream, budget, on_hedge=None):
+    """
+    Yield from make_stream(), hedging if the first chunk doesn't arrive within budget.
+
+    make_stream(on_start) works like hedged_call's make_call. The budget covers the
+    time from sending to the first chunk; the attempt that produces it is streamed to
+    the end and the others are closed. After that, a stream that goes longer than the
+    budget between chunks raises DeadlineExceeded.
+    """
+    if budget is None:
+        async for chunk in make_stream(None):
+            yield chunk
+        return
+
+    streams = []
+
+    async def first_chunk(stream):
+        async for chunk in stream:
+            return chunk
+        return _EMPTY
+
+    def start(on_start):
+        stream = make_stream(on_start)
+        streams.append(stream)
+        return first_chunk(stream)
+
+    index, first = await _race(chain, start, budget, on_hedge)
+    stream = streams[index]
+    for loser in streams:
+        if loser is not stream:
+            # Another attempt may have produced its first chunk in the same step
+            await loser.aclose()
+    try:
+        if first is _EMPTY:
+            return
+        yield first
+        while True:
+            try:
+                chunk = await asyncio.wait_for(stream.__anext__(), budget)
+            except StopAsyncIteration:
+                return
+            except asyncio.TimeoutError:
+                raise DeadlineExceeded(chain, budget) from None
+            yield chunk
+    finally:
+        await stream.aclose()
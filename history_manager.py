@@ -0,0 +1,108 @@
+"""
+History Manager - Prompt History Compaction
+Keeps the chat history sent to each chain within a token budget.
+The current topic is kept verbatim; earlier topics are replaced by short
+per-topic summaries that are built once and reused on every later turn.
+"""
+
+from prompt_builder import count_message_tokens, truncate_to_tokens
+
+# Prompt history budget (in tokens) for each chain
+HISTORY_TOKEN_BUDGETS = {
+    "follow_up": 1500,
+    "move_to_next": 1000,
+    "turn_decision": 1500,
+    "summary": 3000,
+}
+DEFAULT_HISTORY_TOKEN_BUDGET = 1500
+
+# Upper bound for a single earlier-topic summary
+TOPIC_SUMMARY_MAX_TOKENS = 80
+
+ROLE_TOPIC_SUMMARY = "earlier_topic"
+
+
+def split_into_topics(chat_history: list, topic_questions: list) -> list:
+    """
+    Split chat history into topics, each starting at one of the reflection questions.
+
+    Messages before the first reflection question form their own topic.
+    """
+    topics = []
+    for message in chat_history:
+        if not topics or (message["role"] == "assistant" and message["content"] in topic_questions):
+            topics.append([])
+        topics[-1].append(message)
+    return topics
+
+
+class HistoryManager:
+    """
+    Builds token-budgeted chat history for the chains.
+
+    Earlier topics are closed, so their summaries are computed once and cached
+    on the instance; keep one manager per conversation.
+    """
+
+    def __init__(self, topic_questions: list, token_budgets: dict = None,
+                 summary_max_tokens: int = TOPIC_SUMMARY_MAX_TOKENS):
+        self.topic_questions = list(topic_questions)
+        self.token_budgets = dict(HISTORY_TOKEN_BUDGETS if token_budgets is None else token_budgets)
+        self.summary_max_tokens = summary_max_tokens
+        self._topic_summaries = {}
+
+    def summarize_topic(self, topic_index: int, topic_messages: list) -> dict:
+        """Return the compact summary message for a finished topic, reusing earlier results."""
+        key = (topic_index, len(topic_messages))
+        if key not in self._topic_summaries:
+            opening = topic_messages[0]["content"] if topic_messages else ""
+            answers = "; ".join(msg["content"] for msg in topic_messages if msg["role"] == "user")
+            summary = f"Q: {opening} | User said: {answers}" if answers else f"Q: {opening}"
+            self._topic_summaries[key] = {
+                "role": ROLE_TOPIC_SUMMARY,
+                "content": truncate_to_tokens(summary, self.summary_max_tokens)
+            }
+        return self._topic_summaries[key]
+
+    def build(self, chat_history: list, chain_name: str) -> list:
+        """
+        Build the history to send to a chain within that chain's token budget.
+
+        The current topic is kept verbatim. Earlier topics are replaced by their
+        summaries, dropping the oldest first when over budget. If the current
+        topic alone is over budget, its opening question and latest messages are kept.
+        """
+        budget = self.token_budgets.get(chain_name, DEFAULT_HISTORY_TOKEN_BUDGET)
+        if count_message_tokens(chat_history) <= budget:
+            return list(chat_history)
+
+        topics = split_into_topics(chat_history, self.topic_questions)
+        current_topic = topics[-1]
+        summaries = [self.summarize_topic(idx, topic) for idx, topic in enumerate(topics[:-1])]
+
+        current_tokens = count_message_tokens(current_topic)
+        if current_tokens > budget:
+            return self._trim_topic(current_topic, budget)
+
+        remaining = budget - current_tokens
+        kept_summaries = []
+        for summary in reversed(summaries):
+            summary_tokens = count_message_tokens([summary])
+            if summary_tokens > remaining:
+                break
+            kept_summaries.insert(0, summary)
+            remaining -= summary_tokens
+        return kept_summaries + current_topic
+
+    def _trim_topic(self, topic_messages: list, budget: int) -> list:
+        """Keep the topic's opening message plus as many recent messages as fit."""
+        opening, rest = topic_messages[0], topic_messages[1:]
+        remaining = budget - count_message_tokens([opening])
+        kept = []
+        for message in reversed(rest):
+            message_tokens = count_message_tokens([message])
+            if message_tokens > remaining:
+                break
+            kept.insert(0, message)
+            remaining -= message_tokens
+        return [opening] + kept
@@ -0,0 +1,363 @@
+"""
+Instrumentation - Chain Metrics
+LangChain callback handler recording per-chain latency, token usage, parse failures
+and cache hits, labelled by chain and model. Metrics can be exposed in Prometheus text
+format over HTTP and written as periodic JSON snapshots.
+"""
+
+import os
+import json
+import time
+import bisect
+import asyncio
+import logging
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from langchain_core.callbacks import BaseCallbackHandler
+
+logger = logging.getLogger(__name__)
+
+# Upper bounds (seconds) of the latency histogram buckets
+LATENCY_BUCKETS = (0.05, 0.1, 0.25, 0.5, 1.0, 2.0, 4.0, 8.0, 16.0, 32.0)
+
+METRICS_PORT = os.getenv("METRICS_PORT")
+METRICS_SNAPSHOT_PATH = os.getenv("METRICS_SNAPSHOT_PATH")
+METRICS_SNAPSHOT_INTERVAL_SECONDS = float(os.getenv("METRICS_SNAPSHOT_INTERVAL_SECONDS", "60"))
+
+_HELP = {
+    "chain_latency_seconds": ("histogram", "Wall time of one chain invocation."),
+    "chain_invocations_total": ("counter", "Chain invocations by outcome."),
+    "llm_prompt_tokens_total": ("counter", "Prompt tokens reported by the model."),
+    "llm_completion_tokens_total": ("counter", "Completion tokens reported by the model."),
+    "parse_failures_total": ("counter", "Model outputs a parser could not parse and fell back on."),
+    "response_cache_requests_total": ("counter", "Response cache lookups by result."),
+    "chain_hedges_total": ("counter", "Hedged duplicate requests started after a chain missed its latency budget."),
+    "chain_deadline_exceeded_total": ("counter", "Chain calls abandoned after the hedge also missed its budget."),
+    "semantic_cache_requests_total": ("counter", "Semantic follow-up cache lookups by result."),
+    "model_routes_total": ("counter", "Chain calls routed to each model, primary or fallback."),
+    "prompt_section_tokens_total": ("counter", "Estimated prompt tokens sent, by chain and prompt section."),
+}
+
+
+class MetricsRegistry:
+    """Thread-safe labelled counters and histograms."""
+
+    def __init__(self, buckets=LATENCY_BUCKETS):
+        self.buckets = tuple(buckets)
+        self._lock = threading.Lock()
+        self._counters = {}    # (name, labels) -> value
+        self._histograms = {}  # (name, labels) -> {"counts": [...], "sum": float, "count": int}
+
+    @staticmethod
+    def _key(name, labels):
+        return name, tuple(sorted(labels.items()))
+
+    def inc(self, name: str, amount: float = 1, **labels):
+        key = self._key(name, labels)
+        with self._lock:
+            self._counters[key] = self._counters.get(key, 0) + amount
+
+    def observe(self, name: str, value: float, **labels):
+        key = self._key(name, labels)
+        with self._lock:
+            histogram = self._histograms.get(key)
+            if histogram is None:
+                histogram = {"counts": [0] * (len(self.buckets) + 1), "sum": 0.0, "count": 0}
+                self._histograms[key] = histogram
+            histogram["counts"][bisect.bisect_left(self.buckets, value)] += 1
+            histogram["sum"] += value
+            histogram["count"] += 1
+
+    def snapshot(self) -> dict:
+        """All metrics as plain data."""
+        with self._lock:
+            return {
+                "timestamp": time.time(),
+                "counters": [
+                    {"name": name, "labels": dict(labels), "value": value}
+                    for (name, labels), value in self._counters.items()
+                ],
+                "histograms": [
+                    {"name": name, "labels": dict(labels), "buckets": list(self.buckets),
+                     "counts": list(h["counts"]), "sum": h["sum"], "count": h["count"]}
+                    for (name, labels), h in self._histograms.items()
+                ],
+            }
+
+    def render_prometheus(self) -> str:
+        """All metrics in the Prometheus text exposition format."""
+        snapshot = self.snapshot()
+        lines = []
+        described = set()
+
+        def describe(name):
+            if name not in described and name in _HELP:
+                metric_type, help_text = _HELP[name]
+                lines.append(f"# HELP {name} {help_text}")
+                lines.append(f"# TYPE {name} {metric_type}")
+                described.add(name)
+
+        for counter in sorted(snapshot["counters"], key=lambda c: c["name"]):
+            describe(counter["name"])
+            lines.append(f"{counter['name']}{_format_labels(counter['labels'])} {counter['value']}")
+
+        for histogram in sorted(snapshot["histograms"], key=lambda h: h["name"]):
+            name, labels = histogram["name"], histogram["labels"]
+            describe(name)
+            cumulative = 0
+            for bound, count in zip(list(histogram["buckets"]) + ["+Inf"], histogram["counts"]):
+                cumulative += count
+                lines.append(f"{name}_bucket{_format_labels(dict(labels, le=str(bound)))} {cumulative}")
+            lines.append(f"{name}_sum{_format_labels(labels)} {histogram['sum']}")
+            lines.append(f"{name}_count{_format_labels(labels)} {histogram['count']}")
+        return "\n".join(lines) + "\n"
+
+
+def _format_labels(labels: dict) -> str:
+    if not labels:
+        return ""
+    escaped = (
+        '{}="{}"'.format(key, str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n"))
+        for key, value in sorted(labels.items())
+    )
+    return "{" + ",".join(escaped) + "}"
+
+
+METRICS = MetricsRegistry()
+
+
+def record_parse_failure(parser: str):
+    """Count an output the parser had to fall back on."""
+    METRICS.inc("parse_failures_total", parser=parser)
+
+
+def record_cache_lookup(chain: str, model: str, hit: bool):
+    """Count a response cache lookup."""
+    METRICS.inc("response_cache_requests_total", chain=chain, model=model, result="hit" if hit else "miss")
+
+
+def record_semantic_cache_lookup(chain: str, hit: bool):
+    """Count a semantic cache lookup."""
+    METRICS.inc("semantic_cache_requests_total", chain=chain, result="hit" if hit else "miss")
+
+
+def record_hedge(chain: str):
+    """Count a hedged duplicate request."""
+    METRICS.inc("chain_hedges_total", chain=chain)
+
+
+def record_deadline_exceeded(chain: str):
+    """Count a chain call that ran out of time."""
+    METRICS.inc("chain_deadline_exceeded_total", chain=chain)
+
+
+def record_prompt_sections(chain: str, sections: dict):
+    """Count the tokens of each section of a prompt about to be sent."""
+    for section, tokens in sections.items():
+        METRICS.inc("prompt_section_tokens_total", tokens, chain=chain, section=section)
+
+
+class ChainMetricsHandler(BaseCallbackHandler):
+    """
+    Callback handler timing top-level chain runs and collecting token usage.
+
+    Chains are identified by the "chain", "model" and "attempt" entries of the run
+    metadata (see modules._chain_config). A cancelled call gets no end or error callback
+    for its model run, so the call wrapper reports it through on_attempt_cancelled.
+    """
+
+    # Run in the caller rather than an executor, so callbacks arrive in order
+    run_inline = True
+
+    def __init__(self, registry: MetricsRegistry = METRICS):
+        self.registry = registry
+        self._runs = {}      # chain run id -> (start time, chain, model, attempt)
+        self._llm_runs = {}  # model run id -> (chain, model, attempt)
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def _labels(metadata):
+        metadata = metadata or {}
+        return metadata.get("chain", "unknown"), metadata.get("model", "unknown"), metadata.get("attempt")
+
+    def on_chain_start(self, serialized, inputs, *, run_id, parent_run_id=None, metadata=None, **kwargs):
+        if parent_run_id is None:
+            with self._lock:
+                self._runs[run_id] = (time.perf_counter(), *self._labels(metadata))
+
+    def _observe(self, run, outcome):
+        started, chain, model, _ = run
+        self.registry.observe("chain_latency_seconds", time.perf_counter() - started, chain=chain, model=model)
+        self.registry.inc("chain_invocations_total", chain=chain, model=model, outcome=outcome)
+
+    def _finish(self, run_id, outcome):
+        with self._lock:
+            run = self._runs.pop(run_id, None)
+        if run is not None:
+            self._observe(run, outcome)
+
+    def on_chain_end(self, outputs, *, run_id, parent_run_id=None, **kwargs):
+        if parent_run_id is None:
+            self._finish(run_id, "success")
+
+    def on_chain_error(self, error, *, run_id, parent_run_id=None, **kwargs):
+        if parent_run_id is None:
+            self._finish(run_id, "cancelled" if isinstance(error, asyncio.CancelledError) else "error")
+
+    def on_attempt_cancelled(self, attempt: str):
+        """Count a cancelled chain call and drop what is still pending for it."""
+        with self._lock:
+            runs = [run_id for run_id, run in self._runs.items() if run[3] == attempt]
+            runs = [self._runs.pop(run_id) for run_id in runs]
+            for run_id in [run_id for run_id, labels in self._llm_runs.items() if labels[2] == attempt]:
+                del self._llm_runs[run_id]
+        for run in runs:
+            self._observe(run, "cancelled")
+
+    def on_chat_model_start(self, serialized, messages, *, run_id, metadata=None, **kwargs):
+        with self._lock:
+            self._llm_runs[run_id] = self._labels(metadata)
+
+    def on_llm_start(self, serialized, prompts, *, run_id, metadata=None, **kwargs):
+        with self._lock:
+            self._llm_runs[run_id] = self._labels(metadata)
+
+    def on_llm_error(self, error, *, run_id, **kwargs):
+        with self._lock:
+            self._llm_runs.pop(run_id, None)
+
+    def on_llm_end(self, response, *, run_id, **kwargs):
+        with self._lock:
+            labels = self._llm_runs.pop(run_id, None)
+        prompt_tokens, completion_tokens = _token_usage(response)
+        if labels is None or (not prompt_tokens and not completion_tokens):
+            return
+        chain, model, _ = labels
+        self.registry.inc("llm_prompt_tokens_total", prompt_tokens, chain=chain, model=model)
+        self.registry.inc("llm_completion_tokens_total", completion_tokens, chain=chain, model=model)
+
+
+def _token_usage(response):
+    """Prompt and completion tokens from an LLMResult, streamed or not."""
+    usage = (response.llm_output or {}).get("token_usage") or {}
+    if usage:
+        return usage.get("prompt_tokens", 0), usage.get("completion_tokens", 0)
+    prompt_tokens = completion_tokens = 0
+    for generations in response.generations:
+        for generation in generations:
+            usage_metadata = getattr(getattr(generation, "message", None), "usage_metadata", None)
+            if usage_metadata:
+                prompt_tokens += usage_metadata.get("input_tokens", 0)
+                completion_tokens += usage_metadata.get("output_tokens", 0)
+    return prompt_tokens, completion_tokens
+
+
+METRICS_HANDLER = ChainMetricsHandler()
+
+
+class RawOutputRecorder(BaseCallbackHandler):
+    """
+    Callback handler keeping the raw model output of each chain call, next to the
+    parsed value the chain returns, so debugging needs no second call.
+
+    Calls answered from the response cache never reach the model and record nothing,
+    and neither do cancelled calls.
+    """
+
+    run_inline = True
+
+    def __init__(self):
+        self._labels = {}  # model run id -> (chain, attempt)
+        self._outputs = []
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def _label(metadata):
+        metadata = metadata or {}
+        return metadata.get("chain", "unknown"), metadata.get("attempt")
+
+    def on_chat_model_start(self, serialized, messages, *, run_id, metadata=None, **kwargs):
+        with self._lock:
+            self._labels[run_id] = self._label(metadata)
+
+    def on_llm_start(self, serialized, prompts, *, run_id, metadata=None, **kwargs):
+        with self._lock:
+            self._labels[run_id] = self._label(metadata)
+
+    def on_llm_error(self, error, *, run_id, **kwargs):
+        with self._lock:
+            self._labels.pop(run_id, None)
+
+    def on_llm_end(self, response, *, run_id, **kwargs):
+        text = "".join(generation.text for generations in response.generations for generation in generations)
+        with self._lock:
+            chain, _ = self._labels.pop(run_id, ("unknown", None))
+            self._outputs.append({"chain": chain, "raw": text})
+
+    def on_attempt_cancelled(self, attempt: str):
+        with self._lock:
+            for run_id in [run_id for run_id, (_, label) in self._labels.items() if label == attempt]:
+                del self._labels[run_id]
+
+    def pop(self) -> list:
+        """Return the outputs recorded since the last call, oldest first."""
+        with self._lock:
+            outputs, self._outputs = self._outputs, []
+        return outputs
+
+
+class _PrometheusHandler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        if self.path.rstrip("/") not in ("", "/metrics"):
+            self.send_error(404)
+            return
+        body = METRICS.render_prometheus().encode("utf-8")
+        self.send_response(200)
+        self.send_header("Content-Type", "text/plain; version=0.0.4; charset=utf-8")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+def serve_prometheus(port: int, host: str = "0.0.0.0") -> ThreadingHTTPServer:
+    """Serve /metrics in Prometheus text format from a background thread."""
+    server = ThreadingHTTPServer((host, port), _PrometheusHandler)
+    threading.Thread(target=server.serve_forever, name="metrics-http", daemon=True).start()
+    return server
+
+
+def write_snapshot(path: str, extra: dict = None):
+    """Write the current metrics as JSON, replacing the file atomically."""
+    snapshot = METRICS.snapshot()
+    if extra:
+        snapshot.update(extra)
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, "w") as f:
+        json.dump(snapshot, f, indent=2)
+    os.replace(tmp_path, path)
+
+
+def start_snapshot_writer(path: str, interval: float = METRICS_SNAPSHOT_INTERVAL_SECONDS, extra=None):
+    """Write a JSON snapshot every interval seconds; extra() may add fields to each snapshot."""
+    def loop():
+        while True:
+            time.sleep(interval)
+            try:
+                write_snapshot(path, extra() if extra else None)
+            except Exception:
+                # A failed snapshot must not stop the writer; the next one may succeed
+                logger.exception("Writing the metrics snapshot to %s failed", path)
+    thread = threading.Thread(target=loop, name="metrics-snapshot", daemon=True)
+    thread.start()
+    return thread
+
+
+def start_exporters(extra=None):
+    """Start the exporters configured by METRICS_PORT and METRICS_SNAPSHOT_PATH."""
+    if METRICS_PORT:
+        serve_prometheus(int(METRICS_PORT))
+    if METRICS_SNAPSHOT_PATH:
+        start_snapshot_writer(METRICS_SNAPSHOT_PATH, extra=extra)
@@ -0,0 +1,280 @@
+"""
+LLM Scheduler - Process-wide Rate Limiting
+Every chain invocation goes through one shared scheduler, so all sessions together stay
+within the OpenAI request and token limits. Calls wait in a priority queue (interactive
+before background), at most max_concurrency run at once, and 429s back off everyone,
+honouring Retry-After.
+"""
+
+import os
+import time
+import heapq
+import random
+import asyncio
+import logging
+import itertools
+import threading
+from contextlib import contextmanager
+
+logger = logging.getLogger(__name__)
+
+PRIORITY_INTERACTIVE = 0
+PRIORITY_BACKGROUND = 10
+
+DEFAULT_REQUESTS_PER_MINUTE = int(os.getenv("OPENAI_RPM_LIMIT", "500"))
+DEFAULT_TOKENS_PER_MINUTE = int(os.getenv("OPENAI_TPM_LIMIT", "80000"))
+DEFAULT_MAX_CONCURRENCY = int(os.getenv("OPENAI_MAX_CONCURRENCY", "16"))
+DEFAULT_MAX_RETRIES = 4
+BASE_BACKOFF_SECONDS = 1.0
+MAX_BACKOFF_SECONDS = 60.0
+
+# Longest a waiter sleeps before re-checking its place in the queue
+MAX_POLL_SECONDS = 0.05
+
+
+class TokenBucket:
+    """Refills continuously at rate_per_minute, holding at most one minute's worth."""
+
+    def __init__(self, rate_per_minute: float):
+        self.capacity = float(rate_per_minute)
+        self.rate_per_second = rate_per_minute / 60.0
+        self.available = self.capacity
+        self.updated_at = time.monotonic()
+
+    def _refill(self, now: float):
+        self.available = min(self.capacity, self.available + (now - self.updated_at) * self.rate_per_second)
+        self.updated_at = now
+
+    def wait_time(self, amount: float, now: float) -> float:
+        """Seconds until amount can be taken (0 if it can be taken now)."""
+        self._refill(now)
+        # A single call larger than the bucket is let through once the bucket is full
+        amount = min(amount, self.capacity)
+        if self.available >= amount:
+            return 0.0
+        return (amount - self.available) / self.rate_per_second
+
+    def consume(self, amount: float):
+        self.available -= min(amount, self.capacity)
+
+
+def is_rate_limit_error(error: Exception) -> bool:
+    """Whether error is an HTTP 429 from the provider."""
+    return getattr(error, "status_code", None) == 429
+
+
+def get_retry_after(error: Exception):
+    """Seconds to wait according to the Retry-After headers of a 429, if present."""
+    response = getattr(error, "response", None)
+    headers = getattr(response, "headers", None) or {}
+    for header, scale in (("retry-after-ms", 0.001), ("retry-after", 1.0)):
+        value = headers.get(header)
+        if value is None:
+            continue
+        try:
+            return float(value) * scale
+        except ValueError:
+            # HTTP-date form; fall back to exponential backoff
+            return None
+    return None
+
+
+class _Ticket:
+    __slots__ = ("priority", "seq", "tokens", "cancelled")
+
+    def __init__(self, priority: int, seq: int, tokens: int):
+        self.priority = priority
+        self.seq = seq
+        self.tokens = tokens
+        self.cancelled = False
+
+    def __lt__(self, other):
+        return (self.priority, self.seq) < (other.priority, other.seq)
+
+
+class LLMScheduler:
+    """Token-bucket limiter, concurrency cap and priority queue for LLM calls."""
+
+    def __init__(self, requests_per_minute: int = DEFAULT_REQUESTS_PER_MINUTE,
+                 tokens_per_minute: int = DEFAULT_TOKENS_PER_MINUTE,
+                 max_concurrency: int = DEFAULT_MAX_CONCURRENCY,
+                 max_retries: int = DEFAULT_MAX_RETRIES):
+        self.requests = TokenBucket(requests_per_minute)
+        self.tokens = TokenBucket(tokens_per_minute)
+        self.max_concurrency = max_concurrency
+        self.max_retries = max_retries
+        self._lock = threading.Lock()
+        self._changed = threading.Condition(self._lock)
+        self._queue = []
+        self._seq = itertools.count()
+        self._active = 0
+        self._blocked_until = 0.0
+
+    def _enqueue(self, priority: int, tokens: int) -> _Ticket:
+        with self._lock:
+            ticket = _Ticket(priority, next(self._seq), tokens)
+            heapq.heappush(self._queue, ticket)
+            return ticket
+
+    def _try_acquire(self, ticket: _Ticket) -> float:
+        """Grant the slot if ticket is first in line and limits allow; else return how long to wait."""
+        while self._queue and self._queue[0].cancelled:
+            heapq.heappop(self._queue)
+        if self._queue[0] is not ticket or self._active >= self.max_concurrency:
+            return MAX_POLL_SECONDS
+        now = time.monotonic()
+        wait = max(
+            self._blocked_until - now,
+            self.requests.wait_time(1, now),
+            self.tokens.wait_time(ticket.tokens, now)
+        )
+        if wait > 0:
+            return wait
+        heapq.heappop(self._queue)
+        self.requests.consume(1)
+        self.tokens.consume(ticket.tokens)
+        self._active += 1
+        return 0.0
+
+    def _cancel(self, ticket: _Ticket):
+        with self._lock:
+            ticket.cancelled = True
+            self._changed.notify_all()
+
+    def acquire(self, priority: int = PRIORITY_INTERACTIVE, tokens: int = 0):
+        """Block until a call may start."""
+        ticket = self._enqueue(priority, tokens)
+        try:
+            with self._lock:
+                while True:
+                    wait = self._try_acquire(ticket)
+                    if wait == 0:
+                        return
+                    self._changed.wait(wait)
+        except BaseException:
+            self._cancel(ticket)
+            raise
+
+    async def aacquire(self, priority: int = PRIORITY_INTERACTIVE, tokens: int = 0):
+        """Wait (without blocking the event loop) until a call may start."""
+        ticket = self._enqueue(priority, tokens)
+        try:
+            while True:
+                with self._lock:
+                    wait = self._try_acquire(ticket)
+                if wait == 0:
+                    return
+                await asyncio.sleep(min(wait, MAX_POLL_SECONDS))
+        except BaseException:
+            self._cancel(ticket)
+            raise
+
+    def release(self):
+        with self._lock:
+            self._active -= 1
+            self._changed.notify_all()
+
+    def _backoff(self, error: Exception, attempt: int) -> float:
+        """Pause every caller after a 429 and return the delay."""
+        delay = get_retry_after(error)
+        if delay is None:
+            delay = min(MAX_BACKOFF_SECONDS, BASE_BACKOFF_SECONDS * 2 ** attempt)
+            delay *= random.uniform(0.5, 1.0)
+        with self._lock:
+            self._blocked_until = max(self._blocked_until, time.monotonic() + delay)
+            self._changed.notify_all()
+        logger.warning("Rate limited by provider, backing off %.1fs (attempt %d)", delay, attempt + 1)
+        return delay
+
+    @contextmanager
+    def slot(self, priority: int = PRIORITY_INTERACTIVE, tokens: int = 0):
+        """Hold a call slot for the duration of the block."""
+        self.acquire(priority, tokens)
+        try:
+            yield
+        finally:
+            self.release()
+
+    def run(self, call, priority: int = PRIORITY_INTERACTIVE, tokens: int = 0):
+        """Run call() within the limits, retrying rate-limited attempts."""
+        for attempt in range(self.max_retries + 1):
+            try:
+                with self.slot(priority, tokens):
+                    return call()
+            except Exception as error:
+                if not is_rate_limit_error(error) or attempt == self.max_retries:
+                    raise
+                self._backoff(error, attempt)
+
+    async def arun(self, make_call, priority: int = PRIORITY_INTERACTIVE, tokens: int = 0, on_start=None):
+        """
+        Async run; make_call() returns a fresh awaitable for each attempt.
+
+        on_start, if given, is called each time an attempt is granted a slot (see hedging).
+        """
+        for attempt in range(self.max_retries + 1):
+            await self.aacquire(priority, tokens)
+            if on_start is not None:
+                on_start()
+            try:
+                return await make_call()
+            except Exception as error:
+                if not is_rate_limit_error(error) or attempt == self.max_retries:
+                    raise
+                self._backoff(error, attempt)
+            finally:
+                self.release()
+
+    def stream(self, make_stream, priority: int = PRIORITY_INTERACTIVE, tokens: int = 0):
+        """Iterate make_stream() within the limits; retries only before the first chunk."""
+        for attempt in range(self.max_retries + 1):
+            started = False
+            try:
+                with self.slot(priority, tokens):
+                    for chunk in make_stream():
+                        started = True
+                        yield chunk
+                return
+            except Exception as error:
+                if started or not is_rate_limit_error(error) or attempt == self.max_retries:
+                    raise
+                self._backoff(error, attempt)
+
+    async def astream(self, make_stream, priority: int = PRIORITY_INTERACTIVE, tokens: int = 0, on_start=None):
+        """Async stream; retries only before the first chunk. on_start is as for arun."""
+        for attempt in range(self.max_retries + 1):
+            started = False
+            await self.aacquire(priority, tokens)
+            if on_start is not None:
+                on_start()
+            try:
+                async for chunk in make_stream():
+                    started = True
+                    yield chunk
+                return
+            except Exception as error:
+                if started or not is_rate_limit_error(error) or attempt == self.max_retries:
+                    raise
+                self._backoff(error, attempt)
+            finally:
+                self.release()
+
+
+_scheduler = None
+_scheduler_lock = threading.Lock()
+
+
+def get_scheduler() -> LLMScheduler:
+    """Get the process-wide scheduler."""
+    global _scheduler
+    with _scheduler_lock:
+        if _scheduler is None:
+            _scheduler = LLMScheduler()
+    return _scheduler
+
+
+def set_scheduler(scheduler: LLMScheduler):
+    """Replace the process-wide scheduler (e.g. with different limits for benchmarks)."""
+    global _scheduler
+    with _scheduler_lock:
+        _scheduler = scheduler
@@ -0,0 +1,215 @@
+"""
+Long-term Memory - Past Goals and Follow-up Opportunities
+Indexes the Goals and Follow_Up_Opportunities of each user's past session summaries
+and retrieves the few most relevant to the current topic, so follow-up questions can
+build on earlier sessions while the prompt stays the same size however many sessions
+a user has had.
+
+Backends: NumpyMemoryIndex (default) keeps per-user vectors in process and rebuilds a
+user's index from the conversation store on first use; PineconeMemoryIndex stores them
+in a Pinecone index (namespace per user) through langchain-pinecone.
+"""
+
+import os
+import threading
+from collections import OrderedDict
+import numpy as np
+from prompt_builder import truncate_to_tokens
+from semantic_cache import make_embedder, EMBEDDER_OPENAI
+
+# Off by default; enable with LONG_TERM_MEMORY=true. LONG_TERM_MEMORY_BACKEND is "numpy" or "pinecone"
+LONG_TERM_MEMORY_ENABLED = os.getenv("LONG_TERM_MEMORY", "false").lower() in ("1", "true", "yes")
+LONG_TERM_MEMORY_BACKEND = os.getenv("LONG_TERM_MEMORY_BACKEND", "numpy").lower()
+LONG_TERM_MEMORY_EMBEDDER = os.getenv("LONG_TERM_MEMORY_EMBEDDER", EMBEDDER_OPENAI).lower()
+PINECONE_INDEX_NAME = os.getenv("PINECONE_INDEX_NAME", "reflection-memory")
+
+BACKEND_NUMPY = "numpy"
+BACKEND_PINECONE = "pinecone"
+
+# Summary fields that are remembered, and the label each is shown with
+MEMORY_FIELDS = {
+    "Goals": "Goal",
+    "Follow_Up_Opportunities": "Follow-up opportunity",
+}
+
+# Items retrieved per topic and their size cap, which bound the prompt space memory takes
+MEMORY_TOP_K = 3
+MEMORY_ITEM_MAX_TOKENS = 60
+# Items less similar than this to the topic are left out
+MEMORY_MIN_SIMILARITY = 0.25
+# Past sessions read from the store when a user's index is first built
+MEMORY_SESSIONS_PER_USER = 20
+# Users whose vectors are kept in process by the NumPy backend
+MEMORY_MAX_USERS = 200
+
+
+def summary_items(summary: dict) -> list:
+    """Labelled, length-capped memory items of one session summary."""
+    items = []
+    for field, label in MEMORY_FIELDS.items():
+        for value in summary.get(field) or []:
+            if isinstance(value, str) and value.strip():
+                items.append(f"{label}: {truncate_to_tokens(value.strip(), MEMORY_ITEM_MAX_TOKENS)}")
+    return items
+
+
+class NumpyMemoryIndex:
+    """Per-user matrices of normalized embeddings, least recently used users dropped first."""
+
+    # Built from the store on first use, so the caller must load a user it hasn't seen
+    persistent = False
+
+    def __init__(self, embedder, max_users: int = MEMORY_MAX_USERS):
+        self.embedder = embedder
+        self.max_users = max_users
+        self._users = OrderedDict()  # user id -> (vectors, texts)
+        self._lock = threading.Lock()
+
+    def _embed(self, texts: list) -> np.ndarray:
+        vectors = np.asarray(self.embedder.embed(texts), dtype=np.float32)
+        norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+        return vectors / np.where(norms > 0, norms, 1.0)
+
+    def contains(self, user_id: str) -> bool:
+        with self._lock:
+            return user_id in self._users
+
+    def add(self, user_id: str, texts: list):
+        """Index texts for user_id (an empty list marks the user as loaded)."""
+        with self._lock:
+            vectors, known = self._users.get(user_id, (None, []))
+        new = [text for text in dict.fromkeys(texts) if text not in known]
+        new_vectors = self._embed(new) if new else None
+        with self._lock:
+            vectors, known = self._users.get(user_id, (None, []))
+            if new_vectors is not None:
+                vectors = new_vectors if vectors is None else np.vstack([vectors, new_vectors])
+                known = known + new
+            self._users[user_id] = (vectors, known)
+            self._users.move_to_end(user_id)
+            while len(self._users) > self.max_users:
+                self._users.popitem(last=False)
+
+    def search(self, user_id: str, query: str, k: int) -> list:
+        """Return up to k (text, similarity) pairs, most similar first."""
+        with self._lock:
+            vectors, texts = self._users.get(user_id, (None, []))
+            if user_id in self._users:
+                self._users.move_to_end(user_id)
+        if vectors is None:
+            return []
+        similarities = vectors @ self._embed([query])[0]
+        best = np.argsort(-similarities)[:k]
+        return [(texts[i], float(similarities[i])) for i in best]
+
+
+class PineconeMemoryIndex:
+    """Memory items in a Pinecone index, one namespace per user."""
+
+    persistent = True
+
+    def __init__(self, vector_store):
+        """
+        Args:
+            vector_store: langchain_pinecone.PineconeVectorStore (it embeds the texts itself)
+        """
+        self.vector_store = vector_store
+
+    def contains(self, user_id: str) -> bool:
+        return True
+
+    def add(self, user_id: str, texts: list, ids: list = None):
+        if texts:
+            self.vector_store.add_texts(texts, ids=ids, namespace=user_id)
+
+    def search(self, user_id: str, query: str, k: int) -> list:
+        results = self.vector_store.similarity_search_with_score(query, k=k, namespace=user_id)
+        return [(document.page_content, float(score)) for document, score in results]
+
+
+def make_memory_index(backend: str = LONG_TERM_MEMORY_BACKEND, embedder: str = LONG_TERM_MEMORY_EMBEDDER):
+    """Build the memory index for a backend name."""
+    if backend == BACKEND_NUMPY:
+        return NumpyMemoryIndex(make_embedder(embedder))
+    if backend == BACKEND_PINECONE:
+        from langchain_openai import OpenAIEmbeddings
+        from langchain_pinecone import PineconeVectorStore
+        from semantic_cache import OPENAI_EMBEDDING_MODEL
+        return PineconeMemoryIndex(PineconeVectorStore(
+            index_name=PINECONE_INDEX_NAME,
+            embedding=OpenAIEmbeddings(model=OPENAI_EMBEDDING_MODEL)
+        ))
+    raise ValueError(f"Unknown memory backend '{backend}', expected '{BACKEND_NUMPY}' or '{BACKEND_PINECONE}'")
+
+
+class LongTermMemory:
+    """Remembers users' past summary items and recalls the most relevant ones."""
+
+    def __init__(self, make_index=make_memory_index, store=None, top_k: int = MEMORY_TOP_K,
+                 min_similarity: float = MEMORY_MIN_SIMILARITY):
+        """
+        Args:
+            make_index: Builds the memory index on first use (keeps embedder imports off startup)
+            store: Optional ConversationStore past summaries are loaded from
+            top_k: Items returned by recall
+        """
+        self.make_index = make_index
+        self.store = store
+        self.top_k = top_k
+        self.min_similarity = min_similarity
+        self._index = None
+        self._lock = threading.Lock()
+
+    @property
+    def index(self):
+        with self._lock:
+            if self._index is None:
+                self._index = self.make_index()
+            return self._index
+
+    def _load_user(self, user_id: str):
+        """Index a user's stored summaries the first time the in-process index sees them."""
+        texts = []
+        if self.store is not None:
+            for session in self.store.list_sessions(user_id, limit=MEMORY_SESSIONS_PER_USER):
+                texts.extend(summary_items(session.get("summary") or {}))
+        self.index.add(user_id, texts)
+
+    def remember_summary(self, user_id: str, session_id: str, summary: dict):
+        """Add the items of a new session summary to the user's memory."""
+        texts = summary_items(summary)
+        if not texts:
+            return
+        index = self.index
+        if not index.persistent and not index.contains(user_id):
+            # Store writes are batched, so the new summary may not be readable yet; repeats are skipped
+            self._load_user(user_id)
+        if index.persistent:
+            index.add(user_id, texts, ids=[f"{session_id}:{i}" for i in range(len(texts))])
+        else:
+            index.add(user_id, texts)
+
+    def recall(self, user_id: str, query: str) -> list:
+        """The user's remembered items most relevant to query, at most top_k."""
+        index = self.index
+        if not index.persistent and not index.contains(user_id):
+            self._load_user(user_id)
+        return [
+            text for text, similarity in index.search(user_id, query, self.top_k)
+            if similarity >= self.min_similarity
+        ]
+
+
+_default_memory = None
+_default_memory_lock = threading.Lock()
+
+
+def get_long_term_memory(store=None):
+    """Get the process-wide long-term memory, or None when LONG_TERM_MEMORY is disabled."""
+    global _default_memory
+    if not LONG_TERM_MEMORY_ENABLED:
+        return None
+    with _default_memory_lock:
+        if _default_memory is None:
+            _default_memory = LongTermMemory(store=store)
+    return _default_memory
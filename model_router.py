@@ -0,0 +1,170 @@
+"""
+Model Router - Per-chain Model Tiers
+Lets each chain run on its own model tier (a small, fast model for the one-bit
+transition check, a stronger one for follow-ups and summaries). Tracks rolling
+latency per chain and model and routes a chain to its tier's fallback model while
+the primary's p95 on that chain is above the chain's threshold, a fraction of its
+deadline (modules.CHAIN_DEADLINES). Pass a ModelRouter wherever modules expects an
+llm; modules times each request it sends and reports it through record_latency.
+"""
+
+import os
+import time
+import random
+import logging
+import threading
+from collections import deque
+from instrumentation import METRICS
+
+logger = logging.getLogger(__name__)
+
+TIER_FAST = "fast"
+TIER_STRONG = "strong"
+
+# Chain name (see modules.CHAIN_*) -> model tier; unlisted chains use DEFAULT_TIER
+DEFAULT_CHAIN_TIERS = {
+    "move_to_next": TIER_FAST,
+    "follow_up": TIER_STRONG,
+    "follow_up_streaming": TIER_STRONG,
+    "turn_decision": TIER_STRONG,
+    "turn_decision_streaming": TIER_STRONG,
+    "summary": TIER_STRONG,
+}
+DEFAULT_TIER = TIER_STRONG
+
+# tier -> (primary model, fallback model)
+DEFAULT_TIER_MODELS = {
+    TIER_FAST: (os.getenv("ROUTER_FAST_MODEL", "gpt-4o-mini"), os.getenv("ROUTER_FAST_FALLBACK_MODEL", "gpt-4o")),
+    TIER_STRONG: (os.getenv("ROUTER_STRONG_MODEL", "gpt-4o"), os.getenv("ROUTER_STRONG_FALLBACK_MODEL", "gpt-4o-mini")),
+}
+
+# Route a chain to the fallback while the primary's p95 on it exceeds this fraction of
+# the chain's deadline; P95_THRESHOLD_SECONDS applies to chains without a deadline
+DEADLINE_FRACTION = float(os.getenv("ROUTER_DEADLINE_FRACTION", "0.5"))
+P95_THRESHOLD_SECONDS = float(os.getenv("ROUTER_P95_THRESHOLD_SECONDS", "8"))
+LATENCY_WINDOW_SECONDS = 300
+MIN_SAMPLES = 20
+# Share of calls still sent to a degraded primary, so its latency keeps being measured
+PROBE_RATE = 0.05
+
+
+class LatencyWindow:
+    """Latencies observed over the last window_seconds."""
+
+    def __init__(self, window_seconds: float = LATENCY_WINDOW_SECONDS):
+        self.window_seconds = window_seconds
+        self._samples = deque()  # (timestamp, seconds)
+        self._lock = threading.Lock()
+
+    def _expire(self, now: float):
+        while self._samples and self._samples[0][0] < now - self.window_seconds:
+            self._samples.popleft()
+
+    def add(self, seconds: float):
+        now = time.monotonic()
+        with self._lock:
+            self._samples.append((now, seconds))
+            self._expire(now)
+
+    def p95(self, min_samples: int = MIN_SAMPLES):
+        """95th percentile latency, or None with fewer than min_samples in the window."""
+        with self._lock:
+            self._expire(time.monotonic())
+            latencies = sorted(seconds for _, seconds in self._samples)
+        if len(latencies) < min_samples:
+            return None
+        return latencies[min(len(latencies) - 1, int(0.95 * len(latencies)))]
+
+
+class ModelRouter:
+    """Picks the model for each chain by tier, falling back when a primary gets slow."""
+
+    def __init__(self, tier_llms: dict, chain_tiers: dict = None, default_tier: str = DEFAULT_TIER,
+                 p95_threshold: float = P95_THRESHOLD_SECONDS, window_seconds: float = LATENCY_WINDOW_SECONDS,
+                 min_samples: int = MIN_SAMPLES, probe_rate: float = PROBE_RATE, chain_deadlines: dict = None,
+                 deadline_fraction: float = DEADLINE_FRACTION):
+        """
+        Args:
+            tier_llms: tier -> (primary llm, fallback llm or None)
+            chain_tiers: chain name -> tier (defaults to DEFAULT_CHAIN_TIERS)
+            p95_threshold: Primary p95 latency (seconds) above which the fallback is used,
+                for chains without a deadline
+            chain_deadlines: chain name -> deadline in seconds (e.g. modules.CHAIN_DEADLINES);
+                a chain's threshold is deadline_fraction of its deadline
+        """
+        self.tier_llms = dict(tier_llms)
+        self.chain_tiers = dict(DEFAULT_CHAIN_TIERS if chain_tiers is None else chain_tiers)
+        self.default_tier = default_tier
+        self.p95_threshold = p95_threshold
+        self.window_seconds = window_seconds
+        self.min_samples = min_samples
+        self.probe_rate = probe_rate
+        self.chain_deadlines = dict(chain_deadlines or {})
+        self.deadline_fraction = deadline_fraction
+        self._windows = {}  # (chain, model) -> LatencyWindow
+        self._windows_lock = threading.Lock()
+        self._degraded = set()
+
+    def _window(self, chain_name: str, model: str) -> LatencyWindow:
+        with self._windows_lock:
+            window = self._windows.get((chain_name, model))
+            if window is None:
+                window = self._windows[(chain_name, model)] = LatencyWindow(self.window_seconds)
+            return window
+
+    def threshold(self, chain_name: str) -> float:
+        """p95 latency (seconds) of a chain's primary above which the chain uses the fallback."""
+        deadline = self.chain_deadlines.get(chain_name)
+        return deadline * self.deadline_fraction if deadline else self.p95_threshold
+
+    def record_latency(self, chain_name: str, model: str, seconds: float):
+        """
+        Record one request of a chain to model; failed and cancelled requests count at
+        the time they ran, streams at the time to their first chunk.
+        """
+        self._window(chain_name, model).add(seconds)
+
+    def is_degraded(self, chain_name: str, model: str) -> bool:
+        """Whether model's recent p95 on the chain is above the chain's threshold."""
+        p95 = self._window(chain_name, model).p95(self.min_samples)
+        threshold = self.threshold(chain_name)
+        degraded = p95 is not None and p95 > threshold
+        key = (chain_name, model)
+        if degraded != (key in self._degraded):
+            if degraded:
+                self._degraded.add(key)
+                logger.warning("Model %s p95 %.1fs on %s over %.1fs, routing to fallback",
+                               model, p95, chain_name, threshold)
+            else:
+                self._degraded.discard(key)
+                logger.info("Model %s latency on %s recovered, routing back", model, chain_name)
+        return degraded
+
+    def select_model(self, chain_name: str):
+        """The llm the chain should run on right now."""
+        tier = self.chain_tiers.get(chain_name, self.default_tier)
+        primary, fallback = self.tier_llms[tier]
+        use_fallback = (
+            fallback is not None
+            and self.is_degraded(chain_name, _model_name(primary))
+            and random.random() >= self.probe_rate
+        )
+        llm = fallback if use_fallback else primary
+        METRICS.inc("model_routes_total", chain=chain_name, model=_model_name(llm),
+                    route="fallback" if use_fallback else "primary")
+        return llm
+
+    def current_model(self, chain_name: str):
+        """The llm the chain is currently routed to, ignoring probes and without counting a route."""
+        primary, fallback = self.tier_llms[self.chain_tiers.get(chain_name, self.default_tier)]
+        return fallback if fallback is not None and self.is_degraded(chain_name, _model_name(primary)) else primary
+
+    def stats(self) -> dict:
+        """Recent p95 latency per "chain/model"."""
+        with self._windows_lock:
+            windows = dict(self._windows)
+        return {f"{chain}/{model}": window.p95(1) for (chain, model), window in windows.items()}
+
+
+def _model_name(llm) -> str:
+    return getattr(llm, "model_name", None) or type(llm).__name__
@@ -1,35 +1,735 @@
+import os
 import json
+import time
+import logging
+import uuid
+import functools
+import queue
+import asyncio
+import threading
+from langchain_core.exceptions import OutputParserException
 from langchain_core.prompts import PromptTemplate
-from prompts import FOLLOW_UP_QUESTION_PROMPT, SUMMARIZE_CHAT_HISTORY_PROMPT, MOVE_TO_NEXT_QUESTION_PROMPT
-from outputparsers import FollowUpQuestionParser, ChatSummaryParser, MoveToNextQuestionParser
+from prompts import (
+    FOLLOW_UP_QUESTION_PROMPT, SUMMARIZE_CHAT_HISTORY_PROMPT, MOVE_TO_NEXT_QUESTION_PROMPT,
+    FOLLOW_UP_QUESTION_PROMPT_STRUCTURED, SUMMARIZE_CHAT_HISTORY_PROMPT_STRUCTURED,
+    MOVE_TO_NEXT_QUESTION_PROMPT_STRUCTURED, TURN_DECISION_PROMPT, TURN_DECISION_PROMPT_STRUCTURED
+)
+from response_cache import ResponseCache, make_cache_key
+from prompt_builder import (
+    RenderedText, count_tokens, render_transcript, render_example_conversation, prompt_section_tokens
+)
+from llm_scheduler import get_scheduler, PRIORITY_INTERACTIVE, PRIORITY_BACKGROUND
+from instrumentation import (
+    METRICS_HANDLER, record_cache_lookup, record_hedge, record_deadline_exceeded, record_semantic_cache_lookup,
+    record_prompt_sections
+)
+from hedging import DeadlineExceeded, hedged_call, hedged_stream
+from semantic_cache import SemanticCache, make_embedder, topic_text, EMBEDDER_OPENAI
+from outputparsers import (
+    FollowUpQuestionParser, ChatSummaryParser, MoveToNextQuestionParser,
+    IncrementalFollowUpQuestionParser, TurnDecisionParser, IncrementalTurnDecisionParser,
+    FollowUpQuestion, ChatSummary, MoveToNextDecision, TurnDecision, json_schema_response_format,
+    StructuredFollowUpQuestionParser, StructuredChatSummaryParser, StructuredMoveToNextQuestionParser,
+    StructuredTurnDecisionParser
+)
 
 
-def run_follow_up_chain(chat_history, llm):
-    prompt = PromptTemplate(
-        input_variables=["chat_history"],
-        template=FOLLOW_UP_QUESTION_PROMPT
+CHAIN_FOLLOW_UP = "follow_up"
+CHAIN_FOLLOW_UP_STREAMING = "follow_up_streaming"
+CHAIN_SUMMARY = "summary"
+CHAIN_MOVE_TO_NEXT = "move_to_next"
+CHAIN_TURN_DECISION = "turn_decision"
+CHAIN_TURN_DECISION_STREAMING = "turn_decision_streaming"
+
+# chain name -> (prompt template, input variables, parser class)
+CHAIN_SPECS = {
+    CHAIN_FOLLOW_UP: (FOLLOW_UP_QUESTION_PROMPT, ["chat_history", "instruction"], FollowUpQuestionParser),
+    CHAIN_FOLLOW_UP_STREAMING: (FOLLOW_UP_QUESTION_PROMPT, ["chat_history", "instruction"], IncrementalFollowUpQuestionParser),
+    CHAIN_SUMMARY: (SUMMARIZE_CHAT_HISTORY_PROMPT, ["chat_history"], ChatSummaryParser),
+    CHAIN_MOVE_TO_NEXT: (MOVE_TO_NEXT_QUESTION_PROMPT, ["chat_history", "example_flow"], MoveToNextQuestionParser),
+    CHAIN_TURN_DECISION: (TURN_DECISION_PROMPT, ["chat_history", "example_flow"], TurnDecisionParser),
+    CHAIN_TURN_DECISION_STREAMING: (TURN_DECISION_PROMPT, ["chat_history", "example_flow"], IncrementalTurnDecisionParser),
+}
+
+# chain name -> (prompt template, output schema, parser class) for models with native structured output
+STRUCTURED_CHAIN_SPECS = {
+    CHAIN_FOLLOW_UP: (FOLLOW_UP_QUESTION_PROMPT_STRUCTURED, FollowUpQuestion, StructuredFollowUpQuestionParser),
+    CHAIN_FOLLOW_UP_STREAMING: (FOLLOW_UP_QUESTION_PROMPT_STRUCTURED, FollowUpQuestion, IncrementalFollowUpQuestionParser),
+    CHAIN_SUMMARY: (SUMMARIZE_CHAT_HISTORY_PROMPT_STRUCTURED, ChatSummary, StructuredChatSummaryParser),
+    CHAIN_MOVE_TO_NEXT: (MOVE_TO_NEXT_QUESTION_PROMPT_STRUCTURED, MoveToNextDecision, StructuredMoveToNextQuestionParser),
+    CHAIN_TURN_DECISION: (TURN_DECISION_PROMPT_STRUCTURED, TurnDecision, StructuredTurnDecisionParser),
+    CHAIN_TURN_DECISION_STREAMING: (TURN_DECISION_PROMPT_STRUCTURED, TurnDecision, IncrementalTurnDecisionParser),
+}
+
+# Use strict JSON schema responses where the model supports them; disabled with STRUCTURED_OUTPUT=false
+STRUCTURED_OUTPUT_ENABLED = os.getenv("STRUCTURED_OUTPUT", "true").lower() in ("1", "true", "yes")
+STRUCTURED_OUTPUT_LLM_TYPES = ("openai-chat", "azure-openai-chat")
+STRUCTURED_OUTPUT_MODEL_PREFIXES = ("gpt-4o", "gpt-4.1", "gpt-5", "o1", "o3", "o4")
+
+# Queue priority of each chain in the shared LLM scheduler
+CHAIN_PRIORITIES = {
+    CHAIN_FOLLOW_UP: PRIORITY_INTERACTIVE,
+    CHAIN_FOLLOW_UP_STREAMING: PRIORITY_INTERACTIVE,
+    CHAIN_MOVE_TO_NEXT: PRIORITY_INTERACTIVE,
+    CHAIN_TURN_DECISION: PRIORITY_INTERACTIVE,
+    CHAIN_TURN_DECISION_STREAMING: PRIORITY_INTERACTIVE,
+    CHAIN_SUMMARY: PRIORITY_BACKGROUND,
+}
+
+# Latency budget (seconds) per chain: when it runs out a hedged duplicate request is sent,
+# and if that misses its budget too the call raises hedging.DeadlineExceeded. Streaming
+# chains are budgeted to their first token. Disabled with CHAIN_DEADLINES=false.
+CHAIN_DEADLINES_ENABLED = os.getenv("CHAIN_DEADLINES", "true").lower() in ("1", "true", "yes")
+CHAIN_DEADLINES = {
+    CHAIN_FOLLOW_UP: 6.0,
+    CHAIN_FOLLOW_UP_STREAMING: 4.0,
+    CHAIN_MOVE_TO_NEXT: 3.0,
+    CHAIN_TURN_DECISION: 6.0,
+    CHAIN_TURN_DECISION_STREAMING: 4.0,
+    CHAIN_SUMMARY: 45.0,
+}
+
+# Completion tokens assumed per call when reserving token budget
+COMPLETION_TOKENS_ESTIMATE = 200
+
+# (chain name, id(llm)) -> (llm, compiled chain); the llm is kept so its id can't be reused
+_chain_registry = {}
+_chain_registry_lock = threading.Lock()
+
+# Cache for deterministic (temperature 0) chain calls; disabled with RESPONSE_CACHE=false
+RESPONSE_CACHE_ENABLED = os.getenv("RESPONSE_CACHE", "true").lower() in ("1", "true", "yes")
+RESPONSE_CACHE = ResponseCache(os.getenv("RESPONSE_CACHE_PATH", "response_cache.sqlite3"))
+
+# Reuse the follow-up generated for a similar first answer to the same question; disabled
+# with SEMANTIC_CACHE=false. SEMANTIC_CACHE_EMBEDDER is "openai" or "hashing" (local, deterministic).
+SEMANTIC_CACHE_ENABLED = os.getenv("SEMANTIC_CACHE", "true").lower() in ("1", "true", "yes")
+SEMANTIC_CACHE_EMBEDDER = os.getenv("SEMANTIC_CACHE_EMBEDDER", EMBEDDER_OPENAI).lower()
+SEMANTIC_CACHE_THRESHOLD = float(os.getenv("SEMANTIC_CACHE_THRESHOLD", "0.92"))
+SEMANTIC_CACHE_CAPACITY = int(os.getenv("SEMANTIC_CACHE_CAPACITY", "5000"))
+_semantic_cache = None
+_semantic_cache_lock = threading.Lock()
+
+# Section of the example flow file holding the example conversation
+EXAMPLE_CONVERSATION_KEY = "example_conversation"
+# path -> (mtime_ns, serialized example flow)
+_example_flow_cache = {}
+
+# Long-lived event loop for async chain calls. Cached LLM clients keep pooled async
+# connections, and those are bound to the loop that opened them.
+_background_loop = None
+_background_loop_lock = threading.Lock()
+_STREAM_DONE = object()
+
+logger = logging.getLogger(__name__)
+
+
+def _get_background_loop():
+    global _background_loop
+    with _background_loop_lock:
+        if _background_loop is None:
+            _background_loop = asyncio.new_event_loop()
+            threading.Thread(
+                target=_background_loop.run_forever,
+                name="chain-event-loop",
+                daemon=True
+            ).start()
+    return _background_loop
+
+def _run_async(make_coro, on_token=None):
+    """
+    Run a coroutine on the background loop and wait for its result.
+
+    make_coro receives an emit function (or None). Anything emitted is handed to
+    on_token on the calling thread, so UI callbacks keep their script context.
+    """
+    tokens = queue.Queue()
+    future = asyncio.run_coroutine_threadsafe(
+        make_coro(tokens.put if on_token else None),
+        _get_background_loop()
     )
-    parser = FollowUpQuestionParser()
-    chain = prompt | llm | parser
-    return chain.invoke({"chat_history": json.dumps(chat_history, indent=2)})
-
-def run_summary_chain(chat_history, llm):
-    prompt = PromptTemplate(
-        input_variables=["chat_history"],
-        template=SUMMARIZE_CHAT_HISTORY_PROMPT
+    future.add_done_callback(lambda _: tokens.put(_STREAM_DONE))
+    try:
+        while True:
+            item = tokens.get()
+            if item is _STREAM_DONE:
+                break
+            on_token(item)
+        return future.result()
+    finally:
+        if not future.done():
+            # The caller went away (e.g. the script was stopped), stop the LLM calls too
+            future.cancel()
+
+def uses_structured_output(llm):
+    """Whether chains on this LLM request strict JSON schema output."""
+    if not STRUCTURED_OUTPUT_ENABLED or getattr(llm, "_llm_type", None) not in STRUCTURED_OUTPUT_LLM_TYPES:
+        return False
+    return _model_name(llm).startswith(STRUCTURED_OUTPUT_MODEL_PREFIXES)
+
+def _template(name, llm):
+    specs = STRUCTURED_CHAIN_SPECS if uses_structured_output(llm) else CHAIN_SPECS
+    return specs[name][0]
+
+def _build_chain(name, llm):
+    input_variables = CHAIN_SPECS[name][1]
+    if not uses_structured_output(llm):
+        template, _, parser_cls = CHAIN_SPECS[name]
+        prompt = PromptTemplate(input_variables=input_variables, template=template)
+        return prompt | llm | parser_cls()
+
+    # Output failing validation isn't retried: the same request at temperature 0 gets the
+    # same answer, so the callers degrade it with the lenient parser instead (_parse_fallback)
+    template, schema, parser_cls = STRUCTURED_CHAIN_SPECS[name]
+    prompt = PromptTemplate(input_variables=input_variables, template=template)
+    return prompt | llm.bind(response_format=json_schema_response_format(schema)) | parser_cls()
+
+def _parse_fallback(name, error):
+    """Degrade output that failed schema validation with the chain's lenient parser."""
+    return CHAIN_SPECS[name][2]().parse(error.llm_output or "")
+
+def get_chain(name, llm):
+    """
+    Return the compiled `prompt | llm | parser` runnable for a chain, building it once per LLM.
+
+    Chains are immutable, so the same runnable is shared by every session using that LLM.
+    """
+    key = (name, id(llm))
+    entry = _chain_registry.get(key)
+    if entry is None or entry[0] is not llm:
+        with _chain_registry_lock:
+            entry = _chain_registry.get(key)
+            if entry is None or entry[0] is not llm:
+                entry = (llm, _build_chain(name, llm))
+                _chain_registry[key] = entry
+    return entry[1]
+
+def load_example_flow(path):
+    """
+    Return the example flow file pre-serialized for the move-to-next prompt.
+
+    The file is read, serialized and counted once and re-read only when its mtime
+    changes, so every prompt gets the exact same bytes for the example. Only the
+    example conversation goes into the prompt, in the same line format as the chat
+    history; the flow script (see flow_script.py) doesn't.
+    """
+    mtime = os.stat(path).st_mtime_ns
+    cached = _example_flow_cache.get(path)
+    if cached is None or cached[0] != mtime:
+        with open(path, encoding="utf-8") as f:
+            data = json.load(f)
+        text = render_example_conversation(data[EXAMPLE_CONVERSATION_KEY])
+        cached = (mtime, RenderedText.of(text, count_tokens(text)))
+        _example_flow_cache[path] = cached
+    return cached[1]
+
+def _follow_up_inputs(chat_history, instruction=None):
+    """Inputs of the follow-up chains; instruction is a flow script step's guidance for this reply."""
+    return {
+        "chat_history": render_transcript(chat_history),
+        "instruction": f"- **Instruction for this reply** (takes priority over the guidelines): {instruction}\n"
+                       if instruction else ""
+    }
+
+def _move_to_next_inputs(chat_history, example_flow):
+    return {
+        "chat_history": render_transcript(chat_history),
+        "example_flow": example_flow
+    }
+
+def _model_name(llm):
+    return getattr(llm, "model_name", None) or type(llm).__name__
+
+def _route(name, llm):
+    """
+    Resolve a model router (see model_router.ModelRouter) to the model for this chain.
+
+    Returns:
+        tuple: (llm, router), where router is None when llm isn't a router
+    """
+    select_model = getattr(llm, "select_model", None)
+    if select_model is None:
+        return llm, None
+    return select_model(name), llm
+
+def _record_latency(router, name, llm, started):
+    if router is not None:
+        router.record_latency(name, _model_name(llm), time.perf_counter() - started)
+
+async def _attempt(name, llm, router, callbacks, start_call):
+    """
+    Await one request of a chain call, once it holds a scheduler slot.
+
+    Timed here rather than from callbacks, so requests that get cancelled (hedge losers,
+    missed deadlines, discarded speculative follow-ups) still count for the router, at
+    the time they had run.
+    """
+    config = _chain_config(name, llm, callbacks)
+    started = time.perf_counter()
+    try:
+        return await start_call(config)
+    except asyncio.CancelledError:
+        _cancel_attempt(config)
+        raise
+    finally:
+        _record_latency(router, name, llm, started)
+
+async def _attempt_stream(name, llm, router, callbacks, start_stream):
+    """Streaming counterpart of _attempt, timed to the first chunk like the chain's deadline."""
+    config = _chain_config(name, llm, callbacks)
+    started = time.perf_counter()
+    recorded = False
+    try:
+        async for chunk in start_stream(config):
+            if not recorded:
+                recorded = True
+                _record_latency(router, name, llm, started)
+            yield chunk
+    except (asyncio.CancelledError, GeneratorExit):
+        _cancel_attempt(config)
+        raise
+    finally:
+        if not recorded:
+            _record_latency(router, name, llm, started)
+
+def _cancel_attempt(config):
+    """Tell the config's callback handlers a call was cancelled (they get no end callback)."""
+    for handler in config["callbacks"]:
+        on_attempt_cancelled = getattr(handler, "on_attempt_cancelled", None)
+        if on_attempt_cancelled is not None:
+            on_attempt_cancelled(config["metadata"]["attempt"])
+
+def _chain_config(name, llm, callbacks=None):
+    """Run config labelling a chain call for the metrics (and any extra) callback handlers."""
+    return {
+        "run_name": name,
+        "callbacks": [METRICS_HANDLER, *(callbacks or ())],
+        "metadata": {"chain": name, "model": _model_name(llm), "attempt": uuid.uuid4().hex}
+    }
+
+def _cache_key(name, inputs, llm):
+    """Cache key for a chain call, or None when the call isn't deterministic."""
+    if not RESPONSE_CACHE_ENABLED or getattr(llm, "temperature", None) != 0:
+        return None
+    # Chains sharing a prompt (e.g. follow_up and follow_up_streaming) parse into
+    # different shapes, so the chain name is part of the key
+    return make_cache_key(name, _model_name(llm), _template(name, llm), inputs)
+
+def _cache_get(name, key, llm):
+    """Look up a cached chain result, counting the hit or miss."""
+    if key is None:
+        return None
+    cached = RESPONSE_CACHE.get(key)
+    record_cache_lookup(name, _model_name(llm), cached is not None)
+    return cached
+
+def _estimate_tokens(name, inputs, llm):
+    """Tokens to reserve in the rate limiter for one call of a chain, recording each prompt section's share."""
+    sections = prompt_section_tokens(_template_tokens(_template(name, llm)), inputs)
+    record_prompt_sections(name, sections)
+    return sum(sections.values()) + COMPLETION_TOKENS_ESTIMATE
+
+@functools.lru_cache(maxsize=None)
+def _template_tokens(template):
+    return count_tokens(template)
+
+def _deadline(name):
+    return CHAIN_DEADLINES.get(name) if CHAIN_DEADLINES_ENABLED else None
+
+def _invoke(name, inputs, llm, priority=None, callbacks=None):
+    if _deadline(name) is not None:
+        # Hedging needs the call to be cancellable, so it runs on the background loop
+        return _run_async(lambda _emit: _ainvoke(name, inputs, llm, priority, callbacks))
+    llm, router = _route(name, llm)
+    key = _cache_key(name, inputs, llm)
+    cached = _cache_get(name, key, llm)
+    if cached is not None:
+        return cached
+    chain = get_chain(name, llm)
+
+    def call():
+        started = time.perf_counter()
+        try:
+            return chain.invoke(inputs, _chain_config(name, llm, callbacks))
+        finally:
+            _record_latency(router, name, llm, started)
+
+    try:
+        result = get_scheduler().run(
+            call,
+            CHAIN_PRIORITIES[name] if priority is None else priority,
+            _estimate_tokens(name, inputs, llm)
+        )
+    except OutputParserException as error:
+        # Not cached, so the next call tries the model again
+        return _parse_fallback(name, error)
+    if key is not None:
+        RESPONSE_CACHE.set(key, result)
+    return result
+
+async def _ainvoke(name, inputs, llm, priority=None, callbacks=None):
+    llm, router = _route(name, llm)
+    key = _cache_key(name, inputs, llm)
+    # The cache may read from disk, so it stays off the event loop
+    cached = await asyncio.to_thread(_cache_get, name, key, llm)
+    if cached is not None:
+        return cached
+    chain = get_chain(name, llm)
+    try:
+        result = await hedged_call(
+            name,
+            lambda on_start: get_scheduler().arun(
+                lambda: _attempt(name, llm, router, callbacks, lambda config: chain.ainvoke(inputs, config)),
+                CHAIN_PRIORITIES[name] if priority is None else priority,
+                _estimate_tokens(name, inputs, llm),
+                on_start
+            ),
+            _deadline(name),
+            on_hedge=lambda: record_hedge(name)
+        )
+    except OutputParserException as error:
+        return _parse_fallback(name, error)
+    except DeadlineExceeded:
+        record_deadline_exceeded(name)
+        raise
+    if key is not None:
+        await asyncio.to_thread(RESPONSE_CACHE.set, key, result)
+    return result
+
+def get_semantic_cache():
+    """The process-wide semantic cache for follow-ups, built on first use."""
+    global _semantic_cache
+    with _semantic_cache_lock:
+        if _semantic_cache is None:
+            _semantic_cache = SemanticCache(
+                make_embedder(SEMANTIC_CACHE_EMBEDDER), SEMANTIC_CACHE_CAPACITY, SEMANTIC_CACHE_THRESHOLD
+            )
+    return _semantic_cache
+
+def set_semantic_cache(cache):
+    """Replace the process-wide semantic cache (e.g. with a local embedder for benchmarks)."""
+    global _semantic_cache
+    with _semantic_cache_lock:
+        _semantic_cache = cache
+
+def _semantic_namespace(question, llm, chain, instruction=None):
+    """Cache namespace for follow-ups to question written by the model chain runs on (and step instruction)."""
+    current_model = getattr(llm, "current_model", None)
+    model = current_model(chain) if current_model is not None else llm
+    return f"{_model_name(model)}\n{question}\n{instruction or ''}"
+
+def _semantic_get(topic, llm, chain=CHAIN_FOLLOW_UP, instruction=None):
+    """
+    Follow-up cached for a similar (question, answer) topic.
+
+    topic is None unless the follow-up only depends on the question and the first answer.
+
+    Returns:
+        tuple: (follow_up, entry), follow_up None on a miss; pass entry to _semantic_set
+            so a generated follow-up is cached without embedding the topic again
+    """
+    if topic is None or not SEMANTIC_CACHE_ENABLED:
+        return None, None
+    question, answer = topic
+    try:
+        cache = get_semantic_cache()
+        entry = (_semantic_namespace(question, llm, chain, instruction), cache.embed(topic_text(question, answer)))
+        follow_up, _ = cache.lookup_vector(*entry)
+    except Exception:
+        # The cache is an optimization; an embedding failure just means generating
+        logger.warning("Semantic cache lookup failed", exc_info=True)
+        return None, None
+    record_semantic_cache_lookup(chain, follow_up is not None)
+    return follow_up, entry
+
+async def _asemantic_get(topic, llm, chain=CHAIN_FOLLOW_UP):
+    if topic is None or not SEMANTIC_CACHE_ENABLED:
+        return None, None
+    return await asyncio.to_thread(_semantic_get, topic, llm, chain)
+
+def _semantic_set(entry, follow_up):
+    """Cache a generated follow-up under the entry from _semantic_get, after the reply is returned."""
+    if entry is None or not follow_up:
+        return
+    namespace, vector = entry
+
+    def add():
+        try:
+            get_semantic_cache().add_vector(namespace, vector, follow_up)
+        except Exception:
+            logger.warning("Semantic cache update failed", exc_info=True)
+    _get_background_loop().call_soon_threadsafe(add)
+
+def run_follow_up_chain(chat_history, llm, callbacks=None, topic=None, instruction=None):
+    """
+    topic is an optional (question, answer) pair for the semantic cache; instruction is
+    an optional flow script step instruction for this reply.
+    """
+    cached, entry = _semantic_get(topic, llm, CHAIN_FOLLOW_UP, instruction)
+    if cached is not None:
+        return cached
+    follow_up = _invoke(CHAIN_FOLLOW_UP, _follow_up_inputs(chat_history, instruction), llm, callbacks=callbacks)
+    _semantic_set(entry, follow_up)
+    return follow_up
+
+async def _astream(name, inputs, llm, callbacks=None):
+    """Yield a streaming chain's cumulative output; a cached result is yielded once."""
+    llm, router = _route(name, llm)
+    key = _cache_key(name, inputs, llm)
+    cached = await asyncio.to_thread(_cache_get, name, key, llm)
+    if cached is not None:
+        yield cached
+        return
+    chain = get_chain(name, llm)
+    output = None
+    try:
+        async for output in hedged_stream(
+            name,
+            lambda on_start: get_scheduler().astream(
+                lambda: _attempt_stream(name, llm, router, callbacks, lambda config: chain.astream(inputs, config)),
+                CHAIN_PRIORITIES[name],
+                _estimate_tokens(name, inputs, llm),
+                on_start
+            ),
+            _deadline(name),
+            on_hedge=lambda: record_hedge(name)
+        ):
+            yield output
+    except DeadlineExceeded:
+        record_deadline_exceeded(name)
+        raise
+    # Reached only when the stream completed, so output is the parser's final
+    # (non-partial) parse rather than a partial one
+    if key is not None and output:
+        await asyncio.to_thread(RESPONSE_CACHE.set, key, output)
+
+def _stream(name, inputs, llm, callbacks=None):
+    """Synchronous _astream, run on the background loop and yielded on the calling thread."""
+    outputs = queue.Queue()
+
+    async def pump():
+        async for output in _astream(name, inputs, llm, callbacks):
+            outputs.put(output)
+
+    future = asyncio.run_coroutine_threadsafe(pump(), _get_background_loop())
+    future.add_done_callback(lambda _: outputs.put(_STREAM_DONE))
+    try:
+        while True:
+            output = outputs.get()
+            if output is _STREAM_DONE:
+                break
+            yield output
+        future.result()
+    finally:
+        if not future.done():
+            # The consumer stopped early, stop the LLM call too
+            future.cancel()
+
+def stream_follow_up_chain(chat_history, llm, callbacks=None, instruction=None):
+    """Yield the follow-up question text accumulated so far as tokens arrive."""
+    yield from _stream(CHAIN_FOLLOW_UP_STREAMING, _follow_up_inputs(chat_history, instruction), llm, callbacks)
+
+def run_follow_up_chain_streaming(chat_history, llm, on_token, callbacks=None, topic=None, instruction=None):
+    """Generate a follow-up question, calling on_token(text_so_far) as it streams in."""
+    cached, entry = _semantic_get(topic, llm, CHAIN_FOLLOW_UP_STREAMING, instruction)
+    if cached is not None:
+        on_token(cached)
+        return cached
+    text = ""
+    for text in stream_follow_up_chain(chat_history, llm, callbacks, instruction):
+        on_token(text)
+    if not text:
+        # Nothing usable streamed (e.g. JSON without a question), ask the non-streaming chain
+        text = _invoke(CHAIN_FOLLOW_UP, _follow_up_inputs(chat_history, instruction), llm, callbacks=callbacks)
+        on_token(text)
+    _semantic_set(entry, text)
+    return text
+
+def run_turn_decision_chain(chat_history, example_flow, llm, on_token=None, callbacks=None):
+    """
+    Decide the transition and write the follow-up question in a single call.
+
+    Args:
+        example_flow: Serialized example from load_example_flow
+        on_token: Optional callback receiving the follow-up text so far; only called
+            once the verdict is known to be 0
+
+    Returns:
+        tuple: (should_transition, follow_up) where follow_up is None when should_transition
+            is 1 or the model left the question empty
+    """
+    inputs = _move_to_next_inputs(chat_history, example_flow)
+    if on_token is None:
+        result = _invoke(CHAIN_TURN_DECISION, inputs, llm, callbacks=callbacks)
+    else:
+        result = {}
+        for partial in _stream(CHAIN_TURN_DECISION_STREAMING, inputs, llm, callbacks):
+            result = partial
+            if result.get("binary_value") == 0 and result.get("question"):
+                on_token(result["question"])
+    if result.get("binary_value") == 1:
+        return 1, None
+    return 0, result.get("question") or None
+
+def run_summary_chain(chat_history, llm, callbacks=None):
+    return _invoke(CHAIN_SUMMARY, {"chat_history": render_transcript(chat_history)}, llm, callbacks=callbacks)
+
+def run_summary_chain_batch(chat_histories, llm, max_concurrency=8, callbacks=None):
+    """
+    Summarize many chat histories concurrently.
+
+    Calls go through the shared scheduler at background priority, so a backfill
+    keeps to the rate limits and never holds up interactive sessions.
+
+    Returns:
+        list: One summary per history, in order, or the exception its call raised
+    """
+    async def summarize_all(_emit):
+        semaphore = asyncio.Semaphore(max_concurrency)
+
+        async def summarize(chat_history):
+            async with semaphore:
+                return await _ainvoke(
+                    CHAIN_SUMMARY, {"chat_history": render_transcript(chat_history)}, llm,
+                    PRIORITY_BACKGROUND, callbacks
+                )
+        return await asyncio.gather(*(summarize(h) for h in chat_histories), return_exceptions=True)
+    return _run_async(summarize_all)
+
+def run_move_to_next_chain(chat_history, example_flow, llm, callbacks=None):
+    """example_flow is the serialized example from load_example_flow."""
+    return _invoke(CHAIN_MOVE_TO_NEXT, _move_to_next_inputs(chat_history, example_flow), llm, callbacks=callbacks)
+
+def submit_move_to_next_chain(chat_history, example_flow, llm, on_result, callbacks=None):
+    """
+    Run the transition check in the background without waiting for it.
+
+    on_result(verdict) is called from the background loop when the check succeeds.
+    Queued as background work, behind interactive calls.
+    """
+    async def check():
+        on_result(await _ainvoke(
+            CHAIN_MOVE_TO_NEXT, _move_to_next_inputs(chat_history, example_flow), llm, PRIORITY_BACKGROUND, callbacks
+        ))
+    return asyncio.run_coroutine_threadsafe(check(), _get_background_loop())
+
+async def _astream_follow_up(chat_history, llm, on_token, release, latest, callbacks=None):
+    async for text in _astream(CHAIN_FOLLOW_UP_STREAMING, _follow_up_inputs(chat_history), llm, callbacks):
+        latest["text"] = text
+        if release.is_set():
+            on_token(text)
+    if not latest["text"]:
+        # Nothing usable streamed, ask the non-streaming chain
+        return await _ainvoke(CHAIN_FOLLOW_UP, _follow_up_inputs(chat_history), llm, callbacks=callbacks)
+    return latest["text"]
+
+async def _arun_move_to_next_and_follow_up(flag_history, chat_history, example_flow, llm, on_token=None,
+                                           callbacks=None, topic=None):
+    # The semantic cache lookup runs alongside the transition check, and the follow-up
+    # is started speculatively once the lookup misses; it is only needed when the
+    # verdict is 0. Streamed tokens are held back until the verdict says they will be shown.
+    release = asyncio.Event()
+    latest = {"text": ""}
+    chain = CHAIN_FOLLOW_UP_STREAMING if on_token else CHAIN_FOLLOW_UP
+    verdict = asyncio.create_task(
+        _ainvoke(CHAIN_MOVE_TO_NEXT, _move_to_next_inputs(flag_history, example_flow), llm, callbacks=callbacks)
     )
-    parser = ChatSummaryParser()
-    chain = prompt | llm | parser
-    return chain.invoke({"chat_history": json.dumps(chat_history, indent=2)})
-
-def run_move_to_next_chain(chat_history, example_flow, llm):
-    prompt = PromptTemplate(
-        input_variables=["chat_history", "example_flow"],
-        template=MOVE_TO_NEXT_QUESTION_PROMPT
+    lookup = asyncio.create_task(_asemantic_get(topic, llm, chain))
+    follow_up_task = None
+    try:
+        await asyncio.wait((verdict, lookup), return_when=asyncio.FIRST_COMPLETED)
+        if verdict.done() and verdict.result() == 1:
+            lookup.cancel()
+            return 1, None
+        cached, entry = await lookup
+        if cached is not None:
+            follow_up = asyncio.sleep(0, result=cached)
+        elif on_token:
+            follow_up = _astream_follow_up(chat_history, llm, on_token, release, latest, callbacks)
+        else:
+            follow_up = _ainvoke(CHAIN_FOLLOW_UP, _follow_up_inputs(chat_history), llm, callbacks=callbacks)
+        follow_up_task = asyncio.create_task(follow_up)
+        should_transition = await verdict
+    except BaseException:
+        for task in (verdict, lookup, follow_up_task):
+            if task is not None:
+                task.cancel()
+        raise
+
+    if should_transition == 1:
+        # The follow-up will be discarded, so stop paying for it
+        follow_up_task.cancel()
+        return 1, None
+    release.set()
+    if on_token and latest["text"]:
+        # Flush what was generated while the verdict was pending
+        on_token(latest["text"])
+    follow_up = await follow_up_task
+    if on_token and follow_up != latest["text"]:
+        # Served from cache (or finished before release) without streaming
+        on_token(follow_up)
+    if cached is None:
+        _semantic_set(entry, follow_up)
+    return 0, follow_up
+
+def run_move_to_next_and_follow_up_chains(flag_history, chat_history, example_flow, llm, on_token=None,
+                                          callbacks=None, topic=None):
+    """
+    Run the transition check and the follow-up generation concurrently.
+
+    The follow-up is started speculatively alongside the transition check (once the
+    semantic cache lookup, which also runs alongside it, misses) and is cancelled as
+    soon as the transition verdict says it will not be used.
+
+    Args:
+        on_token: Optional callback receiving the follow-up text so far; only called
+            once the verdict is 0, so a discarded follow-up is never shown
+        topic: Optional (question, answer) pair; a semantic cache hit replaces the follow-up call
+
+    Returns:
+        tuple: (should_transition, follow_up) where follow_up is None when should_transition is 1
+    """
+    return _run_async(
+        lambda emit: _arun_move_to_next_and_follow_up(
+            flag_history, chat_history, example_flow, llm, emit, callbacks, topic
+        ),
+        on_token
     )
-    parser = MoveToNextQuestionParser()
-    chain = prompt | llm | parser
-    return chain.invoke({
-        "chat_history": json.dumps(chat_history, indent=2),
-        "example_flow": json.dumps(example_flow, indent=2)
-    })
+
+
+class LangChainBackend:
+    """LLM backend for ConversationEngine running the LangChain chains in this module."""
+
+    def __init__(self, llm, callbacks=None):
+        """
+        Args:
+            llm: Chat model the chains run on
+            callbacks: Optional extra callback handlers attached to every chain call
+                (e.g. instrumentation.RawOutputRecorder)
+        """
+        self.llm = llm
+        self.callbacks = callbacks
+
+    def follow_up(self, chat_history, on_token=None, topic=None, instruction=None):
+        if on_token:
+            return run_follow_up_chain_streaming(chat_history, self.llm, on_token, self.callbacks, topic, instruction)
+        return run_follow_up_chain(chat_history, self.llm, self.callbacks, topic, instruction)
+
+    def move_to_next(self, flag_history, example_flow):
+        return run_move_to_next_chain(flag_history, example_flow, self.llm, self.callbacks)
+
+    def move_to_next_and_follow_up(self, flag_history, chat_history, example_flow, on_token=None, topic=None):
+        return run_move_to_next_and_follow_up_chains(
+            flag_history, chat_history, example_flow, self.llm, on_token, self.callbacks, topic
+        )
+
+    def submit_move_to_next(self, flag_history, example_flow, on_result):
+        return submit_move_to_next_chain(flag_history, example_flow, self.llm, on_result, self.callbacks)
+
+    def turn_decision(self, chat_history, example_flow, on_token=None):
+        return run_turn_decision_chain(chat_history, example_flow, self.llm, on_token, self.callbacks)
+
+    def summarize(self, chat_history):
+        return run_summary_chain(chat_history, self.llm, self.callbacks)
+
+    def load_example_flow(self, path):
+        return load_example_flow(path)
@@ -1,6 +1,20 @@
+from langchain_core.exceptions import OutputParserException
 from langchain_core.output_parsers import JsonOutputParser, StrOutputParser
+from langchain_core.output_parsers.transform import BaseCumulativeTransformOutputParser
+from langchain_core.utils.function_calling import convert_to_openai_function
+from pydantic import BaseModel, Field, ValidationError
+from typing import ClassVar, List, Literal
+from instrumentation import record_parse_failure
+import re
 import json
 
+# What ChatSummaryParser puts in every field when the model output isn't JSON
+UNPARSED_SUMMARY = 'Unable to parse summary'
+
+def is_unparsed_summary(summary):
+    """Whether a summary is ChatSummaryParser's placeholder rather than a real summary."""
+    return isinstance(summary, dict) and summary.get('Goals') == [UNPARSED_SUMMARY]
+
 def clean_text(text):
     """Simple text cleanup."""
     if hasattr(text, 'content'):
@@ -18,9 +32,129 @@ class FollowUpQuestionParser(StrOutputParser):
             data = json.loads(text)
             return str(data.get('question', text))
         except:
+            record_parse_failure("follow_up_question")
             # If not JSON, return cleaned text
             return text
 
+def extract_partial_json_string(text, key):
+    """
+    Extract the (possibly unfinished) string value of `key` from a partial JSON object.
+
+    Returns the decoded characters received so far, or None if the value has not started yet.
+    """
+    key_pos = text.find(f'"{key}"')
+    if key_pos == -1:
+        return None
+    colon_pos = text.find(':', key_pos + len(key) + 2)
+    if colon_pos == -1:
+        return None
+    start = text.find('"', colon_pos + 1)
+    if start == -1:
+        return None
+
+    chars = []
+    i = start + 1
+    while i < len(text):
+        char = text[i]
+        if char == '"':
+            break
+        if char == '\\':
+            if i + 1 >= len(text):
+                # Escape sequence is split across chunks, wait for the rest
+                break
+            escaped = text[i + 1]
+            if escaped == 'u':
+                if i + 6 > len(text):
+                    break
+                try:
+                    chars.append(chr(int(text[i + 2:i + 6], 16)))
+                except ValueError:
+                    pass
+                i += 6
+                continue
+            chars.append({'n': '\n', 't': '\t', 'r': '\r', 'b': '\b', 'f': '\f'}.get(escaped, escaped))
+            i += 2
+            continue
+        chars.append(char)
+        i += 1
+    return ''.join(chars)
+
+class FinalParseMixin:
+    """
+    Makes a cumulative parser re-parse the complete output once the stream ends.
+
+    BaseCumulativeTransformOutputParser only parses with partial=True, so without this
+    a streamed reply never goes through the lenient parser (or record_parse_failure).
+    The final parse is yielded when it differs from the last partial one.
+    """
+
+    def _transform(self, input):
+        chunks = []
+
+        def collect():
+            for chunk in input:
+                chunks.append(chunk)
+                yield chunk
+
+        last = None
+        for last in super()._transform(collect()):
+            yield last
+        if chunks:
+            final = self.parse(_join_chunks(chunks))
+            if final != last:
+                yield final
+
+    async def _atransform(self, input):
+        chunks = []
+
+        async def collect():
+            async for chunk in input:
+                chunks.append(chunk)
+                yield chunk
+
+        last = None
+        async for last in super()._atransform(collect()):
+            yield last
+        if chunks:
+            final = self.parse(_join_chunks(chunks))
+            if final != last:
+                yield final
+
+def _join_chunks(chunks):
+    """Concatenate streamed message chunks (or strings) into the complete output."""
+    output = chunks[0]
+    for chunk in chunks[1:]:
+        output = output + chunk
+    return output
+
+class IncrementalFollowUpQuestionParser(FinalParseMixin, BaseCumulativeTransformOutputParser[str]):
+    """Streaming counterpart of FollowUpQuestionParser that yields the question text as it arrives."""
+
+    def parse_result(self, result, *, partial=False):
+        text = result[0].text
+        if not partial:
+            return self.parse(text)
+
+        text = text.lstrip()
+        if text.startswith('```'):
+            # Drop the opening fence line (e.g. ```json) and any closing fence received so far
+            if '\n' not in text:
+                return None
+            text = text.split('\n', 1)[1].rstrip('`').strip()
+        if not text:
+            return None
+        if text.startswith('{'):
+            return extract_partial_json_string(text, 'question')
+        # Not JSON, stream the cleaned text as-is
+        return text
+
+    def parse(self, text):
+        return FollowUpQuestionParser().parse(text)
+
+    @property
+    def _type(self):
+        return "incremental_follow_up_question_parser"
+
 class ChatSummaryParser(StrOutputParser):
     def parse(self, text):
         text = clean_text(text)
@@ -32,10 +166,11 @@ class ChatSummaryParser(StrOutputParser):
                 'Follow_Up_Opportunities': data.get('Follow_Up_Opportunities', [])
             }
         except:
+            record_parse_failure("chat_summary")
             # If not JSON, return default structure
             return {
-                'Goals': ['Unable to parse summary'],
-                'Follow_Up_Opportunities': ['Unable to parse summary']
+                'Goals': [UNPARSED_SUMMARY],
+                'Follow_Up_Opportunities': [UNPARSED_SUMMARY]
             }
 
 class MoveToNextQuestionParser(StrOutputParser):
@@ -49,5 +184,147 @@ class MoveToNextQuestionParser(StrOutputParser):
             # Handle direct number
             return 1 if int(str(data)) == 1 else 0
         except:
+            record_parse_failure("move_to_next_question")
             # For non-JSON input
             return 1 if text.strip() in ['1', 'true', 'True'] else 0
+
+
+class TurnDecisionParser(StrOutputParser):
+    """Parses the fused turn decision into {"binary_value": 0 or 1, "question": str}."""
+
+    def parse(self, text):
+        text = clean_text(text)
+        try:
+            # Try as JSON first
+            data = json.loads(text)
+            return {
+                'binary_value': 1 if data.get('binary_value', 0) == 1 else 0,
+                'question': str(data.get('question') or '')
+            }
+        except:
+            record_parse_failure("turn_decision")
+            # If not JSON, treat the text as the follow-up question
+            return {'binary_value': 0, 'question': text}
+
+class IncrementalTurnDecisionParser(FinalParseMixin, BaseCumulativeTransformOutputParser[dict]):
+    """Streaming counterpart of TurnDecisionParser; the question streams in once the verdict is known."""
+
+    def parse_result(self, result, *, partial=False):
+        text = result[0].text
+        if not partial:
+            return self.parse(text)
+
+        text = text.lstrip()
+        if text.startswith('```'):
+            if '\n' not in text:
+                return None
+            text = text.split('\n', 1)[1].rstrip('`').strip()
+        if not text.startswith('{'):
+            return None
+        verdict = re.search(r'"binary_value"\s*:\s*([01])', text)
+        return {
+            'binary_value': int(verdict.group(1)) if verdict else None,
+            'question': extract_partial_json_string(text, 'question')
+        }
+
+    def parse(self, text):
+        return TurnDecisionParser().parse(text)
+
+    @property
+    def _type(self):
+        return "incremental_turn_decision_parser"
+
+########################################################
+# Structured Output
+########################################################
+class FollowUpQuestion(BaseModel):
+    """A single follow-up question for the user."""
+    question: str = Field(description="The follow-up question, with a short positive comment first when fitting")
+
+class ChatSummary(BaseModel):
+    """Summary of a coaching conversation."""
+    Goals: List[str] = Field(description="Goals set or implied by the human for their self-improvement")
+    Follow_Up_Opportunities: List[str] = Field(description="At most 2 follow-up opportunities for future progress")
+
+class MoveToNextDecision(BaseModel):
+    """Whether it is a good moment to offer moving on to the next question."""
+    binary_value: Literal[0, 1] = Field(description="1 when it's time to move on to the next question, 0 when more discussion is needed")
+
+class TurnDecision(BaseModel):
+    """Transition verdict and, when staying on the topic, the follow-up question."""
+    binary_value: Literal[0, 1] = Field(description="1 when it's time to move on to the next question, 0 when more discussion is needed")
+    question: str = Field(description="The follow-up question when binary_value is 0, otherwise an empty string")
+
+# The model may send at most this many follow-up opportunities
+MAX_FOLLOW_UP_OPPORTUNITIES = 2
+
+def json_schema_response_format(schema):
+    """OpenAI `response_format` enforcing a Pydantic schema with strict JSON schema output."""
+    function = convert_to_openai_function(schema, strict=True)
+    return {
+        "type": "json_schema",
+        "json_schema": {
+            "name": function["name"],
+            "description": function["description"],
+            "schema": function["parameters"],
+            "strict": True
+        }
+    }
+
+def extract_json_object(text):
+    """Cleaned text cut down to its outermost JSON object, if there is one."""
+    text = clean_text(text)
+    start, end = text.find('{'), text.rfind('}')
+    if start >= 0 and end > start:
+        return text[start:end + 1]
+    return text
+
+class SchemaOutputParser(StrOutputParser):
+    """
+    Strict parser for schema-enforced output: validates against `schema` and raises
+    OutputParserException instead of degrading, so the caller can retry or fall back.
+    """
+    schema: ClassVar[type] = None
+    parser_name: ClassVar[str] = "schema"
+
+    def parse(self, text):
+        try:
+            data = self.schema.model_validate_json(extract_json_object(text))
+        except (ValidationError, ValueError) as error:
+            record_parse_failure(self.parser_name)
+            raise OutputParserException(f"Invalid {self.schema.__name__} output: {error}", llm_output=text)
+        return self.convert(data)
+
+    def convert(self, data):
+        return data
+
+class StructuredFollowUpQuestionParser(SchemaOutputParser):
+    schema: ClassVar[type] = FollowUpQuestion
+    parser_name: ClassVar[str] = "structured_follow_up_question"
+
+    def convert(self, data):
+        return data.question
+
+class StructuredChatSummaryParser(SchemaOutputParser):
+    schema: ClassVar[type] = ChatSummary
+    parser_name: ClassVar[str] = "structured_chat_summary"
+
+    def convert(self, data):
+        return {
+            'Goals': data.Goals,
+            'Follow_Up_Opportunities': data.Follow_Up_Opportunities[:MAX_FOLLOW_UP_OPPORTUNITIES]
+        }
+
+class StructuredMoveToNextQuestionParser(SchemaOutputParser):
+    schema: ClassVar[type] = MoveToNextDecision
+    parser_name: ClassVar[str] = "structured_move_to_next_question"
+
+    def convert(self, data):
+        return data.binary_value
+
+class StructuredTurnDecisionParser(SchemaOutputParser):
+    schema: ClassVar[type] = TurnDecision
+    parser_name: ClassVar[str] = "structured_turn_decision"
+
+    def convert(self, data):
+        return {'binary_value': data.binary_value, 'question': data.question}
@@ -0,0 +1,139 @@
+"""
+Prompt Builder - Compact Transcript Encoding
+Renders chat history for the prompts as one "Role: message" line per message instead
+of indented JSON, which spends a large share of each prompt on braces, indentation and
+repeated "role"/"content" keys. Rendered lines and their token counts are cached per
+message, so a turn only serializes and tokenizes the message that is new, and the
+token count of every prompt section is known without re-tokenizing the prompt.
+"""
+
+import os
+import re
+import json
+from functools import lru_cache
+import tiktoken
+
+# Model whose tokenizer is used for counting
+TOKENIZER_MODEL = "gpt-4"
+
+# Render transcripts as "Role: message" lines; COMPACT_TRANSCRIPTS=false restores indented JSON
+COMPACT_TRANSCRIPTS = os.getenv("COMPACT_TRANSCRIPTS", "true").lower() in ("1", "true", "yes")
+
+# role -> line label; roles not listed are labelled with their name
+ROLE_LABELS = {
+    "user": "User",
+    "assistant": "AI",
+    "earlier_topic": "Earlier topic",
+    "past_sessions": "Past sessions",
+}
+
+# Prompt section holding the template text itself, as opposed to its inputs
+SECTION_INSTRUCTIONS = "instructions"
+
+_LINE_BREAKS = re.compile(r"\s*\n\s*")
+
+
+@lru_cache(maxsize=None)
+def _get_encoding(model: str):
+    """Load the tokenizer once; None if it can't be loaded (e.g. offline)."""
+    try:
+        return tiktoken.encoding_for_model(model)
+    except Exception:
+        return None
+
+
+def count_tokens(text: str, model: str = TOKENIZER_MODEL) -> int:
+    """Count the tokens in text, estimating 4 characters per token without a tokenizer."""
+    encoding = _get_encoding(model)
+    if encoding is None:
+        return (len(text) + 3) // 4
+    return len(encoding.encode(text))
+
+
+def truncate_to_tokens(text: str, max_tokens: int, model: str = TOKENIZER_MODEL) -> str:
+    """Cut text down to at most max_tokens tokens."""
+    encoding = _get_encoding(model)
+    if encoding is None:
+        return text[:max_tokens * 4]
+    tokens = encoding.encode(text)
+    if len(tokens) <= max_tokens:
+        return text
+    return encoding.decode(tokens[:max_tokens]).rstrip() + "..."
+
+
+########################################################
+# Transcript Rendering
+########################################################
+def role_label(role: str) -> str:
+    return ROLE_LABELS.get(role) or role.replace("_", " ").capitalize()
+
+
+@lru_cache(maxsize=8192)
+def render_message(role: str, content: str) -> str:
+    """The prompt line for one message; line breaks inside it become " / "."""
+    if not COMPACT_TRANSCRIPTS:
+        return json.dumps({"role": role, "content": content}, indent=2)
+    return f"{role_label(role)}: {_LINE_BREAKS.sub(' / ', content.strip())}"
+
+
+@lru_cache(maxsize=8192)
+def _count_message_tokens(role: str, content: str) -> int:
+    # The line plus the separator that follows it in the transcript
+    return count_tokens(render_message(role, content)) + 1
+
+
+def count_message_tokens(messages: list) -> int:
+    """Count the prompt tokens of a list of chat messages."""
+    return sum(_count_message_tokens(msg["role"], msg["content"]) for msg in messages)
+
+
+class RenderedText(str):
+    """Prompt input text that carries its own token count."""
+
+    tokens = None
+
+    @classmethod
+    def of(cls, text: str, tokens: int):
+        rendered = cls(text)
+        rendered.tokens = tokens
+        return rendered
+
+
+def render_transcript(messages: list) -> RenderedText:
+    """Render chat messages for a prompt; the result's .tokens is summed from the message cache."""
+    if not COMPACT_TRANSCRIPTS:
+        text = json.dumps([{"role": msg["role"], "content": msg["content"]} for msg in messages], indent=2)
+        return RenderedText.of(text, count_tokens(text))
+    text = "\n".join(render_message(msg["role"], msg["content"]) for msg in messages)
+    return RenderedText.of(text, count_message_tokens(messages))
+
+
+def render_example_conversation(turns: list) -> str:
+    """Render the example flow's [{"AI": ..., "User": ...}, ...] turns in the transcript format."""
+    if not COMPACT_TRANSCRIPTS:
+        return json.dumps(turns, indent=2, ensure_ascii=False)
+    return "\n".join(
+        f"{speaker}: {_LINE_BREAKS.sub(' / ', text.strip())}"
+        for turn in turns for speaker, text in turn.items()
+    )
+
+
+########################################################
+# Section Token Counts
+########################################################
+def prompt_section_tokens(template_tokens: int, inputs: dict) -> dict:
+    """
+    Token count of each section of a prompt.
+
+    Args:
+        template_tokens: Tokens of the prompt template (SECTION_INSTRUCTIONS)
+        inputs: Input name -> value; RenderedText values reuse their cached count
+
+    Returns:
+        dict: section name -> tokens
+    """
+    sections = {SECTION_INSTRUCTIONS: template_tokens}
+    for name, value in inputs.items():
+        tokens = getattr(value, "tokens", None)
+        sections[name] = tokens if tokens is not None else count_tokens(str(value))
+    return sections
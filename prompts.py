@@ -1,13 +1,24 @@
 # Centralized prompt templates for all modules
-
-FOLLOW_UP_QUESTION_PROMPT = '''
+#
+# Static instructions and examples come first and the dynamic chat history comes last,
+# so the start of each rendered prompt is byte-identical across calls and can be served
+# from OpenAI's prompt cache.
+#
+# Each prompt is built from its instructions, its output format and its inputs. The
+# *_STRUCTURED variants leave out the output format block: they are used with models
+# that enforce the JSON schema natively (see outputparsers), so the instructions
+# spelling out the JSON would only cost tokens.
+
+from prompt_builder import COMPACT_TRANSCRIPTS
+
+# How {chat_history} is laid out, matching prompt_builder.render_transcript
+_TRANSCRIPT_FORMAT = "one message per line" if COMPACT_TRANSCRIPTS else "a JSON list of messages"
+
+_FOLLOW_UP_QUESTION_INSTRUCTIONS = '''
 As an intelligent assistant, your objective is to generate one insightful follow-up question based on a chat history. 
 This question should follow up on current chat history. You should analyse the chat history carefully and generate next question which should be next most logic question to ask based on the chat history.
 The follow-up question should encourage user's to think and go deeper into the conversation.
 
-### Inputs:
-- **Chat history:** {chat_history}
-
 ### Guidelines for Follow-up Questions:
 1. Tailor the questions to the user's interests and concerns based on their user health profile.
 2. Encourage deeper exploration of emotions, motivations, or potential actions related to the user's response.
@@ -29,8 +40,11 @@ The follow-up question should encourage user's to think and go deeper into the c
         "User": "I'm not really sure"
         "AI": "Let's explore it a little bit together. What do you think might be affecting your sleep — like your bedtime routine, stress levels, environment, movement or anything you’re eating, drinking, or taking?"    
     After that, move to deeper conversation based on user response.
+8. A "Past sessions" line, when present, lists goals and follow-up opportunities from the user's earlier sessions. If one relates to the current answer, you may build on it (for example, ask how a goal they set is going); otherwise ignore it.
 
-### Output Format:
+'''
+
+_FOLLOW_UP_QUESTION_OUTPUT_FORMAT = '''### Output Format:
 IMPORTANT: You must respond with ONLY a JSON object in this exact format:
 ### Output Format:
 IMPORTANT: Return ONLY a simple JSON object with your follow-up question in exactly this format:
@@ -38,16 +52,28 @@ IMPORTANT: Return ONLY a simple JSON object with your follow-up question in exac
 {{"question": "Write your single follow-up question here"}}
 
 Do not include any additional text or explanations. Just return the JSON object.
+
 '''
 
-SUMMARIZE_CHAT_HISTORY_PROMPT = '''
+# {instruction} is empty unless a flow script step says what this reply is for (see modules._follow_up_inputs)
+_FOLLOW_UP_QUESTION_INPUTS = '''### Inputs:
+- **Chat history** (''' + _TRANSCRIPT_FORMAT + '''):
+{chat_history}
+{instruction}'''
+
+FOLLOW_UP_QUESTION_PROMPT = _FOLLOW_UP_QUESTION_INSTRUCTIONS + _FOLLOW_UP_QUESTION_OUTPUT_FORMAT + _FOLLOW_UP_QUESTION_INPUTS
+FOLLOW_UP_QUESTION_PROMPT_STRUCTURED = _FOLLOW_UP_QUESTION_INSTRUCTIONS + _FOLLOW_UP_QUESTION_INPUTS
+
+_SUMMARIZE_CHAT_HISTORY_INSTRUCTIONS = '''
 You are an assistant helping to summarize a conversation between a human and an AI bot.
 
 Summarize the conversation with a focus on:
 1. Goals set or implied by the human for their self-improvement
 2. Follow-up opportunities that a coach or assistant could use to support future progress (provide at most 2)
 
-### Output Format:
+'''
+
+_SUMMARIZE_CHAT_HISTORY_OUTPUT_FORMAT = '''### Output Format:
 You must respond with ONLY a JSON object in exactly this format:
 {{
     "Goals": [
@@ -60,10 +86,16 @@ You must respond with ONLY a JSON object in exactly this format:
 
 Do not include any additional text, markdown formatting, or explanations. Just return the JSON object.
 
-Here is the conversation: {chat_history}
 '''
 
-MOVE_TO_NEXT_QUESTION_PROMPT = '''
+_SUMMARIZE_CHAT_HISTORY_INPUTS = '''Here is the conversation, ''' + _TRANSCRIPT_FORMAT + ''':
+{chat_history}
+'''
+
+SUMMARIZE_CHAT_HISTORY_PROMPT = _SUMMARIZE_CHAT_HISTORY_INSTRUCTIONS + _SUMMARIZE_CHAT_HISTORY_OUTPUT_FORMAT + _SUMMARIZE_CHAT_HISTORY_INPUTS
+SUMMARIZE_CHAT_HISTORY_PROMPT_STRUCTURED = _SUMMARIZE_CHAT_HISTORY_INSTRUCTIONS + _SUMMARIZE_CHAT_HISTORY_INPUTS
+
+_MOVE_TO_NEXT_QUESTION_INSTRUCTIONS = '''
 You are a conversation assistant that monitors an ongoing dialogue (`chat_history`) between a user and an AI.
 
 You are also provided with an `example_flow`, which is a sample conversation that demonstrates how a typical topic is explored, clarified, and eventually wrapped up. Your job is not to follow or match the example flow exactly, but to learn from its structure and pacing.
@@ -80,11 +112,12 @@ Please infer general patterns from the example_flow — such as:
 - For questions "What is one Success you have today?", "What is one thing that you're grateful for today?", first is get response from user, then ask whats impact the success or gratitude which user answered had on their life, then celebrate the success or gratitude, and move on to next question.
     This conversation shouldn't be very long, it should be only 4 steps like in example below. First AI asks question, then user responds with success or gratitude, then AI asks what impact it had on their life, then AI celebrates the success or gratitude and asks whether user wants to move on to next question.        
 
-**Inputs**:
-- chat_history: {chat_history}
-- example_flow: {example_flow}
+**example_flow**:
+{example_flow}
+
+'''
 
-### Response Format:
+_MOVE_TO_NEXT_QUESTION_OUTPUT_FORMAT = '''### Response Format:
 You must respond with a single JSON object containing a binary_value (0 or 1).
 
 Return exactly one of these two responses:
@@ -92,4 +125,48 @@ Return exactly one of these two responses:
 {{"binary_value": 0}}  # When more discussion is needed
 
 Do not include any additional text or explanations. Just return the JSON object.
+
+'''
+
+_MOVE_TO_NEXT_QUESTION_INPUTS = '''**chat_history**:
+{chat_history}
+'''
+
+MOVE_TO_NEXT_QUESTION_PROMPT = _MOVE_TO_NEXT_QUESTION_INSTRUCTIONS + _MOVE_TO_NEXT_QUESTION_OUTPUT_FORMAT + _MOVE_TO_NEXT_QUESTION_INPUTS
+MOVE_TO_NEXT_QUESTION_PROMPT_STRUCTURED = _MOVE_TO_NEXT_QUESTION_INSTRUCTIONS + _MOVE_TO_NEXT_QUESTION_INPUTS
+
+_TURN_DECISION_INTRO = '''
+You handle one turn of a reflection conversation between a user and an AI, in two steps.
+Step 1 decides whether it is a good moment to offer moving on to the next question (binary_value).
+Step 2, only when binary_value is 0, writes the follow-up question to ask instead. When binary_value is 1, question is an empty string.
+Base Step 1 on the current topic only: the messages since the assistant last asked one of its main reflection questions.
+
+## Step 1: Transition decision
+'''
+
+_TURN_DECISION_STEP_2 = '''
+## Step 2: Follow-up question
+'''
+
+_TURN_DECISION_OUTPUT_FORMAT = '''### Output Format:
+IMPORTANT: Return ONLY a JSON object in exactly this format:
+
+{{"binary_value": 0, "question": "Write your single follow-up question here"}}
+
+Use {{"binary_value": 1, "question": ""}} when it's time to move on to the next question.
+Do not include any additional text or explanations. Just return the JSON object.
+
+'''
+
+_TURN_DECISION_INPUTS = '''**chat_history**:
+{chat_history}
 '''
+
+TURN_DECISION_PROMPT = (
+    _TURN_DECISION_INTRO + _MOVE_TO_NEXT_QUESTION_INSTRUCTIONS + _TURN_DECISION_STEP_2
+    + _FOLLOW_UP_QUESTION_INSTRUCTIONS + _TURN_DECISION_OUTPUT_FORMAT + _TURN_DECISION_INPUTS
+)
+TURN_DECISION_PROMPT_STRUCTURED = (
+    _TURN_DECISION_INTRO + _MOVE_TO_NEXT_QUESTION_INSTRUCTIONS + _TURN_DECISION_STEP_2
+    + _FOLLOW_UP_QUESTION_INSTRUCTIONS + _TURN_DECISION_INPUTS
+)
@@ -0,0 +1,151 @@
+"""
+Response Cache - Deterministic Chain Results
+Two-tier cache for chain outputs: an in-memory LRU in front of an on-disk SQLite store.
+Only meant for deterministic calls (temperature 0), where identical inputs give identical outputs.
+"""
+
+import json
+import time
+import sqlite3
+import hashlib
+import threading
+from collections import OrderedDict
+
+DEFAULT_MEMORY_ENTRIES = 1024
+DEFAULT_DISK_ENTRIES = 50_000
+DEFAULT_TTL_SECONDS = 7 * 24 * 3600
+
+# Check the on-disk size limit every this many writes rather than on every write
+EVICTION_CHECK_INTERVAL = 100
+
+
+def make_cache_key(*parts) -> str:
+    """Hash JSON-serializable parts (model name, prompt template, inputs, ...) into a cache key."""
+    payload = json.dumps(parts, sort_keys=True, ensure_ascii=False, default=str)
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+class ResponseCache:
+    """
+    In-memory LRU backed by SQLite, with TTL and size-based eviction on both tiers.
+
+    Values must be JSON-serializable and not None. Safe to share between threads.
+    """
+
+    def __init__(self, path: str, memory_entries: int = DEFAULT_MEMORY_ENTRIES,
+                 disk_entries: int = DEFAULT_DISK_ENTRIES, ttl_seconds: float = DEFAULT_TTL_SECONDS):
+        self.path = path
+        self.memory_entries = memory_entries
+        self.disk_entries = disk_entries
+        self.ttl_seconds = ttl_seconds
+        self._memory = OrderedDict()  # key -> (created_at, value)
+        self._lock = threading.Lock()
+        self._conn = None
+        self._writes = 0
+        self._counters = {"memory_hits": 0, "disk_hits": 0, "misses": 0, "evictions": 0}
+
+    def _connection(self):
+        if self._conn is None:
+            self._conn = sqlite3.connect(self.path, check_same_thread=False)
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            # With WAL, commits skip the fsync and stay durable across application crashes
+            self._conn.execute("PRAGMA synchronous=NORMAL")
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS responses ("
+                "key TEXT PRIMARY KEY, value TEXT NOT NULL, "
+                "created_at REAL NOT NULL, accessed_at REAL NOT NULL)"
+            )
+            self._conn.execute("CREATE INDEX IF NOT EXISTS responses_accessed ON responses (accessed_at)")
+            self._conn.commit()
+        return self._conn
+
+    def _expired(self, created_at: float, now: float) -> bool:
+        return self.ttl_seconds is not None and now - created_at > self.ttl_seconds
+
+    def _remember(self, key: str, created_at: float, value):
+        self._memory[key] = (created_at, value)
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.memory_entries:
+            self._memory.popitem(last=False)
+            self._counters["evictions"] += 1
+
+    def get(self, key: str):
+        """Return the cached value, or None on a miss."""
+        now = time.time()
+        with self._lock:
+            entry = self._memory.get(key)
+            if entry is not None:
+                if not self._expired(entry[0], now):
+                    self._memory.move_to_end(key)
+                    self._counters["memory_hits"] += 1
+                    return entry[1]
+                del self._memory[key]
+
+            conn = self._connection()
+            row = conn.execute(
+                "SELECT value, created_at FROM responses WHERE key = ?", (key,)
+            ).fetchone()
+            if row is None:
+                self._counters["misses"] += 1
+                return None
+            value, created_at = json.loads(row[0]), row[1]
+            if self._expired(created_at, now):
+                conn.execute("DELETE FROM responses WHERE key = ?", (key,))
+                conn.commit()
+                self._counters["misses"] += 1
+                return None
+            conn.execute("UPDATE responses SET accessed_at = ? WHERE key = ?", (now, key))
+            conn.commit()
+            self._remember(key, created_at, value)
+            self._counters["disk_hits"] += 1
+            return value
+
+    def set(self, key: str, value):
+        """Store a value in both tiers."""
+        now = time.time()
+        with self._lock:
+            self._remember(key, now, value)
+            conn = self._connection()
+            conn.execute(
+                "INSERT OR REPLACE INTO responses (key, value, created_at, accessed_at) VALUES (?, ?, ?, ?)",
+                (key, json.dumps(value, ensure_ascii=False), now, now)
+            )
+            conn.commit()
+            self._writes += 1
+            if self._writes % EVICTION_CHECK_INTERVAL == 0:
+                self._evict_disk(now)
+
+    def _evict_disk(self, now: float):
+        """Drop expired rows, then the least recently used rows above the size limit."""
+        conn = self._connection()
+        if self.ttl_seconds is not None:
+            cursor = conn.execute("DELETE FROM responses WHERE created_at < ?", (now - self.ttl_seconds,))
+            self._counters["evictions"] += cursor.rowcount
+        (count,) = conn.execute("SELECT COUNT(*) FROM responses").fetchone()
+        if count > self.disk_entries:
+            cursor = conn.execute(
+                "DELETE FROM responses WHERE key IN ("
+                "SELECT key FROM responses ORDER BY accessed_at ASC LIMIT ?)",
+                (count - self.disk_entries,)
+            )
+            self._counters["evictions"] += cursor.rowcount
+        conn.commit()
+
+    def clear(self):
+        """Remove every entry from both tiers."""
+        with self._lock:
+            self._memory.clear()
+            conn = self._connection()
+            conn.execute("DELETE FROM responses")
+            conn.commit()
+
+    def stats(self) -> dict:
+        """Hit/miss counters plus the derived hit rate."""
+        with self._lock:
+            stats = dict(self._counters)
+            stats["memory_entries"] = len(self._memory)
+        hits = stats["memory_hits"] + stats["disk_hits"]
+        total = hits + stats["misses"]
+        stats["hits"] = hits
+        stats["hit_rate"] = hits / total if total else None
+        return stats
@@ -0,0 +1,171 @@
+"""
+Semantic Cache - Reused Follow-ups for Similar Answers
+Caches generated follow-up questions under an embedding of (reflection question,
+user's answer). A new answer whose embedding is close enough (cosine similarity over
+a NumPy matrix) to a cached one reuses that follow-up instead of calling the LLM.
+The embedder is pluggable: HashingEmbedder is local and deterministic (for tests and
+offline runs), LangChainEmbedder wraps any LangChain Embeddings such as OpenAIEmbeddings.
+"""
+
+import re
+import hashlib
+import threading
+import numpy as np
+
+EMBEDDER_OPENAI = "openai"
+EMBEDDER_HASHING = "hashing"
+OPENAI_EMBEDDING_MODEL = "text-embedding-3-small"
+
+DEFAULT_CAPACITY = 5000
+DEFAULT_SIMILARITY_THRESHOLD = 0.92
+HASHING_DIMENSIONS = 512
+
+_WORD_PATTERN = re.compile(r"[a-z0-9']+")
+
+
+class HashingEmbedder:
+    """
+    Deterministic bag-of-words embedder using feature hashing of words and word pairs.
+
+    Lexical rather than semantic, but needs no model or network and gives the same
+    vectors in every process.
+    """
+
+    def __init__(self, dimensions: int = HASHING_DIMENSIONS):
+        self.dimensions = dimensions
+
+    def _index(self, feature: str):
+        digest = hashlib.blake2b(feature.encode("utf-8"), digest_size=8).digest()
+        value = int.from_bytes(digest, "little")
+        return value % self.dimensions, 1.0 if value >> 63 else -1.0
+
+    def embed(self, texts: list) -> np.ndarray:
+        vectors = np.zeros((len(texts), self.dimensions), dtype=np.float32)
+        for row, text in enumerate(texts):
+            words = _WORD_PATTERN.findall(text.lower())
+            for feature in words + [f"{a} {b}" for a, b in zip(words, words[1:])]:
+                index, sign = self._index(feature)
+                vectors[row, index] += sign
+        return vectors
+
+
+class LangChainEmbedder:
+    """Adapter for a LangChain Embeddings model (e.g. OpenAIEmbeddings)."""
+
+    def __init__(self, embeddings):
+        self.embeddings = embeddings
+
+    def embed(self, texts: list) -> np.ndarray:
+        return np.asarray(self.embeddings.embed_documents(list(texts)), dtype=np.float32)
+
+
+def make_embedder(name: str):
+    """Build an embedder by name: EMBEDDER_OPENAI or EMBEDDER_HASHING."""
+    if name == EMBEDDER_HASHING:
+        return HashingEmbedder()
+    if name == EMBEDDER_OPENAI:
+        from langchain_openai import OpenAIEmbeddings
+        return LangChainEmbedder(OpenAIEmbeddings(model=OPENAI_EMBEDDING_MODEL))
+    raise ValueError(f"Unknown embedder '{name}', expected '{EMBEDDER_OPENAI}' or '{EMBEDDER_HASHING}'")
+
+
+def topic_text(question: str, answer: str) -> str:
+    """The text embedded for a (question, answer) pair."""
+    return f"{question}\n{answer}"
+
+
+class SemanticCache:
+    """
+    Capacity-bounded nearest-neighbour cache over normalized embeddings.
+
+    Entries live in namespaces (e.g. model and question), and only entries of the same
+    namespace are compared. When full, the least recently used entry is replaced.
+    Safe to share between threads.
+
+    A caller that may insert after a miss can embed once with embed() and pass the vector
+    to lookup_vector() and add_vector(), rather than embedding the same text twice.
+    """
+
+    def __init__(self, embedder, capacity: int = DEFAULT_CAPACITY,
+                 threshold: float = DEFAULT_SIMILARITY_THRESHOLD):
+        self.embedder = embedder
+        self.capacity = capacity
+        self.threshold = threshold
+        self._lock = threading.Lock()
+        self._vectors = None  # (capacity, dimensions), allocated on first add
+        self._namespaces = np.full(capacity, -1, dtype=np.int64)
+        self._last_used = np.zeros(capacity, dtype=np.int64)
+        self._values = [None] * capacity
+        self._namespace_ids = {}
+        self._size = 0
+        self._clock = 0
+        self._counters = {"hits": 0, "misses": 0, "evictions": 0}
+
+    def embed(self, text: str) -> np.ndarray:
+        """The normalized embedding of text."""
+        vector = self.embedder.embed([text])[0].astype(np.float32)
+        norm = np.linalg.norm(vector)
+        return vector / norm if norm > 0 else vector
+
+    def _tick(self) -> int:
+        self._clock += 1
+        return self._clock
+
+    def lookup(self, namespace: str, text: str):
+        """
+        Return the value cached for the most similar text in namespace, or None.
+
+        Returns:
+            tuple: (value, similarity), with value None on a miss
+        """
+        return self.lookup_vector(namespace, self.embed(text))
+
+    def lookup_vector(self, namespace: str, vector: np.ndarray):
+        """lookup() for a vector from embed()."""
+        with self._lock:
+            namespace_id = self._namespace_ids.get(namespace)
+            if namespace_id is None or self._size == 0:
+                self._counters["misses"] += 1
+                return None, 0.0
+            candidates = np.flatnonzero(self._namespaces[:self._size] == namespace_id)
+            if candidates.size == 0:
+                self._counters["misses"] += 1
+                return None, 0.0
+            similarities = self._vectors[candidates] @ vector
+            best = int(np.argmax(similarities))
+            similarity = float(similarities[best])
+            if similarity < self.threshold:
+                self._counters["misses"] += 1
+                return None, similarity
+            slot = int(candidates[best])
+            self._last_used[slot] = self._tick()
+            self._counters["hits"] += 1
+            return self._values[slot], similarity
+
+    def add(self, namespace: str, text: str, value):
+        """Cache value under the embedding of text."""
+        self.add_vector(namespace, self.embed(text), value)
+
+    def add_vector(self, namespace: str, vector: np.ndarray, value):
+        """add() for a vector from embed()."""
+        with self._lock:
+            if self._vectors is None:
+                self._vectors = np.zeros((self.capacity, vector.shape[0]), dtype=np.float32)
+            if self._size < self.capacity:
+                slot = self._size
+                self._size += 1
+            else:
+                slot = int(np.argmin(self._last_used))
+                self._counters["evictions"] += 1
+            namespace_id = self._namespace_ids.setdefault(namespace, len(self._namespace_ids))
+            self._vectors[slot] = vector
+            self._namespaces[slot] = namespace_id
+            self._values[slot] = value
+            self._last_used[slot] = self._tick()
+
+    def stats(self) -> dict:
+        with self._lock:
+            stats = dict(self._counters, entries=self._size, capacity=self.capacity)
+        lookups = stats["hits"] + stats["misses"]
+        stats["hit_rate"] = stats["hits"] / lookups if lookups else 0.0
+        return stats
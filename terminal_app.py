@@ -1,152 +1,182 @@
 """
 Simple terminal version of the chat application for testing and debugging purposes.
+Thin adapter over the same ConversationEngine used by the Streamlit app.
+
+Usage:
+    python terminal_app.py
+    python terminal_app.py --user-id alice
+    python terminal_app.py --replay transcripts.jsonl --output replay_results.jsonl --concurrency 8
+
+Replay input is JSONL with one recorded conversation per line, either
+{"session_id": ..., "user_messages": ["...", ...]} or
+{"session_id": ..., "transcript": [{"role": "user", "content": "..."}, ...]}.
 """
 
-import os
+import sys
 import json
+import time
+import argparse
+import threading
+from concurrent.futures import ThreadPoolExecutor
 from dotenv import load_dotenv
 from langchain_openai import ChatOpenAI
-from chains import (
-    run_follow_up_chain, 
-    run_summary_chain, 
-    run_move_to_next_chain,
-    run_follow_up_chain_raw,
-    run_move_to_next_chain_raw
-)
+import modules
+from modules import LangChainBackend
+from instrumentation import RawOutputRecorder
+from conversation_store import get_conversation_store, ANONYMOUS_USER_ID
+from long_term_memory import get_long_term_memory
+from conversation_engine import ConversationEngine, ROLE_USER
+
 
 def initialize_llm():
     """Initialize and return the LLM instance."""
     load_dotenv()
-    return ChatOpenAI(model="gpt-4", temperature=0.0)
-
-# Initialize global variables
-chat_history = []
-chat_history_for_flag = []
-basic_questions = [
-    "What is one success you had today?",
-    "What is one struggle you had today?",
-    "What one thing you are grateful for today?",
-    "What are one or two things that stood out to you today?"
-]
-transition_question = "That's great. Do you want to move on to the next question?"
-current_question_index = 0
-
-def process_user_input(user_input, llm):
+    return ChatOpenAI(model="gpt-4o", temperature=0.0)
+
+def print_decision(engine):
+    """Print how the engine handled the last turn."""
+    print("\n=== TURN DECISION ===")
+    for key, value in (engine.last_decision or {}).items():
+        print(f"{key}: {value}")
+    print("=====================")
+
+def print_raw_outputs(recorder):
+    """Print the raw model outputs behind the last turn."""
+    outputs = recorder.pop()
+    if not outputs:
+        return
+    print("\n=== RAW OUTPUTS ===")
+    for output in outputs:
+        print(f"[{output['chain']}] {output['raw']}")
+    print("===================")
+
+def process_user_input(engine, user_input, recorder):
     """Process user input and generate bot response."""
     print("\n> Your message:", user_input)
-    
-    # Add user input to histories
-    chat_history.append({"role": "user", "content": user_input})
-    chat_history_for_flag.append({"role": "user", "content": user_input})
-
-    # Check if we're responding to a transition question
-    last_bot_message = next(
-        (msg["content"] for msg in reversed(chat_history[:-1]) 
-         if msg["role"] == "bot"),
-        None
-    )
+    bot_reply = engine.send(user_input)
+    print_raw_outputs(recorder)
+    print_decision(engine)
+    print("\n> Bot:", bot_reply)
 
-    if last_bot_message == transition_question:
-        handle_transition_response(user_input, llm)
-    else:
-        handle_normal_response(llm)
-
-def handle_transition_response(user_input, llm):
-    """Handle user's response to transition question."""
-    global current_question_index
-    
-    if user_input.lower() in ["yes", "y"]:
-        # Clear flag history and move to next question
-        chat_history_for_flag.clear()
-        next_question = basic_questions[current_question_index]
-        current_question_index += 1
-        
-        # Add bot response
-        chat_history.append({"role": "bot", "content": next_question})
-        print("\n> Bot:", next_question)
-    else:
-        # Continue current conversation
-        print("\n=== RAW LLM OUTPUT ===")
-        raw_output = run_follow_up_chain_raw(chat_history, llm)
-        print(raw_output)
-        print("=====================")
-        
-        # Get parsed response
-        bot_reply = run_follow_up_chain(chat_history, llm)
-        print("\n=== PARSED OUTPUT ===")
-        print(bot_reply)
-        print("=====================")
-        
-        # Add bot response
-        chat_history.append({"role": "bot", "content": bot_reply})
-        print("\n> Bot:", bot_reply)
-
-def handle_normal_response(llm):
-    """Handle normal conversation flow."""
-    # Check for transition
-    example_flow_path = os.path.join(os.path.dirname(__file__), "example_flow.json")
-    
-    print("\n=== TRANSITION CHECK RAW ===")
-    raw_transition = run_move_to_next_chain_raw(chat_history_for_flag, example_flow_path, llm)
-    print(raw_transition)
-    print("===========================")
-    
-    should_transition = run_move_to_next_chain(chat_history_for_flag, example_flow_path, llm)
-    print("\n=== TRANSITION DECISION ===")
-    print("Result:", should_transition)
-    print("===========================")
-
-    if should_transition != 1:
-        # Get follow-up question
-        print("\n=== FOLLOW-UP RAW ===")
-        raw_followup = run_follow_up_chain_raw(chat_history, llm)
-        print(raw_followup)
-        print("====================")
-        
-        bot_reply = run_follow_up_chain(chat_history, llm)
-        print("\n=== FOLLOW-UP PARSED ===")
-        print(bot_reply)
-        print("=======================")
-        
-        # Add bot response
-        chat_history.append({"role": "bot", "content": bot_reply})
-        print("\n> Bot:", bot_reply)
-    else:
-        # Show transition question
-        chat_history.append({"role": "bot", "content": transition_question})
-        print("\n> Bot:", transition_question)
-
-def save_summary(llm):
+def save_summary(engine):
     """Generate and save conversation summary."""
     print("\nGenerating conversation summary...")
-    chat_summary = run_summary_chain(chat_history, llm)
-    
-    with open("chat_history_summary.json", "w") as f:
-        json.dump(chat_summary, f, indent=2)
-    print("Summary saved to 'chat_history_summary.json'")
-
-def main():
-    """Main chat loop."""
-    llm = initialize_llm()
-    
+    engine.end_conversation()
+    get_conversation_store().flush()
+    print(f"Summary saved for session '{engine.session_id}'")
+    print(engine.summary)
+
+def chat(llm, user_id=ANONYMOUS_USER_ID):
+    """Interactive chat loop."""
+    recorder = RawOutputRecorder()
+    engine = ConversationEngine(
+        LangChainBackend(llm, callbacks=[recorder]),
+        user_id=user_id,
+        store=get_conversation_store(),
+        memory=get_long_term_memory(get_conversation_store()),
+        background_summary=False
+    )
+
     print("\nWelcome to the Terminal Chat!")
     print("Type 'quit' to end the conversation")
-    
+
     # Display first question
-    first_question = basic_questions[0]
-    chat_history.append({"role": "bot", "content": first_question})
-    print("\n> Bot:", first_question)
-    global current_question_index
-    current_question_index = 1
+    engine.start()
+    print("\n> Bot:", engine.get_last_assistant_message())
 
-    while True:
+    while engine.conversation_active:
         user_input = input("\nYour message: ").strip()
         if user_input.lower() == 'quit':
-            save_summary(llm)
-            print("\nGoodbye!")
             break
-        
-        process_user_input(user_input, llm)
+        process_user_input(engine, user_input, recorder)
+
+    # The final question may already have ended the conversation and summarized it
+    save_summary(engine)
+    print("\nGoodbye!")
+
+########################################################
+# Transcript Replay
+########################################################
+def load_transcripts(path):
+    """Read recorded conversations as (session id, user messages) pairs."""
+    transcripts = []
+    with open(path, encoding="utf-8") as f:
+        for line_number, line in enumerate(f, 1):
+            if not line.strip():
+                continue
+            record = json.loads(line)
+            if "user_messages" in record:
+                messages = record["user_messages"]
+            else:
+                messages = [m["content"] for m in record.get("transcript", []) if m.get("role") == ROLE_USER]
+            transcripts.append((record.get("session_id", f"replay-{line_number}"), messages))
+    return transcripts
+
+def replay_transcript(llm, session_id, user_messages, write_turn):
+    """Feed one recorded conversation through the flow, writing a result per turn."""
+    recorder = RawOutputRecorder()
+    engine = ConversationEngine(
+        LangChainBackend(llm, callbacks=[recorder]),
+        session_id=session_id,
+        background_summary=False
+    )
+    engine.start()
+    for turn, user_input in enumerate(user_messages):
+        if not engine.conversation_active:
+            break
+        started = time.perf_counter()
+        reply = engine.send(user_input)
+        write_turn({
+            "session_id": session_id,
+            "turn": turn,
+            "user": user_input,
+            "assistant": reply,
+            "decision": engine.last_decision,
+            "raw_outputs": recorder.pop(),
+            "latency_ms": round((time.perf_counter() - started) * 1000.0, 1),
+        })
+    return engine
+
+def replay(llm, input_path, output_path, concurrency):
+    """Replay recorded conversations concurrently, writing per-turn results as JSONL."""
+    transcripts = load_transcripts(input_path)
+    lock = threading.Lock()
+    with open(output_path, "w", encoding="utf-8") as out:
+        def write_turn(result):
+            with lock:
+                out.write(json.dumps(result, ensure_ascii=False) + "\n")
+                out.flush()
+
+        with ThreadPoolExecutor(max_workers=concurrency) as pool:
+            futures = [
+                pool.submit(replay_transcript, llm, session_id, messages, write_turn)
+                for session_id, messages in transcripts
+            ]
+            for future in futures:
+                future.result()
+    print(f"Replayed {len(transcripts)} conversations into '{output_path}'")
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Terminal chat and transcript replay.")
+    parser.add_argument("--replay", help="JSONL file of recorded conversations to replay")
+    parser.add_argument("--output", default="replay_results.jsonl", help="Where replay results are written")
+    parser.add_argument("--concurrency", type=int, default=4, help="Conversations replayed at once")
+    parser.add_argument("--user-id", default=ANONYMOUS_USER_ID,
+                        help="User the chat is stored under; past sessions of named users are recalled")
+    parser.add_argument("--no-cache", action="store_true", help="Bypass the response and semantic caches")
+    return parser.parse_args(argv)
+
+def main(argv=None):
+    args = parse_args(argv)
+    if args.no_cache:
+        modules.RESPONSE_CACHE_ENABLED = False
+        modules.SEMANTIC_CACHE_ENABLED = False
+    llm = initialize_llm()
+    if args.replay:
+        replay(llm, args.replay, args.output, args.concurrency)
+    else:
+        chat(llm, args.user_id)
+    return 0
 
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    sys.exit(main())
@@ -0,0 +1,166 @@
+import time
+import threading
+import pytest
+import modules
+from benchmark import FakeChatModel, FAKE_FOLLOW_UPS
+from background_jobs import JOB_PENDING, JOB_DONE, JOB_FAILED
+from hedging import DeadlineExceeded
+from conversation_engine import (
+    ConversationEngine, TURN_STRATEGIES, TURN_STRATEGY_SEQUENTIAL, TURN_STRATEGY_SPECULATIVE,
+    TURN_STRATEGY_FUSED, TRANSITION_QUESTION, DECISION_FOLLOW_UP, DECISION_TRANSITION, SOURCE_DEADLINE
+)
+
+SUMMARY = {"Goals": ["Ship it"], "Follow_Up_Opportunities": []}
+FOLLOW_UP = "What made it work?"
+
+# strategy -> the backend calls one undecided turn makes
+STRATEGY_CALLS = {
+    TURN_STRATEGY_SEQUENTIAL: ["move_to_next", "follow_up"],
+    TURN_STRATEGY_SPECULATIVE: ["move_to_next_and_follow_up"],
+    TURN_STRATEGY_FUSED: ["turn_decision"],
+}
+
+
+class FakeBackend:
+    """
+    Backend answering every chain instantly with a fixed verdict; the first
+    summary_failures summaries fail, and deadline=True makes turn decisions time out.
+    """
+
+    def __init__(self, verdict=0, summary_failures=0, deadline=False):
+        self.verdict = verdict
+        self.summary_failures = summary_failures
+        self.deadline = deadline
+        self.calls = []
+        self.summaries = 0
+
+    def load_example_flow(self, path):
+        return ""
+
+    def _decide(self, chain):
+        self.calls.append(chain)
+        if self.deadline:
+            raise DeadlineExceeded(chain, 1.0)
+        return self.verdict
+
+    def follow_up(self, chat_history, on_token=None, topic=None, instruction=None):
+        self.calls.append("follow_up")
+        if on_token:
+            on_token(FOLLOW_UP)
+        return FOLLOW_UP
+
+    def move_to_next(self, flag_history, example_flow):
+        return self._decide("move_to_next")
+
+    def move_to_next_and_follow_up(self, flag_history, chat_history, example_flow, on_token=None, topic=None):
+        verdict = self._decide("move_to_next_and_follow_up")
+        return verdict, None if verdict else FOLLOW_UP
+
+    def turn_decision(self, chat_history, example_flow, on_token=None):
+        verdict = self._decide("turn_decision")
+        return verdict, None if verdict else FOLLOW_UP
+
+    def summarize(self, chat_history):
+        self.summaries += 1
+        if self.summaries <= self.summary_failures:
+            raise RuntimeError("model unavailable")
+        return SUMMARY
+
+
+def make_engine(backend, **kwargs):
+    return ConversationEngine(backend, classifier=None, flow_script=None, **kwargs)
+
+
+def wait_for_summary(engine):
+    deadline = time.monotonic() + 5
+    while True:
+        status, summary = engine.get_summary_status()
+        if status != JOB_PENDING or time.monotonic() > deadline:
+            return status, summary
+        time.sleep(0.01)
+
+
+def test_summary_job_is_started_once_per_conversation():
+    backend = FakeBackend()
+    engine = make_engine(backend)
+    engine.start()
+    engine.end_conversation()
+    engine.end_conversation()
+
+    assert wait_for_summary(engine) == (JOB_DONE, SUMMARY)
+    engine.end_conversation()
+    assert backend.summaries == 1
+
+
+def test_ending_again_after_a_failed_summary_job_retries_it():
+    backend = FakeBackend(summary_failures=1)
+    engine = make_engine(backend)
+    engine.start()
+    engine.end_conversation()
+    assert wait_for_summary(engine)[0] == JOB_FAILED
+
+    engine.end_conversation()
+    assert wait_for_summary(engine) == (JOB_DONE, SUMMARY)
+    assert backend.summaries == 2
+
+
+@pytest.mark.parametrize("strategy", TURN_STRATEGIES)
+def test_staying_on_the_topic_asks_the_follow_up(strategy):
+    backend = FakeBackend(verdict=0)
+    engine = make_engine(backend, turn_strategy=strategy)
+    engine.start()
+
+    assert engine.send("I finished my first 5k") == FOLLOW_UP
+    assert backend.calls == STRATEGY_CALLS[strategy]
+    assert engine.last_decision["decision"] == DECISION_FOLLOW_UP
+
+
+@pytest.mark.parametrize("strategy", TURN_STRATEGIES)
+def test_moving_on_offers_the_transition_question(strategy):
+    backend = FakeBackend(verdict=1)
+    engine = make_engine(backend, turn_strategy=strategy)
+    engine.start()
+
+    assert engine.send("That's really all there is to say") == TRANSITION_QUESTION
+    assert "follow_up" not in backend.calls
+    assert engine.last_decision["decision"] == DECISION_TRANSITION
+
+
+@pytest.mark.parametrize("strategy", TURN_STRATEGIES)
+def test_missed_deadline_stays_with_a_canned_follow_up(strategy):
+    engine = make_engine(FakeBackend(deadline=True), turn_strategy=strategy)
+    engine.start()
+
+    assert engine.send("I finished my first 5k") == engine.get_canned_follow_up()
+    assert engine.last_decision["source"] == SOURCE_DEADLINE
+
+
+def test_strategies_run_concurrently_on_the_shared_loop(monkeypatch):
+    monkeypatch.setattr(modules, "RESPONSE_CACHE_ENABLED", False)
+    monkeypatch.setattr(modules, "SEMANTIC_CACHE_ENABLED", False)
+    replies = TRANSITION_QUESTION, *FAKE_FOLLOW_UPS
+    errors = []
+
+    def converse(strategy, seed):
+        try:
+            llm = FakeChatModel(latency_ms=5, latency_sigma=0.01, transition_probability=0.5, seed=seed)
+            engine = make_engine(modules.LangChainBackend(llm), turn_strategy=strategy, background_summary=False)
+            engine.start()
+            for message in ("I went for a long walk", "It cleared my head", "Not really, no"):
+                tokens = []
+                reply = engine.send(message, tokens.append)
+                assert reply in replies or reply == engine.get_current_question()
+                if tokens:
+                    assert tokens[-1] == reply
+        except Exception as error:
+            errors.append(error)
+
+    threads = [
+        threading.Thread(target=converse, args=(strategy, seed))
+        for seed in range(3) for strategy in TURN_STRATEGIES
+    ]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert errors == []
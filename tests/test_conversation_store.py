@@ -0,0 +1,57 @@
+import time
+import threading
+from conversation_store import ConversationStore
+
+
+class SlowLock:
+    """Lock whose first acquisition pauses, widening the gap a racing flush could slip into."""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.waiting = threading.Event()
+        self.acquisitions = 0
+
+    def __enter__(self):
+        self.acquisitions += 1
+        if self.acquisitions == 1:
+            self.waiting.set()
+            time.sleep(0.2)
+        self.lock.acquire()
+        return self
+
+    def __exit__(self, *exc):
+        self.lock.release()
+
+
+def make_store(tmp_path):
+    return ConversationStore(str(tmp_path / "conversations.sqlite3"), batch_size=1000, flush_interval=60)
+
+
+def test_save_and_read_back_a_session(tmp_path):
+    store = make_store(tmp_path)
+    store.save_transcript("s1", "alice", [{"role": "user", "content": "hi"}])
+    store.save_summary("s1", "alice", {"summary": "greeting"})
+
+    session = store.get_session("s1")
+    assert session["transcript"] == [{"role": "user", "content": "hi"}]
+    assert session["summary"] == {"summary": "greeting"}
+    assert [s["session_id"] for s in store.list_sessions("alice")] == ["s1"]
+    store.close()
+
+
+def test_concurrent_flush_never_writes_an_older_transcript_last(tmp_path):
+    store = make_store(tmp_path)
+    slow = SlowLock()
+    store._db_lock = slow
+
+    store.save_transcript("s1", "alice", [{"role": "user", "content": "first"}])
+    first_flush = threading.Thread(target=store.flush)
+    first_flush.start()
+    assert slow.waiting.wait(5)
+
+    store.save_transcript("s1", "alice", [{"role": "user", "content": "second"}])
+    store.flush()
+    first_flush.join()
+
+    assert store.get_session("s1")["transcript"] == [{"role": "user", "content": "second"}]
+    store.close()
@@ -0,0 +1,73 @@
+import os
+import json
+import pytest
+from flow_script import parse_flow_script, load_flow_script, STEP_GENERATE, STEP_TRANSITION
+
+EXAMPLE_FLOW_PATH = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "example_flow.json")
+
+
+def script(**overrides):
+    data = {
+        "transition_question": "Move on?",
+        "affirmative_responses": ["Yes", "y"],
+        "questions": [{
+            "id": "success",
+            "question": "What is one success you had today?",
+            "steps": [
+                {"id": "impact", "type": STEP_GENERATE, "instruction": "Ask about the impact."},
+                {"id": "offer_move_on", "type": STEP_TRANSITION},
+            ],
+        }],
+    }
+    data.update(overrides)
+    return data
+
+
+def with_steps(steps):
+    return script(questions=[{"id": "success", "question": "Q?", "steps": steps}])
+
+
+def test_valid_script():
+    flow_script = parse_flow_script(script())
+    assert flow_script.affirmative_responses == {"yes", "y"}
+    step = flow_script.step_for("What is one success you had today?", 1)
+    assert (step.id, step.instruction) == ("impact", "Ask about the impact.")
+    assert flow_script.step_for("What is one success you had today?", 3) is None
+    assert flow_script.get_flow("What is one success you had today?").transition_step.id == "offer_move_on"
+
+
+@pytest.mark.parametrize("data, message", [
+    (script(questions=[]), "flow_script.questions: expected a non-empty list"),
+    (script(affirmative_responses=[]), "flow_script.affirmative_responses: expected a non-empty list"),
+    (script(transition_question=" "), "flow_script.transition_question: expected a non-empty string"),
+    (with_steps([{"id": "a", "type": "ask"}]), "flow_script.questions[0].steps[0].type: unknown step type 'ask'"),
+    (with_steps([{"type": STEP_GENERATE}]), "flow_script.questions[0].steps[0].id: expected a non-empty string"),
+    (with_steps([{"id": "a", "type": STEP_GENERATE}, {"id": "a", "type": STEP_GENERATE}]),
+     "flow_script.questions[0].steps: step ids must be unique"),
+    (with_steps([{"id": "a", "type": STEP_TRANSITION}, {"id": "b", "type": STEP_GENERATE}]),
+     "flow_script.questions[0].steps: a 'transition' step must be the last step"),
+    (with_steps([{"id": "a", "type": STEP_TRANSITION, "instruction": "Offer to move on."}]),
+     "flow_script.questions[0].steps[0].instruction: only 'generate' steps take an instruction"),
+    (with_steps([{"id": "a", "type": STEP_GENERATE, "instruction": ""}]),
+     "flow_script.questions[0].steps[0].instruction: expected a non-empty string"),
+    (script(questions=[{"id": "a", "question": "Q?"}, {"id": "a", "question": "R?"}]),
+     "flow_script.questions: question ids must be unique"),
+])
+def test_invalid_script_names_the_field(data, message):
+    with pytest.raises(ValueError) as error:
+        parse_flow_script(data)
+    assert str(error.value).startswith(message)
+
+
+def test_load_reports_the_file(tmp_path):
+    path = tmp_path / "flow.json"
+    path.write_text(json.dumps({"example_conversation": []}))
+    with pytest.raises(ValueError, match="missing 'flow_script' section"):
+        load_flow_script(str(path))
+    path.write_text(json.dumps({"flow_script": script(affirmative_responses=None)}))
+    with pytest.raises(ValueError, match=f"^{path}: flow_script.affirmative_responses"):
+        load_flow_script(str(path))
+
+
+def test_example_flow_is_valid():
+    assert load_flow_script(EXAMPLE_FLOW_PATH).questions
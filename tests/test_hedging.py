@@ -0,0 +1,118 @@
+import asyncio
+import pytest
+from hedging import DeadlineExceeded, _race, hedged_call, hedged_stream
+
+BUDGET = 0.05
+
+
+def test_answer_within_budget_is_not_hedged():
+    hedges = []
+
+    async def start(on_start):
+        on_start()
+        return "ok"
+
+    assert asyncio.run(_race("chain", start, BUDGET, lambda: hedges.append(1))) == (0, "ok")
+    assert hedges == []
+
+
+def test_slow_attempt_is_hedged_and_cancelled_when_the_hedge_wins():
+    attempts, cancelled = [], []
+
+    async def start(on_start):
+        attempts.append(1)
+        index = len(attempts)
+        on_start()
+        try:
+            await asyncio.sleep(1 if index == 1 else 0)
+        except asyncio.CancelledError:
+            cancelled.append(index)
+            raise
+        return index
+
+    assert asyncio.run(_race("chain", start, BUDGET)) == (1, 2)
+    assert cancelled == [1]
+
+
+def test_time_queued_before_on_start_is_not_counted():
+    hedges = []
+
+    async def start(on_start):
+        await asyncio.sleep(BUDGET * 3)
+        on_start()
+        await asyncio.sleep(BUDGET / 5)
+        return "ok"
+
+    assert asyncio.run(_race("chain", start, BUDGET, lambda: hedges.append(1))) == (0, "ok")
+    assert hedges == []
+
+
+def test_deadline_exceeded_when_the_hedge_is_slow_too():
+    async def start(on_start):
+        on_start()
+        await asyncio.sleep(1)
+
+    with pytest.raises(DeadlineExceeded) as error:
+        asyncio.run(hedged_call("chain", start, BUDGET))
+    assert error.value.chain == "chain"
+
+
+def test_failure_is_raised_without_hedging():
+    hedges = []
+
+    async def start(on_start):
+        on_start()
+        raise ValueError("bad request")
+
+    with pytest.raises(ValueError):
+        asyncio.run(hedged_call("chain", start, BUDGET, lambda: hedges.append(1)))
+    assert hedges == []
+
+
+def test_no_budget_awaits_the_call_directly():
+    async def start(on_start):
+        assert on_start is None
+        await asyncio.sleep(BUDGET * 2)
+        return "ok"
+
+    assert asyncio.run(hedged_call("chain", start, None)) == "ok"
+
+
+async def _collect(stream):
+    return [chunk async for chunk in stream]
+
+
+def test_hedged_stream_yields_the_winning_stream_and_closes_the_other():
+    attempts, closed = [], []
+
+    async def make_stream(on_start):
+        attempts.append(1)
+        index = len(attempts)
+        on_start()
+        try:
+            await asyncio.sleep(1 if index == 1 else 0)
+            for chunk in ("a", "ab", "abc"):
+                yield f"{index}:{chunk}"
+        finally:
+            closed.append(index)
+
+    assert asyncio.run(_collect(hedged_stream("chain", make_stream, BUDGET))) == ["2:a", "2:ab", "2:abc"]
+    assert sorted(closed) == [1, 2]
+
+
+def test_hedged_stream_raises_when_a_started_stream_stalls():
+    async def make_stream(on_start):
+        on_start()
+        yield "a"
+        await asyncio.sleep(1)
+        yield "ab"
+
+    chunks = []
+
+    async def main():
+        async for chunk in hedged_stream("chain", make_stream, BUDGET):
+            chunks.append(chunk)
+
+    with pytest.raises(DeadlineExceeded):
+        asyncio.run(main())
+    assert chunks == ["a"]
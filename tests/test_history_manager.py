@@ -0,0 +1,52 @@
+from history_manager import HistoryManager, ROLE_TOPIC_SUMMARY, split_into_topics
+from prompt_builder import count_message_tokens
+
+QUESTIONS = ["What is one success you had today?", "What is one struggle you had today?"]
+
+
+def conversation(answer_words=5, turns=3):
+    history = []
+    for question in QUESTIONS:
+        history.append({"role": "assistant", "content": question})
+        for turn in range(turns):
+            history.append({"role": "user", "content": " ".join(["word"] * answer_words)})
+            history.append({"role": "assistant", "content": f"Follow-up {turn}?"})
+    return history
+
+
+def test_history_within_budget_is_sent_unchanged():
+    history = conversation()
+    manager = HistoryManager(QUESTIONS, {"follow_up": 10_000})
+    assert manager.build(history, "follow_up") == history
+
+
+def test_earlier_topics_are_summarized_and_the_current_topic_kept_verbatim():
+    history = conversation(answer_words=40)
+    current_topic = split_into_topics(history, QUESTIONS)[-1]
+    budget = count_message_tokens(current_topic) + 100
+    manager = HistoryManager(QUESTIONS, {"follow_up": budget})
+
+    built = manager.build(history, "follow_up")
+    assert built[0]["role"] == ROLE_TOPIC_SUMMARY
+    assert built[0]["content"].startswith(f"Q: {QUESTIONS[0]}")
+    assert built[1:] == current_topic
+    assert count_message_tokens(built) <= budget
+    # Closed topics are summarized once per manager
+    assert manager.build(history, "follow_up")[0] is built[0]
+
+
+def test_summaries_that_dont_fit_are_dropped():
+    history = conversation(answer_words=40)
+    current_topic = split_into_topics(history, QUESTIONS)[-1]
+    manager = HistoryManager(QUESTIONS, {"follow_up": count_message_tokens(current_topic)})
+    assert manager.build(history, "follow_up") == current_topic
+
+
+def test_oversized_topic_keeps_its_question_and_latest_messages():
+    history = conversation(answer_words=200)
+    manager = HistoryManager(QUESTIONS, {"move_to_next": 300})
+
+    built = manager.build(history, "move_to_next")
+    assert built[0]["content"] == QUESTIONS[1]
+    assert built[-1] == history[-1]
+    assert count_message_tokens(built) <= 300
@@ -0,0 +1,22 @@
+import json
+import time
+from instrumentation import start_snapshot_writer
+
+
+def test_snapshot_writer_survives_a_failing_snapshot(tmp_path):
+    path = tmp_path / "metrics.json"
+    calls = []
+
+    def extra():
+        calls.append(None)
+        if len(calls) == 1:
+            raise RuntimeError("extra failed")
+        return {"sessions": len(calls)}
+
+    thread = start_snapshot_writer(str(path), interval=0.01, extra=extra)
+    deadline = time.monotonic() + 5
+    while not path.exists() and time.monotonic() < deadline:
+        time.sleep(0.01)
+
+    assert thread.is_alive()
+    assert json.loads(path.read_text())["sessions"] >= 2
@@ -0,0 +1,111 @@
+import time
+import asyncio
+import pytest
+from llm_scheduler import LLMScheduler, PRIORITY_INTERACTIVE, PRIORITY_BACKGROUND
+
+
+class RateLimitError(Exception):
+    status_code = 429
+
+    def __init__(self, headers=None):
+        super().__init__("rate limited")
+        self.response = type("Response", (), {"headers": headers or {}})()
+
+
+def test_interactive_calls_go_before_queued_background_calls():
+    async def main():
+        scheduler = LLMScheduler(max_concurrency=1)
+        await scheduler.aacquire()
+        order = []
+
+        async def call(name, priority):
+            await scheduler.aacquire(priority)
+            order.append(name)
+            scheduler.release()
+
+        tasks = []
+        for name, priority in (("background", PRIORITY_BACKGROUND), ("interactive", PRIORITY_INTERACTIVE)):
+            tasks.append(asyncio.create_task(call(name, priority)))
+            await asyncio.sleep(0.01)
+        scheduler.release()
+        await asyncio.gather(*tasks)
+        return order
+
+    assert asyncio.run(main()) == ["interactive", "background"]
+
+
+def test_rate_limited_call_backs_off_for_retry_after_then_retries():
+    scheduler = LLMScheduler()
+    attempts = []
+
+    def call():
+        attempts.append(time.monotonic())
+        if len(attempts) == 1:
+            raise RateLimitError({"retry-after-ms": "100"})
+        return "ok"
+
+    assert scheduler.run(call) == "ok"
+    assert len(attempts) == 2
+    assert attempts[1] - attempts[0] >= 0.1
+
+
+def test_async_rate_limited_call_retries_and_other_errors_do_not():
+    async def main():
+        scheduler = LLMScheduler(max_retries=1)
+        attempts = []
+
+        async def limited():
+            attempts.append(1)
+            raise RateLimitError({"retry-after": "0"})
+
+        with pytest.raises(RateLimitError):
+            await scheduler.arun(limited)
+        assert len(attempts) == 2
+
+        async def broken():
+            attempts.append(1)
+            raise ValueError("bad request")
+
+        with pytest.raises(ValueError):
+            await scheduler.arun(broken)
+        assert len(attempts) == 3
+        assert scheduler._active == 0
+
+    asyncio.run(main())
+
+
+def test_on_start_is_called_once_the_slot_is_granted():
+    async def main():
+        scheduler = LLMScheduler(max_concurrency=1)
+        await scheduler.aacquire()
+        started = []
+
+        async def call():
+            return "ok"
+
+        task = asyncio.create_task(scheduler.arun(call, on_start=lambda: started.append(1)))
+        await asyncio.sleep(0.1)
+        assert started == []
+        scheduler.release()
+        assert await task == "ok"
+        assert started == [1]
+
+    asyncio.run(main())
+
+
+def test_cancelled_waiter_gives_up_its_place_in_the_queue():
+    async def main():
+        scheduler = LLMScheduler(max_concurrency=1)
+        await scheduler.aacquire()
+        first = asyncio.create_task(scheduler.aacquire(PRIORITY_INTERACTIVE))
+        second = asyncio.create_task(scheduler.aacquire(PRIORITY_BACKGROUND))
+        await asyncio.sleep(0.01)
+        first.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await first
+        scheduler.release()
+        await asyncio.wait_for(second, 1)
+        assert scheduler._active == 1
+        assert not [ticket for ticket in scheduler._queue if not ticket.cancelled]
+
+    asyncio.run(main())
@@ -0,0 +1,71 @@
+import pytest
+import modules
+from benchmark import FakeChatModel
+from hedging import DeadlineExceeded
+from conversation_engine import EXAMPLE_FLOW_PATH
+from model_router import ModelRouter, TIER_FAST, TIER_STRONG
+
+
+class Model:
+    def __init__(self, model_name):
+        self.model_name = model_name
+
+
+def make_router(**kwargs):
+    tiers = {
+        TIER_FAST: (Model("mini"), Model("large")),
+        TIER_STRONG: (Model("large"), Model("mini")),
+    }
+    kwargs.setdefault("chain_deadlines", {"move_to_next": 3.0, "follow_up": 6.0, "summary": 45.0})
+    return ModelRouter(tiers, min_samples=3, probe_rate=0, **kwargs)
+
+
+def record(router, chain, model, seconds, times=5):
+    for _ in range(times):
+        router.record_latency(chain, model, seconds)
+
+
+def test_threshold_is_a_fraction_of_the_chain_deadline():
+    router = make_router(p95_threshold=8)
+    assert router.threshold("move_to_next") == pytest.approx(1.5)
+    assert router.threshold("summary") == pytest.approx(22.5)
+    assert router.threshold("unlisted") == 8
+
+
+def test_chain_with_a_slow_primary_falls_back_within_its_deadline():
+    router = make_router()
+    assert router.select_model("move_to_next").model_name == "mini"
+    # Calls cut off by a 3s deadline and one hedge can still trip the fallback
+    record(router, "move_to_next", "mini", 3.0)
+    assert router.select_model("move_to_next").model_name == "large"
+
+
+def test_slow_summaries_do_not_move_follow_ups_to_the_fallback():
+    router = make_router()
+    record(router, "summary", "large", 20.0)
+    record(router, "follow_up", "large", 1.0)
+    assert router.select_model("summary").model_name == "large"
+    assert router.select_model("follow_up").model_name == "large"
+    record(router, "follow_up", "large", 4.0, times=20)
+    assert router.select_model("follow_up").model_name == "mini"
+    assert router.current_model("follow_up").model_name == "mini"
+    assert router.select_model("summary").model_name == "large"
+
+
+def test_deadline_cancelled_calls_are_recorded_and_route_to_the_fallback(monkeypatch):
+    monkeypatch.setattr(modules, "RESPONSE_CACHE_ENABLED", False)
+    monkeypatch.setitem(modules.CHAIN_DEADLINES, modules.CHAIN_MOVE_TO_NEXT, 0.05)
+    slow = FakeChatModel(model_name="slow", latency_ms=500, latency_sigma=0.01)
+    fast = FakeChatModel(model_name="fast", latency_ms=5, latency_sigma=0.01)
+    router = ModelRouter({TIER_FAST: (slow, fast)}, min_samples=1, probe_rate=0,
+                         chain_deadlines=modules.CHAIN_DEADLINES)
+    example_flow = modules.load_example_flow(EXAMPLE_FLOW_PATH)
+    history = [{"role": "assistant", "content": "What is one success you had today?"},
+               {"role": "user", "content": "I ran 5 miles"}]
+
+    with pytest.raises(DeadlineExceeded):
+        modules.run_move_to_next_chain(history, example_flow, router)
+    assert router.stats()["move_to_next/slow"] >= 0.05
+    assert modules.run_move_to_next_chain(history, example_flow, router) in (0, 1)
+    assert fast.calls == 1
+    assert not modules.METRICS_HANDLER._llm_runs
@@ -0,0 +1,47 @@
+from outputparsers import (
+    extract_partial_json_string, extract_json_object,
+    IncrementalFollowUpQuestionParser, IncrementalTurnDecisionParser
+)
+
+
+def test_value_not_started_yet():
+    assert extract_partial_json_string('{"quest', "question") is None
+    assert extract_partial_json_string('{"question": ', "question") is None
+
+
+def test_partial_and_complete_values():
+    assert extract_partial_json_string('{"question": "How did', "question") == "How did"
+    assert extract_partial_json_string('{"question": "Why?"}', "question") == "Why?"
+
+
+def test_escape_split_across_chunks_waits_for_the_rest():
+    assert extract_partial_json_string('{"question": "Say \\', "question") == "Say "
+    assert extract_partial_json_string('{"question": "Say \\"hi\\"', "question") == 'Say "hi"'
+    assert extract_partial_json_string('{"question": "a\\nb', "question") == "a\nb"
+
+
+def test_unicode_escape_split_across_chunks():
+    assert extract_partial_json_string('{"question": "caf\\u00', "question") == "caf"
+    assert extract_partial_json_string('{"question": "caf\\u00e9', "question") == "café"
+
+
+def test_extract_json_object_trims_around_the_object():
+    assert extract_json_object('{"a": 1} trailing') == '{"a": 1}'
+    assert extract_json_object('Sure: {"a": 1}') == '{"a": 1}'
+    assert extract_json_object("no object") == "no object"
+
+
+def test_streamed_follow_up_ends_with_the_lenient_parse():
+    parser = IncrementalFollowUpQuestionParser()
+    assert list(parser.transform(iter(['{"question": "Wh', 'y?"}'])))[-1] == "Why?"
+    # Partial parsing never finds a question here, the final parse still returns something
+    outputs = list(parser.transform(iter(['{"answer": ', '"Why?"}'])))
+    assert outputs == ['{"answer": "Why?"}']
+
+
+def test_streamed_turn_decision_ends_with_a_complete_verdict():
+    parser = IncrementalTurnDecisionParser()
+    outputs = list(parser.transform(iter(['{"binary_', 'value": 1}'])))
+    assert outputs[-1] == {"binary_value": 1, "question": ""}
+    outputs = list(parser.transform(iter(['{"question": "Why?"}'])))
+    assert outputs[-1] == {"binary_value": 0, "question": "Why?"}
@@ -0,0 +1,54 @@
+import threading
+from response_cache import ResponseCache, make_cache_key
+
+
+def make_cache(tmp_path, **kwargs):
+    return ResponseCache(str(tmp_path / "responses.sqlite3"), **kwargs)
+
+
+def test_cache_key_depends_on_every_part():
+    key = make_cache_key("model", "template", {"chat_history": "hi"})
+    assert key == make_cache_key("model", "template", {"chat_history": "hi"})
+    assert key != make_cache_key("model", "template", {"chat_history": "hello"})
+    assert key != make_cache_key("other-model", "template", {"chat_history": "hi"})
+
+
+def test_memory_eviction_falls_back_to_disk(tmp_path):
+    cache = make_cache(tmp_path, memory_entries=1)
+    cache.set("a", {"question": "Why?"})
+    cache.set("b", 1)
+
+    assert cache.get("a") == {"question": "Why?"}
+    assert cache.get("missing") is None
+    stats = cache.stats()
+    assert (stats["disk_hits"], stats["misses"], stats["evictions"]) == (1, 1, 2)
+
+
+def test_expired_entries_are_misses(tmp_path):
+    cache = make_cache(tmp_path, ttl_seconds=-1)
+    cache.set("a", "value")
+    assert cache.get("a") is None
+
+
+def test_concurrent_reads_and_writes(tmp_path):
+    cache = make_cache(tmp_path, memory_entries=8)
+    errors = []
+
+    def worker(n):
+        try:
+            for i in range(200):
+                key = f"{n}-{i % 20}"
+                cache.set(key, i)
+                assert cache.get(key) is not None
+        except Exception as error:
+            errors.append(error)
+
+    threads = [threading.Thread(target=worker, args=(n,)) for n in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert errors == []
+    stats = cache.stats()
+    assert stats["hits"] == 8 * 200 and stats["misses"] == 0
@@ -0,0 +1,23 @@
+from types import SimpleNamespace
+from langchain_core.language_models import FakeListChatModel
+import modules
+
+
+def test_empty_streamed_follow_up_falls_back_to_the_non_streaming_chain():
+    llm = FakeListChatModel(responses=['{"question": ""}', '{"question": "What changed?"}'])
+    tokens = []
+    history = [{"role": "assistant", "content": "How was it?"}, {"role": "user", "content": "Fine"}]
+
+    follow_up = modules.run_follow_up_chain_streaming(history, llm, tokens.append)
+
+    assert follow_up == "What changed?"
+    assert tokens[-1] == "What changed?"
+
+
+def test_cache_key_differs_between_chains_sharing_a_prompt(monkeypatch):
+    monkeypatch.setattr(modules, "RESPONSE_CACHE_ENABLED", True)
+    llm = SimpleNamespace(model_name="model", temperature=0)
+    inputs = {"chat_history": "", "instruction": ""}
+
+    assert modules._cache_key(modules.CHAIN_FOLLOW_UP, inputs, llm) != \
+        modules._cache_key(modules.CHAIN_FOLLOW_UP_STREAMING, inputs, llm)
@@ -0,0 +1,59 @@
+import threading
+import pytest
+from transition_classifier import TransitionClassifier, has_closure_phrase
+
+TRANSITION_QUESTION = "Shall we move on to the next question?"
+
+
+@pytest.mark.parametrize("message", [
+    "Let's move on",
+    "That's all, thanks",
+    "thats it for me",
+    "I'm done.",
+    "Nothing else to add",
+])
+def test_closure_phrases(message):
+    assert has_closure_phrase(message)
+
+
+@pytest.mark.parametrize("message", [
+    "I told him done deal",
+    "thats itchy",
+    "I want to move on from my job",
+    "Nothing elsewhere compares",
+])
+def test_closure_phrases_inside_other_words_or_about_life_dont_count(message):
+    assert not has_closure_phrase(message)
+
+
+def test_first_reply_stays_and_a_closure_after_a_few_turns_moves_on():
+    classifier = TransitionClassifier([], TRANSITION_QUESTION)
+    first = [{"role": "assistant", "content": "Q"}, {"role": "user", "content": "I started a new job last month"}]
+    assert classifier.decide(first, "Q", 0)[0] == 0
+
+    closing = first + [
+        {"role": "assistant", "content": "How is it going?"},
+        {"role": "user", "content": "Good overall"},
+        {"role": "assistant", "content": "Anything else?"},
+        {"role": "user", "content": "That's all"},
+    ]
+    assert classifier.decide(closing, "Q", 0)[0] == 1
+
+
+def test_llm_agreement_is_counted_across_threads():
+    classifier = TransitionClassifier([], TRANSITION_QUESTION)
+
+    def record():
+        for _ in range(500):
+            classifier.record_llm_verdict(0.9, 1, 1)
+            classifier.record_llm_verdict(0.2, None, 1)
+
+    threads = [threading.Thread(target=record) for _ in range(4)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    stats = classifier.agreement_stats()
+    assert stats["confident"] == {"agree": 2000, "disagree": 0, "rate": 1.0}
+    assert stats["uncertain"] == {"agree": 0, "disagree": 2000, "rate": 0.0}
@@ -0,0 +1,145 @@
+"""
+Transition Classifier - Local Fast Path
+Answers the move-to-next-question decision in-process for confidently-easy cases
+(first reply on a topic, the fixed 4-step success/gratitude flows, explicit closure
+phrases). Uncertain cases return None so the caller falls back to the LLM.
+"""
+
+import re
+import logging
+import random
+import threading
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+# Probability thresholds for answering locally; anything in between goes to the LLM
+CONFIDENT_MOVE_ON = 0.95
+CONFIDENT_STAY = 0.05
+
+# Fraction of local decisions also sent to the LLM to measure agreement
+SHADOW_SAMPLE_RATE = 0.05
+
+# User turns after which a scripted (success/gratitude) topic is complete:
+# answer -> impact -> celebration -> offer to move on
+SCRIPTED_TOPIC_TURNS = 3
+
+CLOSURE_PHRASES = (
+    "move on", "next question", "that's all", "thats all", "that's it", "thats it",
+    "nothing else", "nothing more", "i'm done", "im done", "i am done", "let's move",
+)
+# Whole words only ("him done" isn't "im done", "itchy" isn't "it"), and not "move on from
+# my job", which is about the user's life rather than the conversation
+_CLOSURE_PATTERN = re.compile(
+    r"\b(?:" + "|".join(re.escape(phrase) for phrase in CLOSURE_PHRASES) + r")\b(?!\s+from\b)"
+)
+
+
+def has_closure_phrase(message: str) -> bool:
+    """Whether a user message says they are done with the topic ("move on", "that's all", ...)."""
+    return bool(_CLOSURE_PATTERN.search(message.lower()))
+
+FEATURE_NAMES = (
+    "bias",
+    "first_turn",
+    "scripted_topic_complete",
+    "scripted_topic_in_progress",
+    "closure_phrase",
+    "short_reply",
+    "topic_turns",
+    "question_index",
+    "message_length",
+)
+# Hand-tuned weights, one per entry of FEATURE_NAMES
+DEFAULT_WEIGHTS = np.array([-1.0, -4.0, 4.0, -3.0, 5.0, 0.5, 1.5, 0.1, -0.5])
+
+
+class TransitionClassifier:
+    """Logistic scorer over a few conversation features, tuned against logged LLM verdicts."""
+
+    def __init__(self, scripted_questions, transition_question: str, weights=None,
+                 confident_move_on: float = CONFIDENT_MOVE_ON,
+                 confident_stay: float = CONFIDENT_STAY):
+        self.scripted_questions = set(scripted_questions)
+        self.transition_question = transition_question
+        self.weights = DEFAULT_WEIGHTS if weights is None else np.asarray(weights, dtype=float)
+        self.confident_move_on = confident_move_on
+        self.confident_stay = confident_stay
+        self._lock = threading.Lock()
+        # Agreement with the LLM, split by whether the local model was confident
+        self._agreement = {"confident": [0, 0], "uncertain": [0, 0]}
+
+    def features(self, flag_history: list, current_question: str, question_index: int) -> np.ndarray:
+        """Build the feature vector for the current topic."""
+        user_messages = [msg["content"] for msg in flag_history if msg["role"] == "user"]
+        turns = len(user_messages)
+        last_message = user_messages[-1].lower() if user_messages else ""
+        words = len(last_message.split())
+        scripted = current_question in self.scripted_questions
+
+        return np.array([
+            1.0,
+            float(turns == 1),
+            float(scripted and turns >= SCRIPTED_TOPIC_TURNS),
+            float(scripted and 1 < turns < SCRIPTED_TOPIC_TURNS),
+            float(has_closure_phrase(last_message)),
+            float(0 < words <= 3),
+            min(turns, 10) / 10.0,
+            float(question_index) / 10.0,
+            np.log1p(words) / 5.0,
+        ])
+
+    def predict_proba(self, features: np.ndarray) -> float:
+        """Probability that it's time to offer moving on."""
+        return float(1.0 / (1.0 + np.exp(-features @ self.weights)))
+
+    def decide(self, flag_history: list, current_question: str, question_index: int):
+        """
+        Decide locally if the case is easy.
+
+        Returns:
+            tuple: (verdict, probability) where verdict is 1, 0, or None when the LLM should decide
+        """
+        probability = self.predict_proba(self.features(flag_history, current_question, question_index))
+
+        # Once the user turned down moving on, the pacing is theirs; let the LLM judge
+        declined = any(
+            msg["role"] == "assistant" and msg["content"] == self.transition_question
+            for msg in flag_history
+        )
+        if declined:
+            return None, probability
+        if probability >= self.confident_move_on:
+            return 1, probability
+        if probability <= self.confident_stay:
+            return 0, probability
+        return None, probability
+
+    def should_shadow_check(self) -> bool:
+        """Whether a local decision should also be checked against the LLM."""
+        return random.random() < SHADOW_SAMPLE_RATE
+
+    def record_llm_verdict(self, probability: float, local_verdict, llm_verdict: int):
+        """Log how the local score compares with the LLM verdict so thresholds can be tuned."""
+        predicted = 1 if probability >= 0.5 else 0
+        agreed = predicted == llm_verdict
+        bucket = "uncertain" if local_verdict is None else "confident"
+        with self._lock:
+            self._agreement[bucket][0 if agreed else 1] += 1
+        logger.info(
+            "transition classifier p=%.3f local=%s llm=%d agree=%s",
+            probability, local_verdict, llm_verdict, agreed
+        )
+
+    def agreement_stats(self) -> dict:
+        """Agreement counts and rate with the LLM, for confident and uncertain cases."""
+        with self._lock:
+            stats = {}
+            for bucket, (agree, disagree) in self._agreement.items():
+                total = agree + disagree
+                stats[bucket] = {
+                    "agree": agree,
+                    "disagree": disagree,
+                    "rate": agree / total if total else None
+                }
+            return stats